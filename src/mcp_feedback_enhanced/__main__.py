@@ -30,6 +30,8 @@ def main():
     http_parser = subparsers.add_parser('http-server', help='啟動 HTTP MCP 伺服器')
     http_parser.add_argument('--host', default='localhost', help='服務器主機地址')
     http_parser.add_argument('--port', type=int, default=8766, help='服務器端口')
+    http_parser.add_argument('--workers', type=int, default=int(os.getenv('MCP_HTTP_WORKERS', '1')),
+                             help='Worker 進程數量（大於 1 時使用共享 SQLite 會話存儲）')
     http_parser.add_argument('--debug', action='store_true', help='啟用調試模式')
     
     # 測試命令
@@ -77,6 +79,12 @@ def run_http_server(args):
     os.environ["MCP_HTTP_HOST"] = args.host
     os.environ["MCP_HTTP_PORT"] = str(args.port)
     
+    # 多 worker 模式
+    if args.workers > 1:
+        from .http_server import run_multi_worker
+        run_multi_worker(args.host, args.port, args.workers)
+        return
+    
     # 直接导入并运行 HTTP 服务器
     import asyncio
     from .http_server import HTTPMCPServer
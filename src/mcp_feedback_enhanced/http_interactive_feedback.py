@@ -54,17 +54,17 @@ async def http_interactive_feedback(
         url_generator = get_url_generator()
         
         # 创建会话
-        session_id = session_manager.create_session(
-            project_directory=project_directory,
-            summary=summary,
-            timeout=timeout
+        session_id = await session_manager.run_blocking(
+            session_manager.create_session, project_directory, summary, timeout
         )
         
         # 生成会话 URL
-        session_url = url_generator.generate_session_url(session_id)
+        session_url = url_generator.generate_session_url(session_id, ttl=timeout)
         
         # 更新会话状态为活跃
-        session_manager.update_session_status(session_id, SessionStatus.ACTIVE)
+        await session_manager.run_blocking(
+            session_manager.update_session_status, session_id, SessionStatus.ACTIVE
+        )
         
         debug_log(f"HTTP 会话已创建: {session_id}")
         debug_log(f"HTTP 会话 URL: {session_url}")
@@ -15,16 +15,17 @@ HTTP MCP 服务器
 """
 
 import asyncio
-import json
 import os
+import secrets
 import sys
+import time
 import traceback
 from typing import Dict, Any, Optional, List, Union
 from contextlib import asynccontextmanager
 
 import uvicorn
 from fastapi import FastAPI, Request, HTTPException, Query
-from fastapi.responses import JSONResponse, RedirectResponse
+from fastapi.responses import FileResponse, RedirectResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel, Field
@@ -32,7 +33,13 @@ from pydantic import BaseModel, Field
 from .debug import debug_log
 from .session_manager import get_session_manager, SessionStatus
 from .url_generator import get_url_generator, validate_session_access
-from .server import interactive_feedback as original_interactive_feedback
+from .server import interactive_feedback as original_interactive_feedback, create_feedback_text
+from .utils.image_artifact import ImageArtifact, with_artifacts
+from .utils.feedback_archive import FeedbackArchive, get_feedback_archive
+from .utils import json_codec
+from .utils.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, get_metrics
+from .utils.server_readiness import SERVER_READY_TIMEOUT, ReadyServer
+from .http_interactive_feedback import wait_for_session_completion
 from .web.main import get_web_ui_manager
 
 # 导入版本信息
@@ -64,6 +71,15 @@ class MCPError:
     INTERNAL_ERROR = -32603
 
 
+# SSE 流式传输时的进度/心跳间隔（秒）
+STREAM_PROGRESS_INTERVAL = 15
+
+# 运行指标（方法标签只使用已知方法）
+_METRIC_METHODS = frozenset({"initialize", "tools/list", "tools/call"})
+_rpc_requests = get_metrics().counter("mcp_rpc_requests_total", "JSON-RPC 请求次数（按方法和结果）")
+_rpc_duration = get_metrics().histogram("mcp_rpc_duration_seconds", "JSON-RPC 请求处理耗时（秒）")
+
+
 class HTTPMCPServer:
     """HTTP MCP 服务器"""
     
@@ -79,6 +95,14 @@ class HTTPMCPServer:
         self.url_generator.base_host = host
         self.url_generator.base_port = port
         
+        get_metrics().gauge("mcp_sessions", "目前的 HTTP 会话数", self.session_manager.count_sessions)
+        
+        # 与请求无关的方法结果预先序列化，响应时只需拼接请求 ID
+        self._static_results: Dict[str, bytes] = {
+            "initialize": json_codec.dumps(self._initialize_result()),
+            "tools/list": json_codec.dumps(self._tools_list_result())
+        }
+        
     @asynccontextmanager
     async def lifespan(self, app: FastAPI):
         """应用生命周期管理"""
@@ -111,6 +135,12 @@ class HTTPMCPServer:
         
         return app
     
+    def get_app(self) -> FastAPI:
+        """获取应用实例（首次调用时创建，之后复用）"""
+        if self.app is None:
+            self.app = self.create_app()
+        return self.app
+    
     def _register_routes(self, app: FastAPI):
         """注册路由"""
         
@@ -126,21 +156,52 @@ class HTTPMCPServer:
                     )
                 
                 try:
-                    request_data = json.loads(body.decode('utf-8'))
-                except json.JSONDecodeError as e:
+                    request_data = json_codec.loads(body)
+                except (json_codec.JSONDecodeError, UnicodeDecodeError) as e:
                     return self._create_error_response(
                         None, MCPError.PARSE_ERROR, f"JSON parse error: {str(e)}"
                     )
                 
+                # 批量请求（JSON-RPC 2.0 batch）
+                if isinstance(request_data, list):
+                    if not request_data:
+                        return self._create_error_response(
+                            None, MCPError.INVALID_REQUEST, "Empty batch request"
+                        )
+                    
+                    responses = await self._handle_batch_request(request_data)
+                    if not responses:
+                        # 批量中全部为通知，无需返回内容
+                        return Response(status_code=204)
+                    return self._json_response(
+                        b"[" + b",".join(self._encode_message(item) for item in responses) + b"]"
+                    )
+                
                 # 验证请求格式
                 if not isinstance(request_data, dict):
                     return self._create_error_response(
-                        None, MCPError.INVALID_REQUEST, "Request must be a JSON object"
+                        None, MCPError.INVALID_REQUEST, "Request must be a JSON object or array"
+                    )
+                
+                # 客户端接受 SSE 时，以流式方式处理长时间运行的工具调用
+                if self._accepts_event_stream(request) and self._is_streamable_call(request_data):
+                    return StreamingResponse(
+                        self._stream_tool_call(request_data),
+                        media_type="text/event-stream",
+                        headers={
+                            "Cache-Control": "no-cache",
+                            "X-Accel-Buffering": "no"
+                        }
                     )
                 
+                # 静态方法直接返回缓存的响应
+                cached = self._cached_response(request_data)
+                if cached is not None:
+                    return self._json_response(cached)
+                
                 # 处理请求
                 response = await self._handle_mcp_method(request_data)
-                return JSONResponse(content=response)
+                return self._json_response(json_codec.dumps(response))
                 
             except Exception as e:
                 debug_log(f"MCP 请求处理错误: {e}")
@@ -159,7 +220,9 @@ class HTTPMCPServer:
                 "endpoints": {
                     "mcp": "/mcp",
                     "session": "/session/{session_id}",
-                    "health": "/health"
+                    "health": "/health",
+                    "metrics": "/metrics",
+                    "feedback_archive": "/feedback-archive"
                 }
             }
         
@@ -169,9 +232,16 @@ class HTTPMCPServer:
             return {
                 "status": "healthy",
                 "version": __version__,
-                "active_sessions": len(self.session_manager.list_sessions())
+                "active_sessions": await self.session_manager.run_blocking(self.session_manager.count_sessions)
             }
         
+        @app.get("/metrics")
+        async def metrics():
+            """Prometheus 格式的运行指标"""
+            # 会话数量指标需读取会话存储
+            body = await self.session_manager.run_blocking(get_metrics().render)
+            return Response(content=body, media_type=METRICS_CONTENT_TYPE)
+        
         @app.get("/session/{session_id}")
         async def session_page(
             session_id: str,
@@ -183,7 +253,7 @@ class HTTPMCPServer:
                 raise HTTPException(status_code=403, detail="Access denied")
             
             # 检查会话是否存在
-            session = self.session_manager.get_session(session_id)
+            session = await self.session_manager.run_blocking(self.session_manager.get_session, session_id)
             if not session:
                 raise HTTPException(status_code=404, detail="Session not found")
             
@@ -192,23 +262,108 @@ class HTTPMCPServer:
             
             # 确保 Web UI 服务器正在运行
             if not web_ui_manager.server_thread or not web_ui_manager.server_thread.is_alive():
-                web_ui_manager.start_server()
+                await web_ui_manager.start_server_async()
             
-            # 设置当前会话
-            web_ui_manager.set_current_session_by_id(session_id)
+            # 按会话 ID 路由，多个会话可同时打开，互不替换
+            if not web_ui_manager.get_or_create_http_session(session_id):
+                raise HTTPException(status_code=404, detail="Session not found")
             
-            # 重定向到 Web UI 根路径
-            web_ui_url = web_ui_manager.get_server_url()
+            # 重定向到 Web UI 的会话页面
+            web_ui_url = f"{web_ui_manager.get_server_url()}/session/{session_id}"
             return RedirectResponse(url=web_ui_url)
         
         @app.get("/sessions")
         async def list_sessions():
             """列出所有会话"""
-            sessions = self.session_manager.list_sessions()
+            sessions = await self.session_manager.run_blocking(self.session_manager.list_sessions)
             return {"sessions": sessions}
+        
+        @app.get("/feedback-archive")
+        async def query_feedback_archive(
+            request: Request,
+            session_id: Optional[str] = Query(None, description="会话ID"),
+            project_directory: Optional[str] = Query(None, description="项目目录"),
+            since: Optional[float] = Query(None, description="起始时间戳"),
+            until: Optional[float] = Query(None, description="结束时间戳"),
+            limit: int = Query(50, ge=1, le=500),
+            offset: int = Query(0, ge=0)
+        ):
+            """查询回馈历史存档（仅限本机访问）"""
+            archive = self._get_local_archive(request)
+            records = await asyncio.to_thread(
+                archive.query, session_id, project_directory, since, until, limit, offset
+            )
+            return {"feedback": records}
+        
+        @app.get("/feedback-archive/{feedback_id}")
+        async def get_archived_feedback(request: Request, feedback_id: int):
+            """获取完整的存档回馈（仅限本机访问）"""
+            archive = self._get_local_archive(request)
+            record = await asyncio.to_thread(archive.get, feedback_id)
+            if not record:
+                raise HTTPException(status_code=404, detail="Feedback not found")
+            return record
+        
+        @app.get("/feedback-archive/images/{sha256}")
+        async def get_archived_image(request: Request, sha256: str):
+            """获取存档图片（仅限本机访问）"""
+            archive = self._get_local_archive(request)
+            path = archive.image_file(sha256)
+            if not path:
+                raise HTTPException(status_code=404, detail="Image not found")
+            return FileResponse(path)
+    
+    def _get_local_archive(self, request: Request) -> FeedbackArchive:
+        """获取回馈存档；存档包含用户回馈内容，只允许本机客户端访问"""
+        client_host = request.client.host if request.client else ""
+        if client_host not in ("127.0.0.1", "::1", "localhost"):
+            raise HTTPException(status_code=403, detail="Access denied")
+        
+        archive = get_feedback_archive()
+        if archive is None:
+            raise HTTPException(status_code=404, detail="Feedback archive disabled")
+        return archive
+    
+    async def _handle_batch_request(self, batch: List[Any]) -> List[Union[Dict[str, Any], bytes]]:
+        """
+        处理 JSON-RPC 批量请求
+        
+        批量中的各个调用并发执行，响应顺序与请求顺序一致；
+        通知（不带 id 的请求）不产生响应。
+        
+        Args:
+            batch: 请求列表
+            
+        Returns:
+            List[Union[Dict[str, Any], bytes]]: 响应列表（静态方法为已序列化的响应）
+        """
+        debug_log(f"处理批量请求，共 {len(batch)} 个调用")
+        
+        async def handle_item(item: Any) -> Optional[Union[Dict[str, Any], bytes]]:
+            if not isinstance(item, dict):
+                return self._create_error_response(
+                    None, MCPError.INVALID_REQUEST, "Request must be a JSON object"
+                )
+            
+            response = self._cached_response(item)
+            if response is None:
+                response = await self._handle_mcp_method(item)
+            if "id" not in item:
+                return None
+            return response
+        
+        results = await asyncio.gather(*(handle_item(item) for item in batch))
+        return [response for response in results if response is not None]
     
     async def _handle_mcp_method(self, request_data: Dict[str, Any]) -> Dict[str, Any]:
-        """处理 MCP 方法调用"""
+        """处理 MCP 方法调用（记录调用次数和耗时）"""
+        started = time.perf_counter()
+        response = await self._dispatch_mcp_method(request_data)
+        self._record_rpc(request_data.get("method"), started, "error" if "error" in response else "ok")
+        return response
+    
+    async def _dispatch_mcp_method(self, request_data: Dict[str, Any]) -> Dict[str, Any]:
+        """分派 MCP 方法调用"""
         request_id = request_data.get("id")
         method = request_data.get("method")
         params = request_data.get("params", {})
@@ -243,10 +398,54 @@ class HTTPMCPServer:
                 request_id, MCPError.INTERNAL_ERROR, str(e)
             )
     
+    def _cached_response(self, request_data: Dict[str, Any]) -> Optional[bytes]:
+        """
+        获取静态方法（initialize、tools/list）的已序列化响应
+        
+        Args:
+            request_data: 请求数据
+            
+        Returns:
+            Optional[bytes]: 拼接了请求 ID 的响应；非静态方法返回 None
+        """
+        method = request_data.get("method")
+        if not isinstance(method, str):
+            return None
+        
+        result = self._static_results.get(method)
+        if result is None:
+            return None
+        
+        started = time.perf_counter()
+        debug_log(f"返回缓存的 {method} 响应")
+        response = (
+            b'{"jsonrpc":"2.0","id":' + json_codec.dumps(request_data.get("id"))
+            + b',"result":' + result + b"}"
+        )
+        self._record_rpc(method, started, "ok")
+        return response
+    
+    def _record_rpc(self, method: Any, started: float, status: str):
+        """记录 JSON-RPC 调用指标（未知方法归为 other，避免标签数量无限增长）"""
+        method = method if method in _METRIC_METHODS else "other"
+        _rpc_requests.inc(method=method, status=status)
+        _rpc_duration.observe(time.perf_counter() - started, method=method)
+    
+    def _encode_message(self, message: Union[Dict[str, Any], bytes]) -> bytes:
+        """序列化响应消息（已序列化的直接返回）"""
+        return message if isinstance(message, bytes) else json_codec.dumps(message)
+    
+    def _json_response(self, body: bytes) -> Response:
+        """以已序列化的 JSON 创建响应"""
+        return Response(content=body, media_type="application/json")
+    
     async def _handle_initialize(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """处理初始化请求"""
         debug_log("处理 MCP 初始化请求")
-        
+        return self._initialize_result()
+    
+    def _initialize_result(self) -> Dict[str, Any]:
+        """初始化结果（与请求参数无关）"""
         return {
             "protocolVersion": "2024-11-05",
             "serverInfo": {
@@ -263,7 +462,10 @@ class HTTPMCPServer:
     async def _handle_tools_list(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """处理工具列表请求"""
         debug_log("处理工具列表请求")
-        
+        return self._tools_list_result()
+    
+    def _tools_list_result(self) -> Dict[str, Any]:
+        """工具列表结果（与请求参数无关）"""
         return {
             "tools": [
                 {
@@ -307,6 +509,23 @@ class HTTPMCPServer:
     
     async def _handle_interactive_feedback(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
         """处理交互式回饋工具调用"""
+        session_info = await self.session_manager.run_blocking(self._create_feedback_session, arguments)
+        session_id = session_info["session_id"]
+        session_url = session_info["url"]
+        
+        # 返回 URL 和会话信息
+        return {
+            "content": [
+                {
+                    "type": "text",
+                    "text": f"交互式回饋会话已创建。\n\n请访问以下 URL 进行交互：\n{session_url}\n\n会话 ID: {session_id}\n项目目录: {session_info['project_directory']}\n超时时间: {session_info['timeout']} 秒"
+                }
+            ],
+            "session_info": session_info
+        }
+    
+    def _create_feedback_session(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """创建交互式回饋会话并生成访问 URL"""
         project_directory = arguments.get("project_directory", ".")
         summary = arguments.get("summary", "我已完成了您請求的任務。")
         timeout = arguments.get("timeout", 600)
@@ -321,7 +540,7 @@ class HTTPMCPServer:
         )
         
         # 生成会话 URL
-        session_url = self.url_generator.generate_session_url(session_id)
+        session_url = self.url_generator.generate_session_url(session_id, ttl=timeout)
         
         # 更新会话状态为活跃
         self.session_manager.update_session_status(session_id, SessionStatus.ACTIVE)
@@ -329,23 +548,146 @@ class HTTPMCPServer:
         debug_log(f"会话已创建: {session_id}")
         debug_log(f"会话 URL: {session_url}")
         
-        # 返回 URL 和会话信息
         return {
-            "content": [
-                {
-                    "type": "text",
-                    "text": f"交互式回饋会话已创建。\n\n请访问以下 URL 进行交互：\n{session_url}\n\n会话 ID: {session_id}\n项目目录: {project_directory}\n超时时间: {timeout} 秒"
-                }
-            ],
-            "session_info": {
-                "session_id": session_id,
-                "url": session_url,
-                "project_directory": project_directory,
-                "summary": summary,
-                "timeout": timeout
-            }
+            "session_id": session_id,
+            "url": session_url,
+            "project_directory": project_directory,
+            "summary": summary,
+            "timeout": timeout
         }
     
+    def _accepts_event_stream(self, request: Request) -> bool:
+        """检查客户端是否接受 SSE 响应"""
+        return "text/event-stream" in request.headers.get("accept", "")
+    
+    def _is_streamable_call(self, request_data: Dict[str, Any]) -> bool:
+        """检查请求是否为可流式处理的工具调用"""
+        if request_data.get("method") != "tools/call" or "id" not in request_data:
+            return False
+        params = request_data.get("params") or {}
+        return params.get("name") == "interactive_feedback"
+    
+    async def _stream_tool_call(self, request_data: Dict[str, Any]):
+        """
+        以 SSE 流式处理 interactive_feedback 工具调用
+        
+        在同一连接上推送会话 URL、等待期间的进度通知，以及最终的回饋结果，
+        客户端无需轮询会话状态。
+        
+        Args:
+            request_data: JSON-RPC 请求
+            
+        Yields:
+            str: SSE 事件
+        """
+        request_id = request_data.get("id")
+        params = request_data.get("params") or {}
+        arguments = params.get("arguments") or {}
+        progress_token = (params.get("_meta") or {}).get("progressToken")
+        started = time.perf_counter()
+        
+        try:
+            session_info = await self.session_manager.run_blocking(self._create_feedback_session, arguments)
+        except Exception as e:
+            self._record_rpc("tools/call", started, "error")
+            debug_log(f"流式创建会话失败: {e}")
+            yield self._format_sse_event(
+                self._create_error_response(request_id, MCPError.INTERNAL_ERROR, str(e))
+            )
+            return
+        
+        session_id = session_info["session_id"]
+        timeout = session_info["timeout"]
+        start_time = time.monotonic()
+        
+        def progress_event(message: str) -> str:
+            return self._format_sse_event({
+                "jsonrpc": "2.0",
+                "method": "notifications/progress",
+                "params": {
+                    "progressToken": progress_token,
+                    "progress": round(time.monotonic() - start_time, 1),
+                    "total": timeout,
+                    "message": message
+                }
+            })
+        
+        if progress_token is not None:
+            yield progress_event(f"请访问以下 URL 进行交互：{session_info['url']}")
+        
+        wait_task = asyncio.create_task(wait_for_session_completion(session_id, timeout))
+        status = "cancelled"
+        try:
+            while True:
+                done, _ = await asyncio.wait({wait_task}, timeout=STREAM_PROGRESS_INTERVAL)
+                if done:
+                    break
+                
+                if progress_token is not None:
+                    session_status = await self.session_manager.run_blocking(
+                        self.session_manager.get_session_status, session_id
+                    )
+                    session_status = session_status.value if session_status else "unknown"
+                    yield progress_event(f"等待用户回饋中（状态: {session_status}）")
+                else:
+                    # 保持连接活跃
+                    yield ": keep-alive\n\n"
+            
+            outcome = wait_task.result()
+            status = "ok" if outcome.get("status") == "completed" else "error"
+            if status == "ok":
+                result = {
+                    "content": self._build_feedback_content(outcome["result"]),
+                    "session_info": session_info
+                }
+            else:
+                result = {
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": f"回饋收集超时或失败（{timeout}秒），会话 ID: {session_id}"
+                        }
+                    ],
+                    "isError": True,
+                    "session_info": session_info
+                }
+            
+            yield self._format_sse_event({
+                "jsonrpc": "2.0",
+                "id": request_id,
+                "result": result
+            })
+            
+        finally:
+            # 客户端断开时停止等待
+            if not wait_task.done():
+                wait_task.cancel()
+            self._record_rpc("tools/call", started, status)
+    
+    def _build_feedback_content(self, feedback_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """将回饋结果转换为 MCP 内容列表"""
+        feedback_data = dict(feedback_data)
+        if not feedback_data.get("command_logs") and feedback_data.get("logs"):
+            feedback_data["command_logs"] = feedback_data["logs"]
+        
+        # 图片附上编码缓存，回馈文字与图片内容共用同一份 base64
+        feedback_data["images"] = with_artifacts(feedback_data.get("images"))
+        
+        content = [{"type": "text", "text": create_feedback_text(feedback_data)}]
+        
+        for img in feedback_data["images"]:
+            artifact = ImageArtifact.of(img) if isinstance(img, dict) else None
+            if not artifact:
+                continue
+            
+            content.append({"type": "image", "data": artifact.base64, "mimeType": artifact.mime_type})
+        
+        return content
+    
+    def _format_sse_event(self, message: Dict[str, Any]) -> str:
+        """格式化 SSE 消息事件"""
+        return f"event: message\ndata: {json_codec.dumps(message).decode('utf-8')}\n\n"
+    
     def _create_error_response(self, request_id: Optional[Union[str, int]], 
                              error_code: int, error_message: str) -> Dict[str, Any]:
         """创建错误响应"""
@@ -364,27 +706,26 @@ class HTTPMCPServer:
             debug_log("HTTP MCP 服务器已在运行")
             return
         
-        self.app = self.create_app()
-        
         config = uvicorn.Config(
-            self.app,
+            self.get_app(),
             host=self.host,
             port=self.port,
             log_level="info" if os.getenv("MCP_DEBUG") else "warning",
             access_log=bool(os.getenv("MCP_DEBUG"))
         )
         
-        server = uvicorn.Server(config)
+        server = ReadyServer(config)
         
         debug_log(f"启动 HTTP MCP 服务器: http://{self.host}:{self.port}")
         
         # 在后台任务中运行服务器
         self.server_task = asyncio.create_task(server.serve())
         
-        # 等待服务器启动
-        await asyncio.sleep(1)
-        
-        debug_log("HTTP MCP 服务器启动完成")
+        # 等待服务器开始接受连接（启动失败时立即返回）
+        if await server.readiness.wait_async(SERVER_READY_TIMEOUT):
+            debug_log("HTTP MCP 服务器启动完成")
+        else:
+            debug_log(f"HTTP MCP 服务器未能在 {SERVER_READY_TIMEOUT} 秒内就绪")
     
     async def stop(self):
         """停止服务器"""
@@ -434,6 +775,55 @@ async def stop_http_server():
         _http_server = None
 
 
+def create_worker_app() -> FastAPI:
+    """
+    多 worker 模式的应用工厂
+    
+    每个 worker 进程调用一次，根据环境变量创建服务器实例和应用。
+    
+    Returns:
+        FastAPI: worker 使用的应用
+    """
+    server = get_http_server()
+    app = server.get_app()
+    debug_log(f"HTTP MCP worker 已启动 (PID: {os.getpid()})")
+    return app
+
+
+def run_multi_worker(host: str, port: int, workers: int):
+    """
+    以多 worker 进程模式运行 HTTP 服务器
+    
+    多个 worker 通过共享的 SQLite 会话存储协作，任意 worker 都可以
+    处理同一会话的请求。
+    
+    Args:
+        host: 服务器主机地址
+        port: 服务器端口
+        workers: worker 进程数量
+    """
+    # worker 进程通过环境变量读取配置
+    if os.getenv("MCP_SESSION_STORE", "sqlite").lower() != "sqlite":
+        debug_log("多 worker 模式需要共享会话存储，改用 SQLite 存储")
+    os.environ["MCP_SESSION_STORE"] = "sqlite"
+    os.environ["MCP_HTTP_HOST"] = host
+    os.environ["MCP_HTTP_PORT"] = str(port)
+    # 所有 worker 共用同一令牌签名密钥，任意 worker 都能验证会话 URL
+    os.environ.setdefault("MCP_URL_SECRET", secrets.token_hex(32))
+    
+    debug_log(f"启动 HTTP MCP 服务器（{workers} 个 worker）: http://{host}:{port}")
+    
+    uvicorn.run(
+        "mcp_feedback_enhanced.http_server:create_worker_app",
+        factory=True,
+        host=host,
+        port=port,
+        workers=workers,
+        log_level="info" if os.getenv("MCP_DEBUG") else "warning",
+        access_log=bool(os.getenv("MCP_DEBUG"))
+    )
+
+
 def main():
     """主函数，用于独立运行 HTTP 服务器"""
     import argparse
@@ -441,6 +831,8 @@ def main():
     parser = argparse.ArgumentParser(description="MCP Feedback Enhanced HTTP Server")
     parser.add_argument("--host", default="localhost", help="服务器主机地址")
     parser.add_argument("--port", type=int, default=8766, help="服务器端口")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("MCP_HTTP_WORKERS", "1")),
+                        help="worker 进程数量（大于 1 时使用共享 SQLite 会话存储）")
     parser.add_argument("--debug", action="store_true", help="启用调试模式")
     
     args = parser.parse_args()
@@ -448,6 +840,10 @@ def main():
     if args.debug:
         os.environ["MCP_DEBUG"] = "true"
     
+    if args.workers > 1:
+        run_multi_worker(args.host, args.port, args.workers)
+        return
+    
     async def run_server():
         server = HTTPMCPServer(host=args.host, port=args.port)
         await server.start()
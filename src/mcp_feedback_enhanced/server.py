@@ -23,13 +23,14 @@ import sys
 import json
 import tempfile
 import asyncio
-import base64
-from typing import Annotated, List
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Annotated, List, Optional
 import io
 
 from mcp.server.fastmcp import FastMCP
 from mcp.server.fastmcp.utilities.types import Image as MCPImage
-from mcp.types import TextContent
+from mcp.types import ImageContent, TextContent
 from pydantic import Field
 
 # 導入多語系支援
@@ -43,6 +44,10 @@ from .utils.error_handler import ErrorHandler, ErrorType
 
 # 導入資源管理器
 from .utils.resource_manager import get_resource_manager, create_temp_file
+from .utils.image_artifact import ImageArtifact, with_artifacts
+from .utils.image_pipeline import get_image_pipeline
+from .utils.feedback_archive import archive_feedback
+from .utils.tracing import span
 
 # ===== 編碼初始化 =====
 def init_encoding():
@@ -234,6 +239,9 @@ def save_feedback_to_file(feedback_data: dict, file_path: str = None) -> str:
     """
     將回饋資料儲存到 JSON 文件
     
+    圖片以原始二進位寫成旁邊的獨立文件（<文件名>.img<序號><副檔名>），
+    JSON 中只記錄文件名；JSON 本身以增量方式串流寫入。
+    
     Args:
         feedback_data: 回饋資料字典
         file_path: 儲存路徑，若為 None 則自動產生臨時文件
@@ -241,7 +249,8 @@ def save_feedback_to_file(feedback_data: dict, file_path: str = None) -> str:
     Returns:
         str: 儲存的文件路徑
     """
-    if file_path is None:
+    is_temp_file = file_path is None
+    if is_temp_file:
         # 使用資源管理器創建臨時文件
         file_path = create_temp_file(suffix='.json', prefix='feedback_')
     
@@ -253,29 +262,89 @@ def save_feedback_to_file(feedback_data: dict, file_path: str = None) -> str:
     # 複製數據以避免修改原始數據
     json_data = feedback_data.copy()
     
-    # 處理圖片數據：將 bytes 轉換為 base64 字符串以便 JSON 序列化
+    # 處理圖片數據：寫成獨立文件，避免 base64 膨脹
     if "images" in json_data and isinstance(json_data["images"], list):
+        base_path = os.path.splitext(file_path)[0]
+        resource_manager = get_resource_manager()
         processed_images = []
-        for img in json_data["images"]:
-            if isinstance(img, dict) and "data" in img:
-                processed_img = img.copy()
-                # 如果 data 是 bytes，轉換為 base64 字符串
-                if isinstance(img["data"], bytes):
-                    processed_img["data"] = base64.b64encode(img["data"]).decode('utf-8')
-                    processed_img["data_type"] = "base64"
-                processed_images.append(processed_img)
-            else:
+        for i, img in enumerate(json_data["images"], 1):
+            artifact = ImageArtifact.of(img) if isinstance(img, dict) else None
+            if not artifact:
                 processed_images.append(img)
+                continue
+            
+            processed_img = {key: value for key, value in img.items() if not key.startswith("_") and key != "data"}
+            image_path = f"{base_path}.img{i}{artifact.extension}"
+            with open(image_path, "wb") as f:
+                f.write(artifact.data)
+            if is_temp_file:
+                # 圖片文件與 JSON 臨時文件一起過期清理
+                resource_manager.register_temp_file(image_path)
+            
+            processed_img.update({
+                "size": artifact.size,
+                "mime_type": artifact.mime_type,
+                "file": os.path.basename(image_path),
+                "data_type": "file"
+            })
+            processed_images.append(processed_img)
         json_data["images"] = processed_images
     
-    # 儲存資料
+    # 串流寫入資料（不先在內存中組裝完整 JSON 字符串）
+    encoder = json.JSONEncoder(ensure_ascii=False, indent=2, default=str)
     with open(file_path, "w", encoding="utf-8") as f:
-        json.dump(json_data, f, ensure_ascii=False, indent=2)
+        for chunk in encoder.iterencode(json_data):
+            f.write(chunk)
     
     debug_log(f"回饋資料已儲存至: {file_path}")
     return file_path
 
 
+# 回饋資料背景寫入線程（單線程，按提交順序寫入）
+_feedback_writer: Optional[ThreadPoolExecutor] = None
+_feedback_writer_lock = threading.Lock()
+
+
+def save_feedback_in_background(feedback_data: dict, file_path: str = None) -> Future:
+    """
+    在背景線程中儲存回饋資料，不阻塞事件循環
+    
+    Args:
+        feedback_data: 回饋資料字典（提交時做淺拷貝，圖片數據不複製）
+        file_path: 儲存路徑，若為 None 則自動產生臨時文件
+        
+    Returns:
+        Future: 完成時結果為儲存的文件路徑
+    """
+    global _feedback_writer
+    if _feedback_writer is None:
+        with _feedback_writer_lock:
+            if _feedback_writer is None:
+                _feedback_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="FeedbackWriter")
+    
+    snapshot = dict(feedback_data)
+    if isinstance(snapshot.get("images"), list):
+        snapshot["images"] = [dict(img) if isinstance(img, dict) else img for img in snapshot["images"]]
+    
+    future = _feedback_writer.submit(save_feedback_to_file, snapshot, file_path)
+    future.add_done_callback(_log_feedback_save_error)
+    return future
+
+
+def _log_feedback_save_error(future: Future):
+    """記錄背景寫入失敗"""
+    if future.cancelled() or future.exception() is None:
+        return
+    
+    e = future.exception()
+    error_id = ErrorHandler.log_error_with_context(
+        e,
+        context={"operation": "背景儲存回饋資料"},
+        error_type=ErrorType.FILE_IO
+    )
+    debug_log(f"背景儲存回饋資料失敗 [錯誤ID: {error_id}]: {e}")
+
+
 def create_feedback_text(feedback_data: dict) -> str:
     """
     建立格式化的回饋文字
@@ -318,43 +387,26 @@ def create_feedback_text(feedback_data: dict) -> str:
             img_info = f"  {i}. {name} ({size_str})"
             
             # 為提高兼容性，添加 base64 預覽信息
-            if img.get("data"):
-                try:
-                    if isinstance(img["data"], bytes):
-                        img_base64 = base64.b64encode(img["data"]).decode('utf-8')
-                    elif isinstance(img["data"], str):
-                        img_base64 = img["data"]
-                    else:
-                        img_base64 = None
+            try:
+                artifact = ImageArtifact.of(img)
+                if artifact:
+                    # 只顯示前50個字符的預覽（只編碼預覽所需的部分）
+                    preview = artifact.base64_preview(50)
+                    if artifact.base64_length > 50:
+                        preview += "..."
+                    img_info += f"\n     Base64 預覽: {preview}"
+                    img_info += f"\n     完整 Base64 長度: {artifact.base64_length} 字符"
                     
-                    if img_base64:
-                        # 只顯示前50個字符的預覽
-                        preview = img_base64[:50] + "..." if len(img_base64) > 50 else img_base64
-                        img_info += f"\n     Base64 預覽: {preview}"
-                        img_info += f"\n     完整 Base64 長度: {len(img_base64)} 字符"
-                        
+                    # 檢查是否啟用 Base64 詳細模式（從 UI 設定中獲取）
+                    include_full_base64 = feedback_data.get("settings", {}).get("enable_base64_detail", False)
+
+                    if include_full_base64:
                         # 如果 AI 助手不支援 MCP 圖片，可以提供完整 base64
-                        debug_log(f"圖片 {i} Base64 已準備，長度: {len(img_base64)}")
-                        
-                        # 檢查是否啟用 Base64 詳細模式（從 UI 設定中獲取）
-                        include_full_base64 = feedback_data.get("settings", {}).get("enable_base64_detail", False)
-
-                        if include_full_base64:
-                            # 根據檔案名推斷 MIME 類型
-                            file_name = img.get("name", "image.png")
-                            if file_name.lower().endswith(('.jpg', '.jpeg')):
-                                mime_type = 'image/jpeg'
-                            elif file_name.lower().endswith('.gif'):
-                                mime_type = 'image/gif'
-                            elif file_name.lower().endswith('.webp'):
-                                mime_type = 'image/webp'
-                            else:
-                                mime_type = 'image/png'
-
-                            img_info += f"\n     完整 Base64: data:{mime_type};base64,{img_base64}"
-                        
-                except Exception as e:
-                    debug_log(f"圖片 {i} Base64 處理失敗: {e}")
+                        img_info += f"\n     完整 Base64: data:{artifact.mime_type};base64,{artifact.base64}"
+                        debug_log(f"圖片 {i} 完整 Base64 已附加，長度: {artifact.base64_length}")
+                    
+            except Exception as e:
+                debug_log(f"圖片 {i} Base64 處理失敗: {e}")
             
             text_parts.append(img_info)
         
@@ -364,6 +416,17 @@ def create_feedback_text(feedback_data: dict) -> str:
     return "\n\n".join(text_parts) if text_parts else "用戶未提供任何回饋內容。"
 
 
+class ArtifactImage(MCPImage):
+    """直接使用 ImageArtifact 快取 base64 的 MCP 圖片對象"""
+
+    def __init__(self, artifact: ImageArtifact):
+        super().__init__(data=artifact.data, format=artifact.format)
+        self.artifact = artifact
+
+    def to_image_content(self) -> ImageContent:
+        return ImageContent(type="image", data=self.artifact.base64, mimeType=self.artifact.mime_type)
+
+
 def process_images(images_data: List[dict]) -> List[MCPImage]:
     """
     處理圖片資料，轉換為 MCP 圖片對象
@@ -378,41 +441,20 @@ def process_images(images_data: List[dict]) -> List[MCPImage]:
     
     for i, img in enumerate(images_data, 1):
         try:
-            if not img.get("data"):
-                debug_log(f"圖片 {i} 沒有資料，跳過")
+            artifact = ImageArtifact.of(img)
+            if not artifact:
+                debug_log(f"圖片 {i} 沒有資料或數據類型不支援，跳過")
                 continue
             
-            # 檢查數據類型並相應處理
-            if isinstance(img["data"], bytes):
-                # 如果是原始 bytes 數據，直接使用
-                image_bytes = img["data"]
-                debug_log(f"圖片 {i} 使用原始 bytes 數據，大小: {len(image_bytes)} bytes")
-            elif isinstance(img["data"], str):
-                # 如果是 base64 字符串，進行解碼
-                image_bytes = base64.b64decode(img["data"])
-                debug_log(f"圖片 {i} 從 base64 解碼，大小: {len(image_bytes)} bytes")
-            else:
-                debug_log(f"圖片 {i} 數據類型不支援: {type(img['data'])}")
+            if not artifact.is_valid():
+                debug_log(f"圖片 {i} 數據為空或無法解碼，跳過")
                 continue
             
-            if len(image_bytes) == 0:
-                debug_log(f"圖片 {i} 數據為空，跳過")
-                continue
-            
-            # 根據文件名推斷格式
-            file_name = img.get("name", "image.png")
-            if file_name.lower().endswith(('.jpg', '.jpeg')):
-                image_format = 'jpeg'
-            elif file_name.lower().endswith('.gif'):
-                image_format = 'gif'
-            else:
-                image_format = 'png'  # 默認使用 PNG
-            
-            # 創建 MCPImage 對象
-            mcp_image = MCPImage(data=image_bytes, format=image_format)
+            # 創建 MCPImage 對象（序列化時沿用已快取的 base64）
+            mcp_image = ArtifactImage(artifact)
             mcp_images.append(mcp_image)
             
-            debug_log(f"圖片 {i} ({file_name}) 處理成功，格式: {image_format}")
+            debug_log(f"圖片 {i} ({artifact.name}) 處理成功，格式: {artifact.format}，大小: {artifact.size} bytes")
             
         except Exception as e:
             # 使用統一錯誤處理（不影響 JSON RPC）
@@ -443,7 +485,7 @@ async def launch_gui_with_timeout(project_dir: str, summary: str, timeout: int)
             return {
                 "logs": f"GUI 模式回饋收集完成",
                 "interactive_feedback": result.get("interactive_feedback", ""),
-                "images": result.get("images", [])
+                "images": await get_image_pipeline().process(result.get("images", []))
             }
         else:
             return {
@@ -497,6 +539,12 @@ async def interactive_feedback(
     Returns:
         List: 包含 TextContent 和 MCPImage 對象的列表
     """
+    with span("interactive_feedback", timeout=timeout):
+        return await _collect_feedback(project_directory, summary, timeout)
+
+
+async def _collect_feedback(project_directory: str, summary: str, timeout: int) -> List:
+    """interactive_feedback 的實際流程（各階段以 span 記錄耗時）"""
     # 檢查環境變數 FORCE_WEB
     force_web = False
     env_force_web = os.getenv("FORCE_WEB", "").lower()
@@ -508,8 +556,9 @@ async def interactive_feedback(
         debug_log("環境變數 FORCE_WEB 已停用，使用預設邏輯")
     
     # 環境偵測
-    is_remote = is_remote_environment()
-    can_gui = can_use_gui()
+    with span("environment_detection"):
+        is_remote = is_remote_environment()
+        can_gui = can_use_gui()
     use_web_ui = is_remote or not can_gui or force_web
     
     debug_log(f"環境偵測結果 - 遠端: {is_remote}, GUI 可用: {can_gui}, 強制 Web UI: {force_web}")
@@ -523,29 +572,40 @@ async def interactive_feedback(
         
         # 選擇適當的介面
         if use_web_ui:
-            result = await launch_web_ui_with_timeout(project_directory, summary, timeout)
+            with span("launch_web_ui"):
+                result = await launch_web_ui_with_timeout(project_directory, summary, timeout)
         else:
-            result = await launch_gui_with_timeout(project_directory, summary, timeout)
+            with span("launch_gui"):
+                result = await launch_gui_with_timeout(project_directory, summary, timeout)
         
         # 處理取消情況
         if not result:
             return [TextContent(type="text", text="用戶取消了回饋。")]
         
-        # 儲存詳細結果
-        save_feedback_to_file(result)
+        # 圖片在以下各步驟共用同一份編碼快取
+        if result.get("images"):
+            result = dict(result, images=with_artifacts(result["images"]))
+        
+        # 儲存詳細結果（背景寫入，不計入工具調用延遲）
+        with span("save_feedback_to_file"):
+            save_feedback_in_background(result)
+        with span("archive_feedback"):
+            archive_feedback(result, project_directory=project_directory, summary=summary)
         
         # 建立回饋項目列表
         feedback_items = []
         
         # 添加文字回饋
         if result.get("interactive_feedback") or result.get("command_logs") or result.get("images"):
-            feedback_text = create_feedback_text(result)
+            with span("create_feedback_text"):
+                feedback_text = create_feedback_text(result)
             feedback_items.append(TextContent(type="text", text=feedback_text))
             debug_log("文字回饋已添加")
         
         # 添加圖片回饋
         if result.get("images"):
-            mcp_images = process_images(result["images"])
+            with span("process_images", count=len(result["images"])):
+                mcp_images = process_images(result["images"])
             feedback_items.extend(mcp_images)
             debug_log(f"已添加 {len(mcp_images)} 張圖片")
         
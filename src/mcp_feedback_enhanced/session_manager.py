@@ -18,12 +18,28 @@ import asyncio
 import time
 import uuid
 import threading
-from typing import Dict, Optional, Any, List
+from typing import Dict, Optional, Any, List, Tuple, TYPE_CHECKING
 from dataclasses import dataclass, field
 from enum import Enum
-from datetime import datetime, timedelta
+from datetime import datetime
 
 from .debug import debug_log
+from .utils.log_buffer import BoundedLog
+from .utils.feedback_archive import archive_feedback
+from .utils.metrics import cleanup_duration_histogram, get_metrics
+
+if TYPE_CHECKING:
+    from .session_store import SessionStore
+
+
+# 运行指标
+_session_transitions = get_metrics().counter(
+    "mcp_session_transitions_total", "会话状态转换次数（按目标状态）"
+)
+_cleanup_duration = cleanup_duration_histogram()
+
+# 读取会话时刷新最后活动时间的最短间隔（秒），避免每次读取都写入存储
+ACTIVITY_UPDATE_INTERVAL = 30.0
 
 
 class SessionStatus(Enum):
@@ -49,26 +65,26 @@ class SessionData:
     
     # 回饋数据
     feedback_text: str = ""
-    command_logs: List[Dict[str, Any]] = field(default_factory=list)
+    command_logs: BoundedLog = field(default_factory=BoundedLog)  # 有界命令日誌
     images: List[Dict[str, Any]] = field(default_factory=list)
     
-    # 异步事件
-    completion_event: Optional[asyncio.Event] = None
+    # 结果数据
     result_data: Optional[Dict[str, Any]] = None
     error_message: Optional[str] = None
     
-    def __post_init__(self):
-        """初始化后处理"""
-        if self.completion_event is None:
-            self.completion_event = asyncio.Event()
+    def expires_at(self) -> float:
+        """
+        获取过期时间戳（供过期索引使用）
+        
+        已结束的会话在结束时刻即视为过期。
+        """
+        if self.status in (SessionStatus.COMPLETED, SessionStatus.TIMEOUT, SessionStatus.ERROR):
+            return self.last_activity.timestamp()
+        return self.created_at.timestamp() + self.timeout_seconds
     
     def is_expired(self) -> bool:
         """检查会话是否已过期"""
-        if self.status in [SessionStatus.COMPLETED, SessionStatus.TIMEOUT, SessionStatus.ERROR]:
-            return True
-        
-        expiry_time = self.created_at + timedelta(seconds=self.timeout_seconds)
-        return datetime.now() > expiry_time
+        return time.time() >= self.expires_at()
     
     def update_activity(self):
         """更新最后活动时间"""
@@ -85,20 +101,78 @@ class SessionData:
             "last_activity": self.last_activity.isoformat(),
             "timeout_seconds": self.timeout_seconds,
             "feedback_text": self.feedback_text,
-            "command_logs": self.command_logs,
+            "command_logs": self.command_logs.to_list(),
             "images": self.images,
             "error_message": self.error_message
         }
+    
+    def to_record(self) -> Dict[str, Any]:
+        """转换为存储记录（包含结果数据，供会话存储序列化）"""
+        record = self.to_dict()
+        record["result_data"] = self.result_data
+        return record
+    
+    @classmethod
+    def from_record(cls, record: Dict[str, Any]) -> 'SessionData':
+        """从存储记录还原会话"""
+        return cls(
+            session_id=record["session_id"],
+            project_directory=record["project_directory"],
+            summary=record["summary"],
+            status=SessionStatus(record["status"]),
+            created_at=datetime.fromisoformat(record["created_at"]),
+            last_activity=datetime.fromisoformat(record["last_activity"]),
+            timeout_seconds=record["timeout_seconds"],
+            feedback_text=record.get("feedback_text", ""),
+            command_logs=BoundedLog(entries=record.get("command_logs", [])),
+            images=record.get("images", []),
+            result_data=record.get("result_data"),
+            error_message=record.get("error_message")
+        )
 
 
 class SessionManager:
     """会话管理器"""
     
-    def __init__(self):
-        self._sessions: Dict[str, SessionData] = {}
+    def __init__(self, store: Optional['SessionStore'] = None):
+        """
+        初始化会话管理器
+        
+        Args:
+            store: 会话存储，None 时根据环境变量创建（默认进程内存储）
+        """
+        if store is None:
+            # 延迟导入避免循环依赖
+            from .session_store import create_session_store
+            store = create_session_store()
+        
+        self._store = store
         self._lock = threading.RLock()
         self._cleanup_task: Optional[asyncio.Task] = None
         self._cleanup_interval = 60  # 清理间隔（秒）
+        self._poll_interval = 0.5  # 共享存储的完成状态轮询间隔（秒）
+        self._activity_update_interval = ACTIVITY_UPDATE_INTERVAL
+        
+        # 完成等待者注册表：session_id -> {future: 所属事件循环}
+        self._waiters: Dict[str, Dict[asyncio.Future, asyncio.AbstractEventLoop]] = {}
+    
+    @property
+    def store(self) -> 'SessionStore':
+        """会话存储"""
+        return self._store
+    
+    async def run_blocking(self, func, *args):
+        """
+        在异步处理函数中调用会话操作
+        
+        共享存储（SQLite）的读写可能等待数据库锁，放到线程中执行以免阻塞事件循环；
+        进程内存储直接调用。
+        """
+        if self._store.shared:
+            # 清理任务需在事件循环中启动，线程中的 create_session 无法启动
+            self._ensure_cleanup_task()
+            return await asyncio.to_thread(func, *args)
+        return func(*args)
         
     def create_session(self, project_directory: str, summary: str, timeout: int = 600) -> str:
         """
@@ -114,16 +188,16 @@ class SessionManager:
         """
         session_id = self._generate_session_id()
         
-        with self._lock:
-            session_data = SessionData(
-                session_id=session_id,
-                project_directory=project_directory,
-                summary=summary,
-                timeout_seconds=timeout
-            )
-            
-            self._sessions[session_id] = session_data
-            debug_log(f"创建新会话: {session_id}")
+        session_data = SessionData(
+            session_id=session_id,
+            project_directory=project_directory,
+            summary=summary,
+            timeout_seconds=timeout
+        )
+        
+        self._store.put(session_data)
+        _session_transitions.inc(status=SessionStatus.CREATED.value)
+        debug_log(f"创建新会话: {session_id}")
             
         # 启动清理任务（如果尚未启动）
         self._ensure_cleanup_task()
@@ -140,16 +214,33 @@ class SessionManager:
         Returns:
             Optional[SessionData]: 会话数据，如果不存在则返回None
         """
-        with self._lock:
-            session = self._sessions.get(session_id)
-            if session and not session.is_expired():
-                session.update_activity()
-                return session
-            elif session and session.is_expired():
-                # 清理过期会话
-                self._cleanup_session(session_id)
-                return None
+        session = self._store.get(session_id)
+        if session is None:
+            return None
+        
+        if session.is_expired():
+            # 清理过期会话
+            self._cleanup_session(session_id)
             return None
+        
+        # 读取只按间隔刷新活动时间，共享存储中每次刷新都是一次写事务
+        idle = (datetime.now() - session.last_activity).total_seconds()
+        if idle >= self._activity_update_interval:
+            session = self._store.update(session_id, SessionData.update_activity) or session
+        return session
+    
+    def get_session_status(self, session_id: str) -> Optional[SessionStatus]:
+        """
+        获取会话状态（不更新活动时间，也不清理已结束的会话）
+        
+        Args:
+            session_id: 会话ID
+            
+        Returns:
+            Optional[SessionStatus]: 会话状态，如果不存在则返回None
+        """
+        session = self._store.get(session_id)
+        return session.status if session else None
     
     def update_session_status(self, session_id: str, status: SessionStatus) -> bool:
         """
@@ -162,14 +253,15 @@ class SessionManager:
         Returns:
             bool: 更新是否成功
         """
-        with self._lock:
-            session = self._sessions.get(session_id)
-            if session:
-                session.status = status
-                session.update_activity()
-                debug_log(f"会话 {session_id} 状态更新为: {status.value}")
-                return True
-            return False
+        def apply(session: SessionData):
+            session.status = status
+            session.update_activity()
+        
+        if self._store.update(session_id, apply):
+            _session_transitions.inc(status=status.value)
+            debug_log(f"会话 {session_id} 状态更新为: {status.value}")
+            return True
+        return False
     
     def add_feedback(self, session_id: str, feedback_type: str, data: Any) -> bool:
         """
@@ -183,11 +275,7 @@ class SessionManager:
         Returns:
             bool: 添加是否成功
         """
-        with self._lock:
-            session = self._sessions.get(session_id)
-            if not session:
-                return False
-            
+        def apply(session: SessionData):
             session.update_activity()
             
             if feedback_type == 'text':
@@ -202,9 +290,12 @@ class SessionManager:
                     session.images.append(data)
                 else:
                     session.images.append({"data": data})
-            
-            debug_log(f"会话 {session_id} 添加 {feedback_type} 回饋")
-            return True
+        
+        if not self._store.update(session_id, apply):
+            return False
+        
+        debug_log(f"会话 {session_id} 添加 {feedback_type} 回饋")
+        return True
     
     def complete_session(self, session_id: str, result_data: Dict[str, Any]) -> bool:
         """
@@ -217,31 +308,31 @@ class SessionManager:
         Returns:
             bool: 完成是否成功
         """
-        with self._lock:
-            session = self._sessions.get(session_id)
-            if not session:
-                return False
-            
+        def apply(session: SessionData):
             session.status = SessionStatus.COMPLETED
             session.result_data = result_data
             session.update_activity()
+        
+        with self._lock:
+            session = self._store.update(session_id, apply)
+            if not session:
+                return False
             
-            # 触发完成事件
-            if session.completion_event:
-                try:
-                    # 在事件循环中设置事件
-                    loop = asyncio.get_event_loop()
-                    loop.call_soon_threadsafe(session.completion_event.set)
-                except RuntimeError:
-                    # 如果没有运行的事件循环，创建一个新的
-                    asyncio.run(self._set_event_async(session.completion_event))
+            # 唤醒本进程内的等待者
+            self._notify_waiters(session_id)
             
             debug_log(f"会话 {session_id} 已完成")
-            return True
-    
-    async def _set_event_async(self, event: asyncio.Event):
-        """异步设置事件"""
-        event.set()
+        
+        _session_transitions.inc(status=SessionStatus.COMPLETED.value)
+        
+        # 在后台写入回馈历史存档
+        archive_feedback(
+            result_data,
+            session_id=session_id,
+            project_directory=session.project_directory,
+            summary=session.summary
+        )
+        return True
     
     def fail_session(self, session_id: str, error_message: str) -> bool:
         """
@@ -254,25 +345,23 @@ class SessionManager:
         Returns:
             bool: 标记是否成功
         """
-        with self._lock:
-            session = self._sessions.get(session_id)
-            if not session:
-                return False
-            
+        def apply(session: SessionData):
             session.status = SessionStatus.ERROR
             session.error_message = error_message
             session.update_activity()
+        
+        with self._lock:
+            session = self._store.update(session_id, apply)
+            if not session:
+                return False
             
-            # 触发完成事件
-            if session.completion_event:
-                try:
-                    loop = asyncio.get_event_loop()
-                    loop.call_soon_threadsafe(session.completion_event.set)
-                except RuntimeError:
-                    asyncio.run(self._set_event_async(session.completion_event))
+            # 唤醒本进程内的等待者
+            self._notify_waiters(session_id)
             
             debug_log(f"会话 {session_id} 失败: {error_message}")
-            return True
+        
+        _session_transitions.inc(status=SessionStatus.ERROR.value)
+        return True
     
     async def wait_for_completion(self, session_id: str, timeout: Optional[int] = None) -> Optional[Dict[str, Any]]:
         """
@@ -285,24 +374,27 @@ class SessionManager:
         Returns:
             Optional[Dict[str, Any]]: 会话结果，超时或失败返回None
         """
-        session = self.get_session(session_id)
-        if not session:
-            return None
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
         
-        # 如果已经完成，直接返回结果
-        if session.status == SessionStatus.COMPLETED:
-            return session.result_data
-        elif session.status in [SessionStatus.ERROR, SessionStatus.TIMEOUT]:
+        session, registered = await self.run_blocking(self._register_waiter, session_id, future, loop)
+        if not registered:
+            # 会话不存在或已结束，直接返回结果
+            if session and session.status == SessionStatus.COMPLETED:
+                return session.result_data
             return None
         
-        # 等待完成事件
         wait_timeout = timeout or session.timeout_seconds
         
         try:
-            await asyncio.wait_for(session.completion_event.wait(), timeout=wait_timeout)
+            if self._store.shared:
+                # 共享存储中的会话可能由其他 worker 完成，同时轮询存储状态
+                await asyncio.wait_for(self._poll_for_completion(session_id, future), timeout=wait_timeout)
+            else:
+                await asyncio.wait_for(future, timeout=wait_timeout)
             
-            # 重新获取会话状态
-            updated_session = self.get_session(session_id)
+            # 重新获取会话状态（已完成的会话视为过期，不能经由 get_session 获取）
+            updated_session = await self.run_blocking(self._store.get, session_id)
             if updated_session and updated_session.status == SessionStatus.COMPLETED:
                 return updated_session.result_data
             else:
@@ -310,9 +402,82 @@ class SessionManager:
                 
         except asyncio.TimeoutError:
             # 标记会话超时
-            self.update_session_status(session_id, SessionStatus.TIMEOUT)
+            await self.run_blocking(self.update_session_status, session_id, SessionStatus.TIMEOUT)
             debug_log(f"会话 {session_id} 等待超时")
             return None
+        finally:
+            self._remove_waiter(session_id, future)
+    
+    def _register_waiter(self, session_id: str, future: asyncio.Future,
+                         loop: asyncio.AbstractEventLoop) -> Tuple[Optional[SessionData], bool]:
+        """
+        检查会话状态，仍在进行中时注册完成等待者
+        
+        在锁内检查并注册，避免与 complete_session 竞争而丢失唤醒。
+        
+        Returns:
+            Tuple[Optional[SessionData], bool]: (会话数据, 是否已注册)；
+            会话不存在或已结束时不注册
+        """
+        with self._lock:
+            session = self._store.get(session_id)
+            if not session:
+                return None, False
+            
+            if (session.status in (SessionStatus.COMPLETED, SessionStatus.ERROR, SessionStatus.TIMEOUT)
+                    or session.is_expired()):
+                return session, False
+            
+            self._waiters.setdefault(session_id, {})[future] = loop
+            return session, True
+    
+    async def _poll_for_completion(self, session_id: str, future: asyncio.Future):
+        """轮询共享存储，直到会话结束或被删除；本进程内完成时立即返回"""
+        while True:
+            status = await self.run_blocking(self.get_session_status, session_id)
+            if status is None or status in (SessionStatus.COMPLETED, SessionStatus.ERROR, SessionStatus.TIMEOUT):
+                return
+            
+            done, _ = await asyncio.wait({future}, timeout=self._poll_interval)
+            if done:
+                return
+    
+    def _notify_waiters(self, session_id: str):
+        """唤醒会话的所有等待者（可从任意线程调用）"""
+        with self._lock:
+            waiters = self._waiters.pop(session_id, None)
+        
+        if not waiters:
+            return
+        
+        for future, loop in waiters.items():
+            if loop.is_closed():
+                continue
+            try:
+                # 在等待者所属的事件循环中完成 future
+                loop.call_soon_threadsafe(self._resolve_waiter, future)
+            except RuntimeError:
+                # 事件循环已关闭
+                pass
+    
+    @staticmethod
+    def _resolve_waiter(future: asyncio.Future):
+        """完成等待者的 future"""
+        if not future.done():
+            future.set_result(None)
+    
+    def _remove_waiter(self, session_id: str, future: asyncio.Future):
+        """移除等待者"""
+        with self._lock:
+            waiters = self._waiters.get(session_id)
+            if waiters is not None:
+                waiters.pop(future, None)
+                if not waiters:
+                    del self._waiters[session_id]
+    
+    def count_sessions(self) -> int:
+        """获取会话数量（包含尚未清理的过期会话）"""
+        return self._store.count()
     
     def list_sessions(self, include_expired: bool = False) -> List[Dict[str, Any]]:
         """
@@ -324,12 +489,11 @@ class SessionManager:
         Returns:
             List[Dict[str, Any]]: 会话列表
         """
-        with self._lock:
-            sessions = []
-            for session in self._sessions.values():
-                if include_expired or not session.is_expired():
-                    sessions.append(session.to_dict())
-            return sessions
+        sessions = []
+        for session in self._store.values():
+            if include_expired or not session.is_expired():
+                sessions.append(session.to_dict())
+        return sessions
     
     def cleanup_expired_sessions(self) -> int:
         """
@@ -338,25 +502,31 @@ class SessionManager:
         Returns:
             int: 清理的会话数量
         """
-        with self._lock:
-            expired_sessions = []
-            for session_id, session in self._sessions.items():
-                if session.is_expired():
-                    expired_sessions.append(session_id)
-            
-            for session_id in expired_sessions:
-                self._cleanup_session(session_id)
-            
-            if expired_sessions:
-                debug_log(f"清理了 {len(expired_sessions)} 个过期会话")
-            
-            return len(expired_sessions)
+        start = time.perf_counter()
+        
+        # 从过期索引中取出已到期的会话，开销与实际过期数量成正比
+        expired_sessions = self._store.pop_expired(time.time())
+        
+        for session_id in expired_sessions:
+            debug_log(f"清理会话: {session_id}")
+            # 会话已不存在，唤醒仍在等待的调用方
+            self._notify_waiters(session_id)
+        
+        _cleanup_duration.observe(time.perf_counter() - start, component="http_sessions")
+        if expired_sessions:
+            _session_transitions.inc(len(expired_sessions), status="expired")
+            debug_log(f"清理了 {len(expired_sessions)} 个过期会话")
+        
+        return len(expired_sessions)
     
     def _cleanup_session(self, session_id: str):
         """清理单个会话"""
-        session = self._sessions.pop(session_id, None)
-        if session:
+        if self._store.delete(session_id):
+            _session_transitions.inc(status="expired")
             debug_log(f"清理会话: {session_id}")
+        
+        # 会话已不存在，唤醒仍在等待的调用方
+        self._notify_waiters(session_id)
     
     def _generate_session_id(self) -> str:
         """生成唯一的会话ID"""
@@ -390,8 +560,16 @@ class SessionManager:
         if self._cleanup_task and not self._cleanup_task.done():
             self._cleanup_task.cancel()
         
+        # 唤醒所有等待者
         with self._lock:
-            self._sessions.clear()
+            waiting_sessions = list(self._waiters)
+        for session_id in waiting_sessions:
+            self._notify_waiters(session_id)
+        
+        # 共享存储中的会话可能仍被其他 worker 使用，不在此清空
+        if not self._store.shared:
+            self._store.clear()
+        self._store.close()
         
         debug_log("会话管理器已关闭")
 
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+会话存储后端
+============
+
+为 SessionManager 提供可插拔的会话存储，使多个 HTTP worker 进程可以共享会话。
+
+存储类型：
+- memory: 进程内字典（默认，单进程模式）
+- sqlite: SQLite 文件（WAL 模式），可跨进程共享
+
+环境变量：
+- MCP_SESSION_STORE: 存储类型（memory/sqlite）
+- MCP_SESSION_DB: SQLite 数据库文件路径
+"""
+
+import base64
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from .debug import debug_log
+from .session_manager import SessionData
+from .utils.expiry_index import ExpiryIndex
+
+
+# 默认 SQLite 数据库路径
+DEFAULT_SESSION_DB = Path.home() / ".cache" / "mcp-feedback-enhanced" / "sessions.db"
+
+
+class SessionStore(ABC):
+    """会话存储接口"""
+
+    # 是否可跨进程共享（共享存储无法依赖进程内事件通知）
+    shared = False
+
+    @abstractmethod
+    def put(self, session: SessionData) -> None:
+        """保存会话"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[SessionData]:
+        """获取会话，不存在时返回 None"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def update(self, session_id: str, mutator: Callable[[SessionData], None]) -> Optional[SessionData]:
+        """
+        原子地修改会话
+
+        Args:
+            session_id: 会话ID
+            mutator: 修改函数，接收会话对象并就地修改
+
+        Returns:
+            Optional[SessionData]: 修改后的会话，不存在时返回 None
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, session_id: str) -> bool:
+        """删除会话"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def deadline(self, session_id: str) -> Optional[float]:
+        """获取会话的过期时间戳，不存在时返回 None"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def pop_expired(self, now: float) -> List[str]:
+        """
+        删除并返回所有过期时间不晚于 now 的会话
+        
+        Args:
+            now: 当前时间戳
+            
+        Returns:
+            List[str]: 被删除的会话ID
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def values(self) -> List[SessionData]:
+        """获取所有会话"""
+        raise NotImplementedError
+
+    def count(self) -> int:
+        """获取会话数量"""
+        return len(self.values())
+
+    @abstractmethod
+    def clear(self) -> None:
+        """清空所有会话"""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """释放存储资源"""
+        pass
+
+
+class MemorySessionStore(SessionStore):
+    """进程内会话存储"""
+
+    def __init__(self):
+        self._sessions: Dict[str, SessionData] = {}
+        self._expiry = ExpiryIndex()
+        self._lock = threading.RLock()
+
+    def _reindex(self, session: SessionData) -> None:
+        """过期时间变化时更新过期索引"""
+        deadline = session.expires_at()
+        if self._expiry.deadline(session.session_id) != deadline:
+            self._expiry.schedule(session.session_id, deadline)
+
+    def put(self, session: SessionData) -> None:
+        with self._lock:
+            self._sessions[session.session_id] = session
+            self._reindex(session)
+
+    def get(self, session_id: str) -> Optional[SessionData]:
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def update(self, session_id: str, mutator: Callable[[SessionData], None]) -> Optional[SessionData]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session:
+                mutator(session)
+                self._reindex(session)
+            return session
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            self._expiry.discard(session_id)
+            return self._sessions.pop(session_id, None) is not None
+
+    def deadline(self, session_id: str) -> Optional[float]:
+        return self._expiry.deadline(session_id)
+
+    def pop_expired(self, now: float) -> List[str]:
+        with self._lock:
+            expired = self._expiry.pop_expired(now)
+            for session_id in expired:
+                self._sessions.pop(session_id, None)
+            return expired
+
+    def values(self) -> List[SessionData]:
+        with self._lock:
+            return list(self._sessions.values())
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._sessions.clear()
+            self._expiry.clear()
+
+
+class SQLiteSessionStore(SessionStore):
+    """SQLite（WAL 模式）会话存储，可供多个 worker 进程共享"""
+
+    shared = True
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        初始化 SQLite 会话存储
+
+        Args:
+            path: 数据库文件路径，None 使用默认路径
+        """
+        self.path = str(path or DEFAULT_SESSION_DB)
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+
+        # 每个线程使用独立连接
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " session_id TEXT PRIMARY KEY,"
+            " status TEXT NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " data TEXT NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions (expires_at)")
+
+        debug_log(f"SQLite 会话存储已初始化: {self.path}")
+
+    def _connect(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    @staticmethod
+    def _encode(session: SessionData) -> str:
+        """序列化会话（bytes 以 base64 保存）"""
+        def default(value):
+            if isinstance(value, (bytes, bytearray)):
+                return {"__bytes__": base64.b64encode(value).decode("ascii")}
+            raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+        return json.dumps(session.to_record(), ensure_ascii=False, default=default)
+
+    @staticmethod
+    def _decode(data: str) -> SessionData:
+        """反序列化会话"""
+        def object_hook(value):
+            if len(value) == 1 and "__bytes__" in value:
+                return base64.b64decode(value["__bytes__"])
+            return value
+
+        return SessionData.from_record(json.loads(data, object_hook=object_hook))
+
+    def _write(self, conn: sqlite3.Connection, session: SessionData) -> None:
+        conn.execute(
+            "INSERT OR REPLACE INTO sessions (session_id, status, expires_at, updated_at, data)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (
+                session.session_id,
+                session.status.value,
+                session.expires_at(),
+                time.time(),
+                self._encode(session)
+            )
+        )
+
+    def put(self, session: SessionData) -> None:
+        self._write(self._connect(), session)
+
+    def get(self, session_id: str) -> Optional[SessionData]:
+        row = self._connect().execute(
+            "SELECT data FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return self._decode(row[0]) if row else None
+
+    def update(self, session_id: str, mutator: Callable[[SessionData], None]) -> Optional[SessionData]:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT data FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if not row:
+                conn.execute("COMMIT")
+                return None
+
+            session = self._decode(row[0])
+            mutator(session)
+            self._write(conn, session)
+            conn.execute("COMMIT")
+            return session
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def delete(self, session_id: str) -> bool:
+        cursor = self._connect().execute(
+            "DELETE FROM sessions WHERE session_id = ?", (session_id,)
+        )
+        return cursor.rowcount > 0
+
+    def deadline(self, session_id: str) -> Optional[float]:
+        row = self._connect().execute(
+            "SELECT expires_at FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def pop_expired(self, now: float) -> List[str]:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # expires_at 已建立索引，只访问已过期的行
+            rows = conn.execute(
+                "SELECT session_id FROM sessions WHERE expires_at <= ?", (now,)
+            ).fetchall()
+            if rows:
+                conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,))
+            conn.execute("COMMIT")
+            return [row[0] for row in rows]
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def values(self) -> List[SessionData]:
+        rows = self._connect().execute("SELECT data FROM sessions").fetchall()
+        return [self._decode(row[0]) for row in rows]
+
+    def count(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def clear(self) -> None:
+        self._connect().execute("DELETE FROM sessions")
+
+    def close(self) -> None:
+        with self._connections_lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            self._connections.clear()
+        self._local = threading.local()
+
+
+def create_session_store(kind: Optional[str] = None, path: Optional[str] = None) -> SessionStore:
+    """
+    根据配置创建会话存储
+
+    Args:
+        kind: 存储类型（memory/sqlite），None 时读取 MCP_SESSION_STORE
+        path: SQLite 数据库路径，None 时读取 MCP_SESSION_DB
+
+    Returns:
+        SessionStore: 会话存储实例
+    """
+    kind = (kind or os.getenv("MCP_SESSION_STORE", "memory")).lower()
+
+    if kind == "sqlite":
+        return SQLiteSessionStore(path or os.getenv("MCP_SESSION_DB") or None)
+
+    if kind != "memory":
+        debug_log(f"未知的会话存储类型 {kind}，使用内存存储")
+    return MemorySessionStore()
@@ -26,7 +26,6 @@ import time
 import sys
 import os
 import socket
-import threading
 import json
 from pathlib import Path
 from typing import Dict, Any, Optional
@@ -169,21 +168,11 @@ def test_web_ui(keep_running=False):
     try:
         debug_log(t('test.messages.startingWebServer'))
 
-        def start_server():
-            try:
-                manager.start_server()
-                return True
-            except Exception as e:
-                debug_log(t('test.messages.serverStartError', error=str(e)))
-                return False
-        
-        # Start server in thread
-        server_thread = threading.Thread(target=start_server)
-        server_thread.daemon = True
-        server_thread.start()
-        
-        # Wait a moment and test if server is responsive
-        time.sleep(3)
+        # Start server and wait until it accepts connections
+        try:
+            manager.start_server()
+        except Exception as e:
+            debug_log(t('test.messages.serverStartError', error=str(e)))
         
         # Test if port is listening
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
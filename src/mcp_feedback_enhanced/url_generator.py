@@ -11,21 +11,35 @@ URL 生成器
 - URL 安全性验证
 - 路由管理
 - 域名和端口配置
+
+会话令牌为无状态的 HMAC 签名令牌，格式为 `<过期时间>.<签名>`，签名覆盖
+会话 ID 和过期时间。验证只需重新计算一次 HMAC，服务器不保存任何令牌，
+因此共享同一密钥（MCP_URL_SECRET）的任意进程都能验证任意会话 URL。
 """
 
 import os
+import re
 import hashlib
+import hmac
 import secrets
+import time
 from typing import Optional, Dict, Any
 from urllib.parse import urljoin, urlparse
 
 from .debug import debug_log
 
 
+# 令牌格式：十六进制过期时间戳.32位十六进制签名
+_TOKEN_PATTERN = re.compile(r"([0-9a-f]{1,16})\.([0-9a-f]{32})")
+
 class URLGenerator:
     """URL 生成器"""
     
-    def __init__(self, base_host: str = "localhost", base_port: int = 8766, use_https: bool = False):
+    # 默认令牌有效期（秒）
+    DEFAULT_TOKEN_TTL = 3600
+    
+    def __init__(self, base_host: str = "localhost", base_port: int = 8766, use_https: bool = False,
+                 secret: Optional[str] = None, token_ttl: int = DEFAULT_TOKEN_TTL):
         """
         初始化 URL 生成器
         
@@ -33,11 +47,14 @@ class URLGenerator:
             base_host: 基础主机地址
             base_port: 基础端口
             use_https: 是否使用 HTTPS
+            secret: 令牌签名密钥，未提供时生成进程内随机密钥
+            token_ttl: 默认令牌有效期（秒）
         """
         self.base_host = base_host
         self.base_port = base_port
         self.use_https = use_https
-        self._url_tokens: Dict[str, str] = {}  # session_id -> token 映射
+        self.token_ttl = token_ttl
+        self._secret = (secret or secrets.token_hex(32)).encode()
         
     @property
     def base_url(self) -> str:
@@ -48,20 +65,21 @@ class URLGenerator:
         else:
             return f"{scheme}://{self.base_host}:{self.base_port}"
     
-    def generate_session_url(self, session_id: str, include_token: bool = True) -> str:
+    def generate_session_url(self, session_id: str, include_token: bool = True,
+                             ttl: Optional[int] = None) -> str:
         """
         生成会话 URL
         
         Args:
             session_id: 会话 ID
             include_token: 是否包含安全令牌
+            ttl: 令牌有效期（秒），None 表示使用默认有效期
             
         Returns:
             str: 会话 URL
         """
         if include_token:
-            token = self._generate_session_token(session_id)
-            self._url_tokens[session_id] = token
+            token = self._generate_session_token(session_id, ttl)
             url_path = f"/session/{session_id}?token={token}"
         else:
             url_path = f"/session/{session_id}"
@@ -81,22 +99,23 @@ class URLGenerator:
         Returns:
             bool: 是否有访问权限
         """
-        # 如果没有设置令牌，允许访问（向后兼容）
-        if session_id not in self._url_tokens:
-            debug_log(f"会话 {session_id} 没有设置令牌，允许访问")
-            return True
+        if not token:
+            debug_log(f"会话 {session_id} 缺少令牌")
+            return False
         
-        # 验证令牌
-        expected_token = self._url_tokens.get(session_id)
-        if not expected_token:
-            debug_log(f"会话 {session_id} 令牌不存在")
+        match = _TOKEN_PATTERN.fullmatch(token)
+        if not match:
+            debug_log(f"会话 {session_id} 令牌格式无效")
             return False
+        expires_part, signature = match.groups()
+        expires_at = int(expires_part, 16)
         
-        if not token:
-            debug_log(f"会话 {session_id} 缺少令牌")
+        if expires_at < time.time():
+            debug_log(f"会话 {session_id} 令牌已过期")
             return False
         
-        is_valid = secrets.compare_digest(expected_token, token)
+        # 常量时间比较签名（格式已校验为 ASCII 十六进制）
+        is_valid = hmac.compare_digest(self._sign(session_id, expires_at), signature)
         debug_log(f"会话 {session_id} 令牌验证: {'通过' if is_valid else '失败'}")
         return is_valid
     
@@ -104,12 +123,13 @@ class URLGenerator:
         """
         撤销会话令牌
         
+        令牌是无状态的，无法单独撤销：会话删除后其 URL 返回 404，
+        令牌也会在过期时间后自动失效。需要立即作废所有令牌时请更换密钥。
+        
         Args:
             session_id: 会话 ID
         """
-        if session_id in self._url_tokens:
-            del self._url_tokens[session_id]
-            debug_log(f"撤销会话 {session_id} 的令牌")
+        debug_log(f"会话 {session_id} 的令牌将在过期后失效")
     
     def generate_api_url(self, endpoint: str) -> str:
         """
@@ -126,23 +146,25 @@ class URLGenerator:
         
         return urljoin(self.base_url, endpoint)
     
-    def _generate_session_token(self, session_id: str) -> str:
+    def _generate_session_token(self, session_id: str, ttl: Optional[int] = None) -> str:
         """
         生成会话安全令牌
         
         Args:
             session_id: 会话 ID
+            ttl: 有效期（秒），None 表示使用默认有效期
             
         Returns:
-            str: 安全令牌
+            str: 安全令牌（`<过期时间十六进制>.<签名>`）
         """
-        # 使用会话 ID 和随机数生成令牌
-        random_bytes = secrets.token_bytes(16)
-        token_data = f"{session_id}:{random_bytes.hex()}"
-        
-        # 使用 SHA-256 生成最终令牌
-        token_hash = hashlib.sha256(token_data.encode()).hexdigest()
-        return token_hash[:32]  # 取前32位作为令牌
+        ttl = int(ttl or 0)
+        expires_at = int(time.time()) + (ttl if ttl > 0 else self.token_ttl)
+        return f"{expires_at:x}.{self._sign(session_id, expires_at)}"
+    
+    def _sign(self, session_id: str, expires_at: int) -> str:
+        """计算会话 ID 和过期时间的 HMAC-SHA256 签名（取前32位）"""
+        message = f"{session_id}:{expires_at:x}".encode()
+        return hmac.new(self._secret, message, hashlib.sha256).hexdigest()[:32]
     
     @classmethod
     def from_env(cls) -> 'URLGenerator':
@@ -155,8 +177,11 @@ class URLGenerator:
         host = os.getenv('MCP_HTTP_HOST', 'localhost')
         port = int(os.getenv('MCP_HTTP_PORT', '8766'))
         use_https = os.getenv('MCP_USE_HTTPS', '').lower() in ('true', '1', 'yes')
+        secret = os.getenv('MCP_URL_SECRET') or None
+        token_ttl = int(os.getenv('MCP_URL_TOKEN_TTL', str(cls.DEFAULT_TOKEN_TTL)))
         
-        return cls(base_host=host, base_port=port, use_https=use_https)
+        return cls(base_host=host, base_port=port, use_https=use_https,
+                   secret=secret, token_ttl=token_ttl)
     
     def get_config_info(self) -> Dict[str, Any]:
         """
@@ -170,7 +195,7 @@ class URLGenerator:
             "base_port": self.base_port,
             "use_https": self.use_https,
             "base_url": self.base_url,
-            "active_tokens": len(self._url_tokens)
+            "token_ttl": self.token_ttl
         }
 
 
@@ -192,18 +217,20 @@ def set_url_generator(generator: URLGenerator):
     _url_generator = generator
 
 
-def generate_session_url(session_id: str, include_token: bool = True) -> str:
+def generate_session_url(session_id: str, include_token: bool = True,
+                         ttl: Optional[int] = None) -> str:
     """
     便捷函数：生成会话 URL
     
     Args:
         session_id: 会话 ID
         include_token: 是否包含安全令牌
+        ttl: 令牌有效期（秒）
         
     Returns:
         str: 会话 URL
     """
-    return get_url_generator().generate_session_url(session_id, include_token)
+    return get_url_generator().generate_session_url(session_id, include_token, ttl)
 
 
 def validate_session_access(session_id: str, token: Optional[str] = None) -> bool:
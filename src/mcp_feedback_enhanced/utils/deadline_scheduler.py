@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+截止時間調度器
+==============
+
+以單一背景線程和最小堆調度到期回調，取代每個會話各自的 threading.Timer。
+
+- 安排 / 重新安排 / 取消：O(log n)
+- 無論登記多少個回調，都只佔用一個線程
+"""
+
+import threading
+import time
+from typing import Callable, Optional
+
+from ..debug import debug_log
+from .error_handler import ErrorHandler, ErrorType
+from .expiry_index import ExpiryIndex
+
+
+class ScheduledCall:
+    """已安排的回調，可用於重新安排或取消"""
+
+    __slots__ = ("callback", "deadline", "_scheduler")
+
+    def __init__(self, scheduler: "DeadlineScheduler", callback: Callable[[], None], deadline: float):
+        self._scheduler = scheduler
+        self.callback = callback
+        self.deadline = deadline
+
+    def cancel(self) -> bool:
+        """取消回調"""
+        return self._scheduler.cancel(self)
+
+    def reschedule(self, delay: float):
+        """重新安排為 delay 秒後觸發"""
+        self._scheduler.reschedule(self, delay)
+
+
+class DeadlineScheduler:
+    """截止時間調度器（線程安全，使用 time.monotonic() 計時）"""
+
+    def __init__(self, name: str = "DeadlineScheduler"):
+        self.name = name
+        self._index = ExpiryIndex()
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+    def call_later(self, delay: float, callback: Callable[[], None]) -> ScheduledCall:
+        """
+        安排回調在 delay 秒後於調度線程中執行
+
+        Args:
+            delay: 延遲時間（秒）
+            callback: 無參數回調函數
+
+        Returns:
+            ScheduledCall: 回調句柄
+        """
+        handle = ScheduledCall(self, callback, 0.0)
+        self.reschedule(handle, delay)
+        return handle
+
+    def reschedule(self, handle: ScheduledCall, delay: float):
+        """重新安排回調（已觸發或已取消的回調也會重新登記）"""
+        handle.deadline = time.monotonic() + delay
+        with self._condition:
+            self._index.schedule(handle, handle.deadline)
+            self._ensure_thread()
+            self._condition.notify()
+
+    def cancel(self, handle: ScheduledCall) -> bool:
+        """取消回調，返回是否仍在等待中"""
+        return self._index.discard(handle)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def _ensure_thread(self):
+        """按需啟動調度線程（需在 _condition 內調用）"""
+        if self._thread is None or not self._thread.is_alive():
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        """調度線程主循環"""
+        while True:
+            with self._condition:
+                if not self._running:
+                    return
+
+                next_deadline = self._index.next_deadline()
+                now = time.monotonic()
+                if next_deadline is None:
+                    self._condition.wait()
+                    continue
+                if next_deadline > now:
+                    self._condition.wait(next_deadline - now)
+                    continue
+
+            for handle in self._index.pop_expired(time.monotonic()):
+                try:
+                    handle.callback()
+                except Exception as e:
+                    error_id = ErrorHandler.log_error_with_context(
+                        e,
+                        context={"operation": "調度回調", "scheduler": self.name},
+                        error_type=ErrorType.SYSTEM
+                    )
+                    debug_log(f"調度回調執行失敗 [錯誤ID: {error_id}]: {e}")
+
+    def shutdown(self):
+        """停止調度線程並丟棄所有待執行回調"""
+        with self._condition:
+            self._running = False
+            self._index.clear()
+            self._condition.notify_all()
+        self._thread = None
+
+
+# 全局調度器實例
+_deadline_scheduler: Optional[DeadlineScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_deadline_scheduler() -> DeadlineScheduler:
+    """獲取全局截止時間調度器實例"""
+    global _deadline_scheduler
+    if _deadline_scheduler is None:
+        with _scheduler_lock:
+            if _deadline_scheduler is None:
+                _deadline_scheduler = DeadlineScheduler()
+    return _deadline_scheduler
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+過期索引
+========
+
+以最小堆按截止時間索引鍵值，供會話過期清理使用。
+
+- 安排 / 重新安排 / 取消：O(log n)（取消為惰性刪除，O(1)）
+- 取出已過期項目：O(k log n)，k 為實際過期的數量
+- 查詢截止時間：O(1)
+
+清理時不再需要遍歷全部會話。
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from typing import Dict, Hashable, List, Optional, Tuple
+
+
+class ExpiryIndex:
+    """基於最小堆的過期索引（線程安全）"""
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, Hashable]] = []
+        self._entries: Dict[Hashable, Tuple[float, int]] = {}  # key -> (截止時間, 序號)
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def schedule(self, key: Hashable, deadline: float):
+        """
+        安排或重新安排鍵的截止時間
+
+        Args:
+            key: 鍵（如會話 ID）
+            deadline: 截止時間（time.time() 時間戳）
+        """
+        with self._lock:
+            seq = next(self._counter)
+            self._entries[key] = (deadline, seq)
+            heapq.heappush(self._heap, (deadline, seq, key))
+            self._maybe_compact()
+
+    def discard(self, key: Hashable) -> bool:
+        """移除鍵，堆中的舊項目在取出時忽略"""
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    def deadline(self, key: Hashable) -> Optional[float]:
+        """獲取鍵的截止時間，不存在時返回 None"""
+        entry = self._entries.get(key)
+        return entry[0] if entry else None
+
+    def next_deadline(self) -> Optional[float]:
+        """獲取最早的有效截止時間"""
+        with self._lock:
+            self._drop_stale_head()
+            return self._heap[0][0] if self._heap else None
+
+    def pop_expired(self, now: Optional[float] = None) -> List[Hashable]:
+        """
+        取出並移除所有截止時間不晚於 now 的鍵
+
+        Args:
+            now: 當前時間戳，None 使用 time.time()
+
+        Returns:
+            List[Hashable]: 已過期的鍵（按截止時間排序）
+        """
+        if now is None:
+            now = time.time()
+
+        expired = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                deadline, seq, key = heapq.heappop(self._heap)
+                if self._entries.get(key) == (deadline, seq):
+                    del self._entries[key]
+                    expired.append(key)
+        return expired
+
+    def clear(self):
+        """清空索引"""
+        with self._lock:
+            self._heap.clear()
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def _drop_stale_head(self):
+        """丟棄堆頂已失效的項目"""
+        while self._heap:
+            deadline, seq, key = self._heap[0]
+            if self._entries.get(key) == (deadline, seq):
+                return
+            heapq.heappop(self._heap)
+
+    def _maybe_compact(self):
+        """失效項目過多時重建堆，避免頻繁重新安排導致堆無限增長"""
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [(deadline, seq, key) for key, (deadline, seq) in self._entries.items()]
+            heapq.heapify(self._heap)
@@ -0,0 +1,488 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+回饋歷史存檔
+============
+
+以只追加的 SQLite 資料庫（WAL 模式）保存每次收集到的回饋，
+按會話 ID、專案目錄和時間建立索引，可查詢、審計和重放過去的回饋。
+
+- 圖片以內容定址方式保存（images/<sha256 前兩位>/<sha256><副檔名>），相同圖片只存一份
+- 寫入在背景線程中執行，不計入工具調用延遲
+- 超過保留期限或總大小上限的最舊記錄會被刪除，不再被引用的圖片文件一併清理
+
+存檔會保存回饋內容、命令日誌和截圖，因此預設停用，需明確啟用。
+
+環境變數：
+- MCP_FEEDBACK_ARCHIVE: 是否啟用（預設 false）
+- MCP_FEEDBACK_ARCHIVE_DIR: 存檔目錄（預設 ~/.cache/mcp-feedback-enhanced/feedback_archive）
+- MCP_FEEDBACK_ARCHIVE_MAX_AGE: 記錄保留天數（預設 30，0 表示不限制）
+- MCP_FEEDBACK_ARCHIVE_MAX_BYTES: 存檔總大小上限（預設 512 MiB，0 表示不限制）
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from ..debug import debug_log
+from .error_handler import ErrorHandler, ErrorType
+from .image_artifact import ImageArtifact
+
+
+DEFAULT_ARCHIVE_DIR = Path.home() / ".cache" / "mcp-feedback-enhanced" / "feedback_archive"
+
+DEFAULT_MAX_AGE_DAYS = 30
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# 兩次自動清理之間的最短間隔（秒）
+PRUNE_INTERVAL = 60.0
+# 剛寫入的圖片文件可能尚未登記到數據庫，清理孤立圖片時略過
+_ORPHAN_GRACE_SECONDS = 300.0
+# 超過大小上限時每輪刪除的最舊記錄比例
+_PRUNE_BATCH_RATIO = 0.1
+
+# 查詢結果列表的欄位（不含日誌和設定等大欄位）
+_SUMMARY_COLUMNS = ("id", "session_id", "project_directory", "created_at", "summary", "feedback", "image_count")
+
+
+class FeedbackArchive:
+    """回饋歷史存檔（線程安全）"""
+
+    def __init__(self, directory: Optional[str] = None,
+                 max_age: Optional[float] = DEFAULT_MAX_AGE_DAYS * 86400,
+                 max_bytes: Optional[int] = DEFAULT_MAX_BYTES):
+        """
+        初始化存檔
+
+        Args:
+            directory: 存檔目錄，None 使用預設路徑
+            max_age: 記錄保留時間（秒），None 表示不限制
+            max_bytes: 存檔總大小上限（位元組），None 表示不限制
+        """
+        self.directory = Path(directory or DEFAULT_ARCHIVE_DIR)
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self._last_prune: Optional[float] = None
+        self.image_dir = self.directory / "images"
+        self.path = str(self.directory / "archive.db")
+        self.image_dir.mkdir(parents=True, exist_ok=True)
+
+        # 每個線程使用獨立連接
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+
+        # 背景寫入線程（單線程，按提交順序寫入）
+        self._writer: Optional[ThreadPoolExecutor] = None
+        self._writer_lock = threading.Lock()
+
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS feedback ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " session_id TEXT,"
+            " project_directory TEXT,"
+            " created_at REAL NOT NULL,"
+            " summary TEXT,"
+            " feedback TEXT,"
+            " command_logs TEXT,"
+            " settings TEXT,"
+            " image_count INTEGER NOT NULL DEFAULT 0)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS feedback_images ("
+            " feedback_id INTEGER NOT NULL,"
+            " position INTEGER NOT NULL,"
+            " sha256 TEXT NOT NULL,"
+            " name TEXT,"
+            " mime_type TEXT,"
+            " size INTEGER NOT NULL,"
+            " PRIMARY KEY (feedback_id, position))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_feedback_session ON feedback (session_id, created_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_feedback_project ON feedback (project_directory, created_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_feedback_created ON feedback (created_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_feedback_images_sha256 ON feedback_images (sha256)")
+
+        debug_log(f"回饋歷史存檔已初始化: {self.path}")
+
+    def _connect(self) -> sqlite3.Connection:
+        """獲取當前線程的數據庫連接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def record(self, feedback_data: Dict[str, Any], session_id: Optional[str] = None,
+               project_directory: Optional[str] = None, summary: Optional[str] = None) -> int:
+        """
+        保存一次回饋
+
+        Args:
+            feedback_data: 回饋資料字典（interactive_feedback / command_logs / images / settings）
+            session_id: 會話ID，None 時取 feedback_data["session_id"]
+            project_directory: 專案目錄
+            summary: AI 工作摘要
+
+        Returns:
+            int: 存檔記錄 ID
+        """
+        # 先寫入圖片文件，數據庫記錄只引用內容雜湊
+        images = []
+        for img in feedback_data.get("images") or []:
+            artifact = ImageArtifact.of(dict(img)) if isinstance(img, dict) else None
+            if artifact and artifact.is_valid():
+                images.append((self._store_image(artifact), artifact))
+
+        command_logs = feedback_data.get("command_logs") or feedback_data.get("logs") or ""
+        settings = feedback_data.get("settings") or {}
+
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.execute(
+                "INSERT INTO feedback (session_id, project_directory, created_at, summary, feedback,"
+                " command_logs, settings, image_count) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    session_id or feedback_data.get("session_id"),
+                    project_directory,
+                    time.time(),
+                    summary,
+                    feedback_data.get("interactive_feedback", ""),
+                    command_logs if isinstance(command_logs, str) else "\n".join(map(str, command_logs)),
+                    json.dumps(settings, ensure_ascii=False, default=str),
+                    len(images)
+                )
+            )
+            feedback_id = cursor.lastrowid
+            conn.executemany(
+                "INSERT INTO feedback_images (feedback_id, position, sha256, name, mime_type, size)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (feedback_id, position, sha256, artifact.name, artifact.mime_type, artifact.size)
+                    for position, (sha256, artifact) in enumerate(images)
+                ]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        debug_log(f"回饋已存檔: #{feedback_id}（會話 {session_id}，{len(images)} 張圖片）")
+        return feedback_id
+
+    def record_in_background(self, feedback_data: Dict[str, Any], **kwargs) -> Future:
+        """
+        在背景線程中保存回饋
+
+        Args:
+            feedback_data: 回饋資料字典（提交時做淺拷貝，圖片數據不複製）
+            **kwargs: 傳給 record 的其他參數
+
+        Returns:
+            Future: 完成時結果為存檔記錄 ID
+        """
+        if self._writer is None:
+            with self._writer_lock:
+                if self._writer is None:
+                    self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="FeedbackArchive")
+
+        snapshot = dict(feedback_data)
+        if isinstance(snapshot.get("images"), list):
+            snapshot["images"] = list(snapshot["images"])
+
+        future = self._writer.submit(self._record_and_prune, snapshot, **kwargs)
+        future.add_done_callback(self._log_record_error)
+        return future
+
+    def _record_and_prune(self, feedback_data: Dict[str, Any], **kwargs) -> int:
+        """保存回饋，距上次清理超過 PRUNE_INTERVAL 時順帶清理（在寫入線程中執行）"""
+        feedback_id = self.record(feedback_data, **kwargs)
+        if self._last_prune is None or time.monotonic() - self._last_prune >= PRUNE_INTERVAL:
+            try:
+                self.prune()
+            except Exception as e:
+                error_id = ErrorHandler.log_error_with_context(
+                    e,
+                    context={"operation": "清理回饋存檔"},
+                    error_type=ErrorType.FILE_IO
+                )
+                debug_log(f"清理回饋存檔失敗 [錯誤ID: {error_id}]: {e}")
+        return feedback_id
+
+    def prune(self) -> int:
+        """
+        刪除超過保留期限或超出大小上限的最舊記錄，並清理不再被引用的圖片
+
+        Returns:
+            int: 刪除的記錄數量
+        """
+        self._last_prune = time.monotonic()
+        conn = self._connect()
+        deleted = 0
+
+        if self.max_age:
+            deleted += self._delete_where("created_at < ?", (time.time() - self.max_age,))
+
+        if self.max_bytes:
+            while self.total_bytes() > self.max_bytes:
+                total = self.count()
+                if total == 0:
+                    break
+                batch = max(1, int(total * _PRUNE_BATCH_RATIO))
+                deleted += self._delete_where(
+                    "id IN (SELECT id FROM feedback ORDER BY created_at, id LIMIT ?)", (batch,)
+                )
+
+        removed_images = self._remove_orphan_images(
+            {row[0] for row in conn.execute("SELECT DISTINCT sha256 FROM feedback_images")}
+        )
+        if deleted or removed_images:
+            debug_log(f"回饋存檔已清理: 刪除 {deleted} 條記錄、{removed_images} 個圖片文件")
+        return deleted
+
+    def _delete_where(self, condition: str, params: tuple) -> int:
+        """刪除符合條件的記錄及其圖片明細"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.execute(f"DELETE FROM feedback WHERE {condition}", params)
+            conn.execute("DELETE FROM feedback_images WHERE feedback_id NOT IN (SELECT id FROM feedback)")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return cursor.rowcount
+
+    def _remove_orphan_images(self, referenced: set) -> int:
+        """刪除沒有記錄引用的圖片文件和殘留的臨時文件"""
+        cutoff = time.time() - _ORPHAN_GRACE_SECONDS
+        removed = 0
+        for path in self.image_dir.glob("*/*"):
+            sha256 = path.name.split(".", 1)[0]
+            if sha256 in referenced and not path.name.endswith(".tmp"):
+                continue
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed += 1
+            except OSError:
+                continue
+        return removed
+
+    def total_bytes(self) -> int:
+        """存檔內容的總大小（文字欄位加上不重複的圖片）"""
+        conn = self._connect()
+        text_bytes = conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(CAST(COALESCE(summary, '') AS BLOB))"
+            " + LENGTH(CAST(COALESCE(feedback, '') AS BLOB))"
+            " + LENGTH(CAST(COALESCE(command_logs, '') AS BLOB))"
+            " + LENGTH(CAST(COALESCE(settings, '') AS BLOB))), 0) FROM feedback"
+        ).fetchone()[0]
+        image_bytes = conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM"
+            " (SELECT MAX(size) AS size FROM feedback_images GROUP BY sha256)"
+        ).fetchone()[0]
+        return text_bytes + image_bytes
+
+    @staticmethod
+    def _log_record_error(future: Future):
+        """記錄背景存檔失敗"""
+        if future.cancelled() or future.exception() is None:
+            return
+
+        e = future.exception()
+        error_id = ErrorHandler.log_error_with_context(
+            e,
+            context={"operation": "回饋存檔"},
+            error_type=ErrorType.FILE_IO
+        )
+        debug_log(f"回饋存檔失敗 [錯誤ID: {error_id}]: {e}")
+
+    def _store_image(self, artifact: ImageArtifact) -> str:
+        """按內容雜湊保存圖片，已存在時不重複寫入，返回 sha256"""
+        sha256 = hashlib.sha256(artifact.data).hexdigest()
+        path = self._image_path(sha256, artifact.extension)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+            with open(temp_path, "wb") as f:
+                f.write(artifact.data)
+            os.replace(temp_path, path)
+        return sha256
+
+    def _image_path(self, sha256: str, extension: str) -> Path:
+        return self.image_dir / sha256[:2] / f"{sha256}{extension}"
+
+    def query(self, session_id: Optional[str] = None, project_directory: Optional[str] = None,
+              since: Optional[float] = None, until: Optional[float] = None,
+              limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+        """
+        查詢回饋記錄（按時間倒序）
+
+        Args:
+            session_id: 只返回此會話的記錄
+            project_directory: 只返回此專案目錄的記錄
+            since: 起始時間戳（含）
+            until: 結束時間戳（不含）
+            limit: 最多返回條數
+            offset: 跳過條數
+
+        Returns:
+            List[Dict[str, Any]]: 記錄摘要（不含日誌、設定和圖片明細）
+        """
+        conditions, params = [], []
+        for column, operator, value in (
+            ("session_id", "=", session_id),
+            ("project_directory", "=", project_directory),
+            ("created_at", ">=", since),
+            ("created_at", "<", until),
+        ):
+            if value is not None:
+                conditions.append(f"{column} {operator} ?")
+                params.append(value)
+
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self._connect().execute(
+            f"SELECT {', '.join(_SUMMARY_COLUMNS)} FROM feedback{where}"
+            " ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?",
+            (*params, limit, offset)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get(self, feedback_id: int) -> Optional[Dict[str, Any]]:
+        """獲取完整的回饋記錄（含日誌、設定和圖片明細）"""
+        conn = self._connect()
+        row = conn.execute("SELECT * FROM feedback WHERE id = ?", (feedback_id,)).fetchone()
+        if row is None:
+            return None
+
+        record = dict(row)
+        record["settings"] = json.loads(record["settings"] or "{}")
+        record["images"] = [
+            dict(image)
+            for image in conn.execute(
+                "SELECT sha256, name, mime_type, size FROM feedback_images"
+                " WHERE feedback_id = ? ORDER BY position", (feedback_id,)
+            ).fetchall()
+        ]
+        return record
+
+    def image_file(self, sha256: str) -> Optional[Path]:
+        """按 sha256 查找已保存的圖片文件"""
+        if len(sha256) != 64 or not all(c in "0123456789abcdef" for c in sha256):
+            return None
+
+        directory = self.image_dir / sha256[:2]
+        if not directory.is_dir():
+            return None
+        return next(
+            (path for path in directory.glob(f"{sha256}.*") if not path.name.endswith(".tmp")),
+            None
+        )
+
+    def load_image(self, sha256: str) -> Optional[bytes]:
+        """按 sha256 讀取圖片內容"""
+        path = self.image_file(sha256)
+        return path.read_bytes() if path else None
+
+    def count(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM feedback").fetchone()[0]
+
+    def flush(self, timeout: Optional[float] = None):
+        """等待已提交的背景寫入完成"""
+        if self._writer is not None:
+            self._writer.submit(lambda: None).result(timeout)
+
+    def close(self):
+        """等待背景寫入完成並關閉所有連接"""
+        if self._writer is not None:
+            self._writer.shutdown(wait=True)
+            self._writer = None
+
+        with self._connections_lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            self._connections.clear()
+        self._local = threading.local()
+
+
+def _env_number(name: str, default: float) -> float:
+    """讀取非負數值環境變數，格式錯誤時使用預設值"""
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        number = float(value)
+    except ValueError:
+        debug_log(f"{name} 格式錯誤 ({value})，必須為數字，使用預設值 {default}")
+        return default
+    if number < 0:
+        debug_log(f"{name} 值無效 ({number})，使用預設值 {default}")
+        return default
+    return number
+
+
+# 全域存檔實例
+_feedback_archive: Optional[FeedbackArchive] = None
+_archive_lock = threading.Lock()
+
+
+def get_feedback_archive() -> Optional[FeedbackArchive]:
+    """獲取全域回饋歷史存檔實例，停用或無法初始化時返回 None"""
+    global _feedback_archive
+    if os.getenv("MCP_FEEDBACK_ARCHIVE", "false").lower() not in ("true", "1", "yes", "on"):
+        return None
+
+    if _feedback_archive is None:
+        with _archive_lock:
+            if _feedback_archive is None:
+                try:
+                    max_age_days = _env_number("MCP_FEEDBACK_ARCHIVE_MAX_AGE", DEFAULT_MAX_AGE_DAYS)
+                    max_bytes = int(_env_number("MCP_FEEDBACK_ARCHIVE_MAX_BYTES", DEFAULT_MAX_BYTES))
+                    _feedback_archive = FeedbackArchive(
+                        os.getenv("MCP_FEEDBACK_ARCHIVE_DIR") or None,
+                        max_age=max_age_days * 86400 or None,
+                        max_bytes=max_bytes or None
+                    )
+                except Exception as e:
+                    error_id = ErrorHandler.log_error_with_context(
+                        e,
+                        context={"operation": "初始化回饋存檔"},
+                        error_type=ErrorType.FILE_IO
+                    )
+                    debug_log(f"初始化回饋存檔失敗 [錯誤ID: {error_id}]: {e}")
+                    return None
+    return _feedback_archive
+
+
+def archive_feedback(feedback_data: Dict[str, Any], **kwargs) -> Optional[Future]:
+    """
+    在背景保存一次回饋（存檔停用時不做任何事）
+
+    Args:
+        feedback_data: 回饋資料字典
+        **kwargs: session_id / project_directory / summary
+
+    Returns:
+        Optional[Future]: 背景寫入的 Future，存檔停用時返回 None
+    """
+    archive = get_feedback_archive()
+    if archive is None:
+        return None
+    return archive.record_in_background(feedback_data, **kwargs)
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+圖片資源快取
+============
+
+回饋結果中的每張圖片包裝為一個 ImageArtifact，原始位元組、base64、
+MIME 類型和大小都在第一次使用時計算並快取，供回饋文字、結果存檔和
+MCP 圖片內容共用，同一張圖片在一次工具調用中最多只編碼一次。
+
+MIME 類型按文件頭（magic bytes）判斷，只在無法識別時才按文件名後綴推測。
+"""
+
+import base64
+import binascii
+from typing import Any, Dict, List, Optional, Union
+
+
+# 圖片字典中快取 ImageArtifact 的鍵（以底線開頭，序列化時應略過）
+ARTIFACT_KEY = "_artifact"
+
+# 圖片字典中保存 MIME 類型的鍵（可序列化，隨圖片記錄一起保存）
+MIME_TYPE_KEY = "mime_type"
+
+# 判斷格式所需的文件頭長度
+SNIFF_BYTES = 12
+
+# 文件名後綴與 MIME 類型對照（無法判斷時使用 PNG）
+_SUFFIX_MIME_TYPES = (
+    ((".jpg", ".jpeg"), "image/jpeg"),
+    ((".gif",), "image/gif"),
+    ((".webp",), "image/webp"),
+    ((".bmp",), "image/bmp"),
+)
+DEFAULT_MIME_TYPE = "image/png"
+
+# MIME 類型對應的副檔名
+_MIME_EXTENSIONS = {
+    "image/png": ".png",
+    "image/jpeg": ".jpg",
+    "image/gif": ".gif",
+    "image/webp": ".webp",
+    "image/bmp": ".bmp",
+}
+
+
+def detect_image_mime(header: bytes) -> Optional[str]:
+    """
+    按文件頭判斷圖片 MIME 類型
+
+    Args:
+        header: 圖片開頭的位元組（至少 SNIFF_BYTES 個）
+
+    Returns:
+        Optional[str]: PNG / JPEG / GIF / WebP / BMP 的 MIME 類型，無法識別時返回 None
+    """
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if header.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if header.startswith((b"GIF87a", b"GIF89a")):
+        return "image/gif"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    if header.startswith(b"BM"):
+        return "image/bmp"
+    return None
+
+
+def guess_mime_from_name(name: str) -> str:
+    """按文件名後綴推測 MIME 類型（無法判斷時使用 PNG）"""
+    lower_name = (name or "").lower()
+    return next(
+        (mime for suffixes, mime in _SUFFIX_MIME_TYPES if lower_name.endswith(suffixes)),
+        DEFAULT_MIME_TYPE
+    )
+
+
+class ImageArtifact:
+    """單張圖片的延遲計算快取"""
+
+    __slots__ = ("name", "_bytes", "_base64", "_mime_type")
+
+    def __init__(self, data: Union[bytes, bytearray, str], name: str = "image.png"):
+        """
+        初始化圖片資源
+
+        Args:
+            data: 原始位元組，或 base64 字符串
+            name: 文件名
+        """
+        self.name = name or "image.png"
+        self._bytes: Optional[bytes] = None
+        self._base64: Optional[str] = None
+        self._mime_type: Optional[str] = None
+
+        if isinstance(data, str):
+            self._base64 = data
+        else:
+            self._bytes = bytes(data)
+
+    @classmethod
+    def of(cls, image: Dict[str, Any]) -> Optional["ImageArtifact"]:
+        """
+        獲取圖片字典對應的 ImageArtifact，首次調用時創建並快取在字典中
+
+        Args:
+            image: 含 name / data 的圖片字典
+
+        Returns:
+            Optional[ImageArtifact]: 沒有圖片數據時返回 None
+        """
+        artifact = image.get(ARTIFACT_KEY)
+        if isinstance(artifact, cls):
+            return artifact
+
+        data = image.get("data")
+        if not isinstance(data, (bytes, bytearray, str)) or not data:
+            return None
+
+        artifact = cls(data, image.get("name", "image.png"))
+        if isinstance(image.get(MIME_TYPE_KEY), str):
+            # 沿用記錄中已判斷的 MIME 類型
+            artifact._mime_type = image[MIME_TYPE_KEY]
+        image[ARTIFACT_KEY] = artifact
+        return artifact
+
+    @property
+    def data(self) -> bytes:
+        """原始位元組（base64 輸入時首次訪問才解碼）"""
+        if self._bytes is None:
+            self._bytes = base64.b64decode(self._base64)
+        return self._bytes
+
+    @property
+    def base64(self) -> str:
+        """base64 字符串（首次訪問才編碼）"""
+        if self._base64 is None:
+            self._base64 = base64.b64encode(self._bytes).decode("ascii")
+        return self._base64
+
+    @property
+    def size(self) -> int:
+        """原始位元組數（base64 輸入時按長度推算，不需解碼）"""
+        if self._bytes is not None:
+            return len(self._bytes)
+        padding = len(self._base64) - len(self._base64.rstrip("="))
+        return len(self._base64) * 3 // 4 - padding
+
+    @property
+    def base64_length(self) -> int:
+        """base64 字符串長度（不需實際編碼）"""
+        if self._base64 is not None:
+            return len(self._base64)
+        return (len(self._bytes) + 2) // 3 * 4
+
+    def base64_preview(self, length: int = 50) -> str:
+        """base64 開頭預覽，只編碼預覽所需的位元組"""
+        if self._base64 is not None:
+            return self._base64[:length]
+        return base64.b64encode(self._bytes[:(length // 4 + 1) * 3]).decode("ascii")[:length]
+
+    @property
+    def header(self) -> bytes:
+        """圖片開頭的位元組（base64 輸入時只解碼開頭部分）"""
+        if self._bytes is not None:
+            return self._bytes[:SNIFF_BYTES]
+        try:
+            return base64.b64decode(self._base64[:(SNIFF_BYTES + 2) // 3 * 4])[:SNIFF_BYTES]
+        except (binascii.Error, ValueError):
+            return b""
+
+    @property
+    def detected_mime_type(self) -> Optional[str]:
+        """按文件頭判斷的 MIME 類型，無法識別時返回 None"""
+        return detect_image_mime(self.header)
+
+    @property
+    def mime_type(self) -> str:
+        """MIME 類型（優先按文件頭判斷，其次按文件名後綴）"""
+        if self._mime_type is None:
+            self._mime_type = self.detected_mime_type or guess_mime_from_name(self.name)
+        return self._mime_type
+
+    @property
+    def extension(self) -> str:
+        """與 MIME 類型對應的副檔名（如 .png）"""
+        return _MIME_EXTENSIONS.get(self.mime_type, ".png")
+
+    @property
+    def format(self) -> str:
+        """圖片格式（如 png、jpeg）"""
+        return self.mime_type.split("/", 1)[1]
+
+    def is_valid(self) -> bool:
+        """檢查圖片數據是否可用（非空且 base64 可解碼）"""
+        try:
+            return self.size > 0 and len(self.data) > 0
+        except (binascii.Error, ValueError):
+            return False
+
+    def __repr__(self) -> str:
+        return f"ImageArtifact(name={self.name!r}, mime_type={self.mime_type!r}, size={self.size})"
+
+
+def with_artifacts(images: Optional[List[Any]]) -> List[Any]:
+    """
+    複製圖片字典列表並附上 ImageArtifact
+
+    返回淺拷貝，快取不會寫回原始字典（例如會話存儲中的記錄）。
+    """
+    prepared = []
+    for image in images or []:
+        if isinstance(image, dict):
+            image = dict(image)
+            ImageArtifact.of(image)
+        prepared.append(image)
+    return prepared
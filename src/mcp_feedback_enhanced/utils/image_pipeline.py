@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+圖片縮放與重新壓縮
+==================
+
+在回饋結果返回給 MCP 客戶端之前，將過大的截圖縮小到設定的最大尺寸，
+可選擇重新壓縮為 WebP / JPEG，讓傳給模型的圖片負載大幅縮小；超過大小限制的
+圖片也會先嘗試縮小，而不是直接丟棄。
+
+此階段預設停用；啟用後預設只縮小尺寸並保持原格式，有損壓縮需另外以
+MCP_IMAGE_FORMAT 指定。
+
+- 需要 Pillow（可選依賴：pip install mcp-feedback-enhanced[image]），
+  未安裝時此階段自動停用，圖片保持原樣
+- 圖片解碼和編碼在專用線程池中執行（Pillow 編解碼時釋放 GIL），不阻塞事件循環；
+  不使用進程池，避免在已有多個線程的進程中 fork 導致子進程死鎖
+
+環境變數：
+- MCP_IMAGE_PIPELINE: 是否啟用（預設 false）
+- MCP_IMAGE_MAX_WIDTH / MCP_IMAGE_MAX_HEIGHT: 最大尺寸（預設 1920）
+- MCP_IMAGE_FORMAT: 目標格式 webp / jpeg / png / original（預設 original，只縮小尺寸）
+- MCP_IMAGE_QUALITY: 壓縮品質 1-100（預設 80）
+- MCP_IMAGE_MIN_BYTES: 尺寸未超出時，小於此大小的圖片不重新壓縮（預設 256 KiB）
+- MCP_IMAGE_WORKERS: 線程池大小（預設 2）
+"""
+
+import asyncio
+import importlib.util
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..debug import debug_log
+from .error_handler import ErrorHandler, ErrorType
+from .metrics import image_bytes_counter
+
+
+# 目標格式對應的 Pillow 格式名、MIME 類型和副檔名
+_FORMATS = {
+    "webp": ("WEBP", "image/webp", ".webp"),
+    "jpeg": ("JPEG", "image/jpeg", ".jpg"),
+    "png": ("PNG", "image/png", ".png"),
+}
+
+# 縮小後仍超過大小限制時，每次將最大尺寸縮小的比例及最多嘗試次數
+_SHRINK_FACTOR = 0.5
+_MAX_ATTEMPTS = 3
+
+
+def _env_int(name: str, default: int, minimum: int = 1, maximum: Optional[int] = None) -> int:
+    """讀取整數環境變數，格式錯誤或超出範圍時使用預設值"""
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        debug_log(f"{name} 格式錯誤 ({value})，必須為數字，使用預設值 {default}")
+        return default
+    if number < minimum or (maximum is not None and number > maximum):
+        debug_log(f"{name} 值無效 ({number})，使用預設值 {default}")
+        return default
+    return number
+
+
+@dataclass
+class ImagePipelineConfig:
+    """圖片處理配置"""
+
+    enabled: bool = False
+    max_width: int = 1920
+    max_height: int = 1920
+    target_format: str = "original"  # webp / jpeg / png / original
+    quality: int = 80
+    min_bytes: int = 256 * 1024
+    workers: int = 2
+
+    @classmethod
+    def from_env(cls) -> "ImagePipelineConfig":
+        """從環境變數創建配置"""
+        return cls(
+            enabled=os.getenv("MCP_IMAGE_PIPELINE", "false").lower() in ("true", "1", "yes", "on"),
+            max_width=_env_int("MCP_IMAGE_MAX_WIDTH", 1920),
+            max_height=_env_int("MCP_IMAGE_MAX_HEIGHT", 1920),
+            target_format=os.getenv("MCP_IMAGE_FORMAT", "original").lower(),
+            quality=_env_int("MCP_IMAGE_QUALITY", 80, maximum=100),
+            min_bytes=_env_int("MCP_IMAGE_MIN_BYTES", 256 * 1024, minimum=0),
+            workers=_env_int("MCP_IMAGE_WORKERS", 2)
+        )
+
+
+def _transform_image(data: bytes, max_width: int, max_height: int, target_format: str,
+                     quality: int, recompress: bool, force: bool) -> Optional[Tuple[bytes, str, str]]:
+    """
+    縮小並重新壓縮圖片（在工作線程中執行）
+
+    Args:
+        data: 原始圖片位元組
+        max_width: 最大寬度
+        max_height: 最大高度
+        target_format: 目標格式（webp / jpeg / png / original）
+        quality: 壓縮品質
+        recompress: 尺寸未超出時是否仍重新壓縮
+        force: 即使結果沒有變小也返回（用於超過大小限制的圖片）
+
+    Returns:
+        Optional[Tuple[bytes, str, str]]: (新數據, MIME 類型, 副檔名)；無需處理時返回 None
+    """
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        # 動畫圖片重新編碼會丟失動畫，保持原樣
+        if getattr(image, "is_animated", False):
+            return None
+
+        resized = image.width > max_width or image.height > max_height
+        if not resized and not force and (not recompress or target_format == "original"):
+            return None
+
+        pil_format, mime_type, extension = _FORMATS.get(
+            target_format, _FORMATS.get((image.format or "").lower(), _FORMATS["png"])
+        )
+
+        image.thumbnail((max_width, max_height))
+
+        if pil_format == "JPEG" and image.mode not in ("RGB", "L"):
+            # JPEG 不支援透明通道，以白色背景合成
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            converted = image.convert("RGBA")
+            background.paste(converted, mask=converted.getchannel("A"))
+            image = background
+        elif pil_format == "WEBP" and image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+
+        output = io.BytesIO()
+        save_options = {"optimize": True} if pil_format == "PNG" else {"quality": quality}
+        image.save(output, format=pil_format, **save_options)
+
+    result = output.getvalue()
+    if not resized and not force and len(result) >= len(data):
+        return None
+    return result, mime_type, extension
+
+
+class ImagePipeline:
+    """圖片縮放與重新壓縮階段"""
+
+    def __init__(self, config: Optional[ImagePipelineConfig] = None):
+        self.config = config or ImagePipelineConfig.from_env()
+        self._pillow_available = importlib.util.find_spec("PIL") is not None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+        if self.config.enabled and not self._pillow_available:
+            debug_log("未安裝 Pillow，圖片縮放與重新壓縮已停用")
+
+    @property
+    def available(self) -> bool:
+        """是否已啟用且 Pillow 可用"""
+        return self.config.enabled and self._pillow_available
+
+    async def process(self, images: List[Dict[str, Any]], size_limit: int = 0) -> List[Dict[str, Any]]:
+        """
+        處理圖片列表（返回新列表，不修改原始字典）
+
+        Args:
+            images: 含 name / data(bytes) / size 的圖片字典列表
+            size_limit: 圖片大小上限（0 表示不限制），處理後仍超過的圖片會被丟棄
+
+        Returns:
+            List[Dict[str, Any]]: 處理後的圖片列表
+        """
+        if not self.available or not images:
+            return images
+
+        results = await asyncio.gather(
+            *(self._process_one(image, size_limit) for image in images)
+        )
+        return [image for image in results if image is not None]
+
+    async def _process_one(self, image: Dict[str, Any], size_limit: int) -> Optional[Dict[str, Any]]:
+        """處理單張圖片"""
+        data = image.get("data")
+        if not isinstance(data, bytes):
+            return image
+
+        oversize = size_limit > 0 and len(data) > size_limit
+        recompress = oversize or len(data) >= self.config.min_bytes
+        name = image.get("name", "image.png")
+        max_width, max_height = self.config.max_width, self.config.max_height
+
+        try:
+            for _ in range(_MAX_ATTEMPTS):
+                transformed = await self._run(
+                    _transform_image, data, max_width, max_height,
+                    self.config.target_format, self.config.quality, recompress, oversize
+                )
+                if transformed is None:
+                    break
+
+                new_data, mime_type, extension = transformed
+                if size_limit <= 0 or len(new_data) <= size_limit:
+                    image_bytes_counter().inc(len(data), stage="recompress_input")
+                    image_bytes_counter().inc(len(new_data), stage="recompress_output")
+                    debug_log(f"圖片 {name} 已重新壓縮: {len(data)} -> {len(new_data)} bytes")
+                    return dict(
+                        image,
+                        name=os.path.splitext(name)[0] + extension,
+                        data=new_data,
+                        size=len(new_data),
+                        mime_type=mime_type,
+                        original_size=len(data)
+                    )
+
+                # 仍超過大小限制，縮小尺寸後重試
+                max_width = max(1, int(max_width * _SHRINK_FACTOR))
+                max_height = max(1, int(max_height * _SHRINK_FACTOR))
+
+        except Exception as e:
+            error_id = ErrorHandler.log_error_with_context(
+                e,
+                context={"operation": "圖片縮放", "image_name": name},
+                error_type=ErrorType.FILE_IO
+            )
+            debug_log(f"圖片 {name} 縮放失敗 [錯誤ID: {error_id}]: {e}")
+
+        if oversize:
+            debug_log(f"圖片 {name} 超過大小限制 ({size_limit} bytes) 且無法縮小，跳過")
+            return None
+        return image
+
+    async def _run(self, func, *args):
+        """在圖片處理線程池中執行"""
+        return await asyncio.get_running_loop().run_in_executor(self._get_executor(), func, *args)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """按需創建線程池"""
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.config.workers,
+                        thread_name_prefix="ImagePipeline"
+                    )
+        return self._executor
+
+    def shutdown(self):
+        """關閉線程池"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+# 全域圖片處理實例
+_image_pipeline: Optional[ImagePipeline] = None
+
+
+def get_image_pipeline() -> ImagePipeline:
+    """獲取全域圖片處理實例"""
+    global _image_pipeline
+    if _image_pipeline is None:
+        _image_pipeline = ImagePipeline()
+    return _image_pipeline
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JSON 編解碼
+===========
+
+MCP 請求路徑使用的 JSON 編解碼器。安裝 orjson 時使用 orjson
+（pip install mcp-feedback-enhanced[fast-json]），否則使用標準庫 json；
+兩者輸出相同的緊湊 UTF-8 JSON。
+
+環境變數：
+- MCP_JSON_BACKEND: auto / orjson / json（預設 auto，有 orjson 時使用）
+"""
+
+import json
+import os
+from typing import Any, Union
+
+from ..debug import debug_log
+
+
+# 解析錯誤類型（orjson.JSONDecodeError 是 json.JSONDecodeError 的子類）
+JSONDecodeError = json.JSONDecodeError
+
+
+def _load_orjson():
+    """按 MCP_JSON_BACKEND 載入 orjson，不使用或未安裝時返回 None"""
+    backend = os.getenv("MCP_JSON_BACKEND", "auto").lower()
+    if backend not in ("auto", "orjson"):
+        return None
+    try:
+        import orjson
+        return orjson
+    except ImportError:
+        if backend == "orjson":
+            debug_log("MCP_JSON_BACKEND=orjson 但未安裝 orjson，改用標準庫 json")
+        return None
+
+
+_orjson = _load_orjson()
+
+# 目前使用的後端名稱
+BACKEND = "orjson" if _orjson is not None else "json"
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    序列化為緊湊的 UTF-8 JSON 位元組
+
+    無法序列化的值以 str() 表示。
+    """
+    if _orjson is not None:
+        return _orjson.dumps(obj, default=str, option=_orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+    """
+    解析 JSON
+
+    Raises:
+        JSONDecodeError: 內容不是合法的 JSON
+    """
+    if _orjson is not None:
+        return _orjson.loads(data)
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
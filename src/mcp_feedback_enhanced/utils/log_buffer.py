@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+有界日誌緩衝區
+==============
+
+按位元組上限保存命令日誌：保留開頭部分（head）和最新部分（tail），
+中間超出上限的日誌被丟棄並記錄截斷數量，避免失控的命令輸出撐大進程內存。
+"""
+
+import json
+import threading
+from collections import deque
+from typing import Any, Deque, Iterable, Iterator, List, Tuple
+
+
+# 預設總上限 1 MiB，其中開頭保留 64 KiB
+DEFAULT_MAX_BYTES = 1024 * 1024
+DEFAULT_HEAD_BYTES = 64 * 1024
+
+
+def _entry_size(entry: Any) -> int:
+    """估算日誌條目的位元組大小"""
+    if isinstance(entry, str):
+        return len(entry.encode("utf-8", "replace")) + 1
+    return len(json.dumps(entry, ensure_ascii=False, default=str)) + 1
+
+
+def _entry_text(entry: Any) -> str:
+    """日誌條目的文字內容"""
+    if isinstance(entry, str):
+        return entry
+    if isinstance(entry, dict) and "output" in entry:
+        return str(entry["output"])
+    return str(entry)
+
+
+class BoundedLog:
+    """有界日誌緩衝區（線程安全，可像列表一樣迭代）"""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, head_bytes: int = DEFAULT_HEAD_BYTES,
+                 entries: Iterable[Any] = None):
+        """
+        初始化日誌緩衝區
+
+        Args:
+            max_bytes: 保留日誌的總位元組上限
+            head_bytes: 開頭部分保留的位元組數，其餘空間用作環形緩衝
+            entries: 初始日誌條目
+        """
+        self.max_bytes = max_bytes
+        self.head_bytes = min(head_bytes, max_bytes)
+
+        self._head: List[Any] = []
+        self._head_size = 0
+        self._tail: Deque[Tuple[Any, int]] = deque()
+        self._tail_size = 0
+
+        # 截斷統計
+        self.truncated_entries = 0
+        self.truncated_bytes = 0
+
+        self._lock = threading.Lock()
+
+        if entries:
+            self.extend(entries)
+
+    def append(self, entry: Any):
+        """添加日誌條目"""
+        size = _entry_size(entry)
+        with self._lock:
+            # 開頭部分未滿時直接保留
+            if not self._tail and self._head_size + size <= self.head_bytes:
+                self._head.append(entry)
+                self._head_size += size
+                return
+
+            self._tail.append((entry, size))
+            self._tail_size += size
+
+            # 超出上限時丟棄最舊的 tail 條目
+            tail_capacity = self.max_bytes - self._head_size
+            while self._tail_size > tail_capacity and self._tail:
+                _, dropped_size = self._tail.popleft()
+                self._tail_size -= dropped_size
+                self.truncated_entries += 1
+                self.truncated_bytes += dropped_size
+
+    def extend(self, entries: Iterable[Any]):
+        """批量添加日誌條目"""
+        for entry in entries:
+            self.append(entry)
+
+    def clear(self):
+        """清空日誌"""
+        with self._lock:
+            self._head.clear()
+            self._head_size = 0
+            self._tail.clear()
+            self._tail_size = 0
+            self.truncated_entries = 0
+            self.truncated_bytes = 0
+
+    @property
+    def retained_bytes(self) -> int:
+        """目前保留的位元組數"""
+        return self._head_size + self._tail_size
+
+    def to_list(self) -> List[Any]:
+        """轉換為列表（供 JSON 序列化）"""
+        with self._lock:
+            return self._head + [entry for entry, _ in self._tail]
+
+    def join(self, separator: str = "\n") -> str:
+        """
+        連接為文字，截斷處插入省略標記
+
+        耗時與保留的位元組數成正比，與命令實際輸出總量無關。
+        """
+        with self._lock:
+            parts = [_entry_text(entry) for entry in self._head]
+            if self.truncated_entries:
+                parts.append(
+                    f"... [已省略 {self.truncated_entries} 條日誌，共 {self.truncated_bytes} 位元組] ..."
+                )
+            parts.extend(_entry_text(entry) for entry, _ in self._tail)
+        return separator.join(parts)
+
+    def __len__(self) -> int:
+        return len(self._head) + len(self._tail)
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self.to_list())
+
+    def __repr__(self) -> str:
+        return (f"BoundedLog(entries={len(self)}, retained_bytes={self.retained_bytes}, "
+                f"truncated_entries={self.truncated_entries})")
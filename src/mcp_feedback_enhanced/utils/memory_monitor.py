@@ -9,6 +9,10 @@
 - 智能清理觸發機制
 - 內存洩漏檢測和趨勢分析
 - 性能優化建議
+
+採樣分為兩層：每次監控只讀取 /proc/self/statm 和系統內存（開銷極小）；
+遍歷所有 Python 對象的統計和 PSS 只在按需查詢、達到警告閾值或進程內存
+明顯增長時才進行，避免監控本身造成內存峰值。
 """
 
 import os
@@ -16,7 +20,7 @@ import gc
 import time
 import threading
 import psutil
-from typing import Dict, List, Optional, Callable, Any
+from typing import Dict, List, Optional, Callable, Any, Tuple
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 from collections import deque
@@ -24,6 +28,17 @@ from ..debug import debug_log
 from .error_handler import ErrorHandler, ErrorType
 
 
+# 進程常駐內存相對上次詳細採樣增長超過此比例時，補做一次詳細採樣
+DETAILED_SAMPLE_GROWTH = 0.2
+
+# 內存狀態的嚴重程度（狀態升級時才做詳細採樣）
+_STATUS_SEVERITY = {"normal": 0, "warning": 1, "critical": 2, "emergency": 3}
+
+_STATM_PATH = "/proc/self/statm"
+_SMAPS_ROLLUP_PATH = "/proc/self/smaps_rollup"
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
 @dataclass
 class MemorySnapshot:
     """內存快照數據類"""
@@ -35,7 +50,13 @@ class MemorySnapshot:
     process_rss: int  # 進程常駐內存 (bytes)
     process_vms: int  # 進程虛擬內存 (bytes)
     process_percent: float  # 進程內存使用率 (%)
-    gc_objects: int  # Python 垃圾回收對象數量
+    gc_objects: Optional[int] = None  # Python 垃圾回收對象數量（僅詳細採樣）
+    process_pss: Optional[int] = None  # 進程比例內存 PSS (bytes)（僅詳細採樣，Linux）
+
+    @property
+    def detailed(self) -> bool:
+        """是否為詳細採樣"""
+        return self.gc_objects is not None
 
 
 @dataclass
@@ -107,6 +128,11 @@ class MemoryMonitor:
         
         # 進程信息
         self.process = psutil.Process()
+        self._use_statm = os.path.exists(_STATM_PATH)
+        # 上次詳細採樣時的進程常駐內存
+        self._detailed_rss_baseline: Optional[int] = None
+        # 上次監控時的內存狀態
+        self._last_status = "normal"
         
         debug_log("MemoryMonitor 初始化完成")
     
@@ -182,8 +208,10 @@ class MemoryMonitor:
         
         while not self._stop_event.is_set():
             try:
-                # 收集內存快照
+                # 收集內存快照（需要時補做詳細採樣）
                 snapshot = self._collect_memory_snapshot()
+                if self._should_sample_detailed(snapshot):
+                    self._add_detailed_sample(snapshot)
                 self.snapshots.append(snapshot)
                 
                 # 檢查內存使用情況
@@ -207,31 +235,37 @@ class MemoryMonitor:
         
         debug_log("內存監控循環結束")
     
-    def _collect_memory_snapshot(self) -> MemorySnapshot:
-        """收集內存快照"""
+    def _collect_memory_snapshot(self, detailed: bool = False) -> MemorySnapshot:
+        """
+        收集內存快照
+
+        Args:
+            detailed: 是否同時統計 Python 對象數量和 PSS（開銷較大）
+        """
         try:
             # 系統內存信息
             system_memory = psutil.virtual_memory()
-            
-            # 進程內存信息
-            process_memory = self.process.memory_info()
-            process_percent = self.process.memory_percent()
-            
-            # Python 垃圾回收信息
-            gc_objects = len(gc.get_objects())
-            
-            return MemorySnapshot(
+
+            # 進程內存信息（使用率以上面讀取的系統總內存計算，避免再讀一次系統內存）
+            process_rss, process_vms = self._read_process_memory()
+            process_percent = process_rss / system_memory.total * 100 if system_memory.total else 0.0
+
+            snapshot = MemorySnapshot(
                 timestamp=datetime.now(),
                 system_total=system_memory.total,
                 system_available=system_memory.available,
                 system_used=system_memory.used,
                 system_percent=system_memory.percent,
-                process_rss=process_memory.rss,
-                process_vms=process_memory.vms,
-                process_percent=process_percent,
-                gc_objects=gc_objects
+                process_rss=process_rss,
+                process_vms=process_vms,
+                process_percent=process_percent
             )
-            
+
+            if detailed:
+                self._add_detailed_sample(snapshot)
+
+            return snapshot
+
         except Exception as e:
             error_id = ErrorHandler.log_error_with_context(
                 e,
@@ -241,6 +275,62 @@ class MemoryMonitor:
             debug_log(f"收集內存快照失敗 [錯誤ID: {error_id}]: {e}")
             raise
     
+    def _read_process_memory(self) -> Tuple[int, int]:
+        """
+        讀取進程內存
+
+        Returns:
+            Tuple[int, int]: (常駐內存, 虛擬內存) bytes
+        """
+        if self._use_statm:
+            try:
+                with open(_STATM_PATH, "rb") as f:
+                    fields = f.read().split()
+                return int(fields[1]) * _PAGE_SIZE, int(fields[0]) * _PAGE_SIZE
+            except (OSError, ValueError, IndexError) as e:
+                debug_log(f"讀取 {_STATM_PATH} 失敗，改用 psutil: {e}")
+                self._use_statm = False
+
+        process_memory = self.process.memory_info()
+        return process_memory.rss, process_memory.vms
+
+    @staticmethod
+    def _read_process_pss() -> Optional[int]:
+        """讀取進程 PSS（僅 Linux 4.14+ 提供 smaps_rollup）"""
+        try:
+            with open(_SMAPS_ROLLUP_PATH, "r", encoding="ascii") as f:
+                for line in f:
+                    if line.startswith("Pss:"):
+                        return int(line.split()[1]) * 1024
+        except (OSError, ValueError, IndexError):
+            pass
+        return None
+
+    def _add_detailed_sample(self, snapshot: MemorySnapshot):
+        """在快照中補充 Python 對象數量和 PSS（開銷較大）"""
+        # Python 垃圾回收信息
+        snapshot.gc_objects = len(gc.get_objects())
+        snapshot.process_pss = self._read_process_pss()
+        self._detailed_rss_baseline = snapshot.process_rss
+
+    def _should_sample_detailed(self, snapshot: MemorySnapshot) -> bool:
+        """
+        是否需要詳細採樣：內存狀態升級（如 normal→warning、warning→critical），
+        或進程內存相對上次詳細採樣明顯增長；持續處於高內存狀態時不會每次都採樣
+        """
+        status = self._get_memory_status(snapshot.system_percent / 100.0)
+        escalated = _STATUS_SEVERITY[status] > _STATUS_SEVERITY[self._last_status]
+        self._last_status = status
+        if escalated:
+            return True
+
+        if self._detailed_rss_baseline is None:
+            # 首次採樣只記錄基準
+            self._detailed_rss_baseline = snapshot.process_rss
+            return False
+
+        return snapshot.process_rss >= self._detailed_rss_baseline * (1 + DETAILED_SAMPLE_GROWTH)
+
     def _check_memory_usage(self, snapshot: MemorySnapshot):
         """檢查內存使用情況並觸發相應動作"""
         usage_percent = snapshot.system_percent / 100.0
@@ -364,11 +454,16 @@ class MemoryMonitor:
             self.alert_callbacks.remove(callback)
             debug_log("移除警告回調函數")
 
-    def get_current_memory_info(self) -> Dict[str, Any]:
-        """獲取當前內存信息"""
+    def get_current_memory_info(self, detailed: bool = False) -> Dict[str, Any]:
+        """
+        獲取當前內存信息
+
+        Args:
+            detailed: 是否包含 Python 對象數量和 PSS（開銷較大，按需使用）
+        """
         try:
-            snapshot = self._collect_memory_snapshot()
-            return {
+            snapshot = self._collect_memory_snapshot(detailed=detailed)
+            info = {
                 "timestamp": snapshot.timestamp.isoformat(),
                 "system": {
                     "total_gb": round(snapshot.system_total / (1024**3), 2),
@@ -381,9 +476,13 @@ class MemoryMonitor:
                     "vms_mb": round(snapshot.process_vms / (1024**2), 2),
                     "usage_percent": round(snapshot.process_percent, 1)
                 },
-                "gc_objects": snapshot.gc_objects,
                 "status": self._get_memory_status(snapshot.system_percent / 100.0)
             }
+            if snapshot.detailed:
+                info["gc_objects"] = snapshot.gc_objects
+                if snapshot.process_pss is not None:
+                    info["process"]["pss_mb"] = round(snapshot.process_pss / (1024**2), 2)
+            return info
         except Exception as e:
             error_id = ErrorHandler.log_error_with_context(
                 e,
@@ -495,7 +594,7 @@ class MemoryMonitor:
                 "emergency_threshold": self.emergency_threshold,
                 "monitoring_interval": self.monitoring_interval
             },
-            "current_info": self.get_current_memory_info(),
+            "current_info": self.get_current_memory_info(detailed=True),
             "stats": self.get_memory_stats().__dict__,
             "recent_alerts": [
                 {
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+運行指標
+========
+
+收集計數器、延遲直方圖和即時量測值，並以 Prometheus 文本格式輸出，
+供 HTTP MCP 服務器的 /metrics 端點使用。
+
+- 計數和觀測值寫入當前線程自己的分片，熱路徑上不需要鎖
+- 抓取時才合併所有分片，讀取開銷只在 /metrics 上
+- 即時量測值（Gauge）以回調函數提供，抓取時才計算
+
+每個進程各自收集指標，多 worker 模式下需分別抓取各 worker。
+"""
+
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from ..debug import debug_log
+
+
+# 預設延遲直方圖分桶（秒）
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+# Prometheus 文本格式的 Content-Type
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    """將標籤轉為可雜湊的排序元組"""
+    if not labels:
+        return ()
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    """轉義標籤值"""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    """格式化標籤為 {name="value",...}"""
+    pairs = list(key)
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    """格式化數值"""
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """單調遞增計數器"""
+
+    kind = "counter"
+
+    def __init__(self, registry: "MetricsRegistry", name: str, documentation: str):
+        self._registry = registry
+        self.name = name
+        self.documentation = documentation
+
+    def inc(self, amount: float = 1, **labels):
+        """增加計數"""
+        shard = self._registry._shard()
+        key = (self.name, _label_key(labels))
+        shard[key] = shard.get(key, 0) + amount
+
+    def _render(self, cells: Dict[LabelKey, float]) -> List[str]:
+        return [f"{self.name}{_format_labels(key)} {_format_value(value)}" for key, value in sorted(cells.items())]
+
+
+class Histogram:
+    """延遲直方圖"""
+
+    kind = "histogram"
+
+    def __init__(self, registry: "MetricsRegistry", name: str, documentation: str,
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self._registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        """記錄一個觀測值"""
+        shard = self._registry._shard()
+        key = (self.name, _label_key(labels))
+        cell = shard.get(key)
+        if cell is None:
+            # 各分桶的非累計計數、+Inf 分桶、總和
+            cell = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """記錄代碼區塊的執行時間"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render(self, cells: Dict[LabelKey, List[float]]) -> List[str]:
+        lines = []
+        bounds = [_format_value(bound) for bound in self.buckets] + ["+Inf"]
+        for key, cell in sorted(cells.items()):
+            cumulative = 0
+            for bound, count in zip(bounds, cell):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', bound))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(cell[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """即時量測值（抓取時調用回調函數取得）"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, func: Callable[[], float]):
+        self.name = name
+        self.documentation = documentation
+        self.func = func
+
+    def _render(self) -> List[str]:
+        try:
+            value = float(self.func())
+        except Exception as e:
+            debug_log(f"讀取指標 {self.name} 失敗: {e}")
+            return []
+        return [f"{self.name} {_format_value(value)}"]
+
+
+class MetricsRegistry:
+    """指標登記表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._local = threading.local()
+        # 所有線程的分片；線程結束後分片保留，已計數的值不會丟失
+        self._shards: List[dict] = []
+        self._lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        """當前線程的分片（只有本線程寫入）"""
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = {}
+            with self._lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        """獲取或創建計數器"""
+        return self._get_or_create(name, lambda: Counter(self, name, documentation))
+
+    def histogram(self, name: str, documentation: str,
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        """獲取或創建直方圖"""
+        return self._get_or_create(name, lambda: Histogram(self, name, documentation, buckets))
+
+    def gauge(self, name: str, documentation: str, func: Callable[[], float]) -> Gauge:
+        """登記即時量測值（同名時以新的回調函數取代）"""
+        gauge = Gauge(name, documentation, func)
+        with self._lock:
+            self._metrics[name] = gauge
+        return gauge
+
+    def _get_or_create(self, name: str, factory: Callable[[], object]):
+        metric = self._metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(name)
+                if metric is None:
+                    metric = self._metrics[name] = factory()
+        return metric
+
+    def _collect(self) -> Dict[str, Dict[LabelKey, object]]:
+        """合併所有分片"""
+        with self._lock:
+            shards = list(self._shards)
+
+        merged: Dict[str, Dict[LabelKey, object]] = {}
+        for shard in shards:
+            for (name, key), value in shard.copy().items():
+                cells = merged.setdefault(name, {})
+                if isinstance(value, list):
+                    current = cells.get(key)
+                    cells[key] = list(value) if current is None else [a + b for a, b in zip(current, value)]
+                else:
+                    cells[key] = cells.get(key, 0) + value
+        return merged
+
+    def render(self) -> str:
+        """以 Prometheus 文本格式輸出所有指標"""
+        merged = self._collect()
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+
+        lines = []
+        for name, metric in metrics:
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            if isinstance(metric, Gauge):
+                lines.extend(metric._render())
+            else:
+                lines.extend(metric._render(merged.get(name, {})))
+        return "\n".join(lines) + "\n"
+
+
+def cleanup_duration_histogram() -> Histogram:
+    """HTTP 會話和 Web 會話清理共用的耗時直方圖（以 component 標籤區分）"""
+    return get_metrics().histogram("mcp_cleanup_duration_seconds", "清理操作耗時（秒）")
+
+
+def image_bytes_counter() -> Counter:
+    """回饋圖片處理位元組數計數器（以 stage 標籤區分接收與重新壓縮前後）"""
+    return get_metrics().counter("mcp_image_bytes_processed_total", "處理的圖片位元組數")
+
+
+# 全域指標登記表實例
+_metrics_registry: Optional[MetricsRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_metrics() -> MetricsRegistry:
+    """獲取全域指標登記表實例"""
+    global _metrics_registry
+    if _metrics_registry is None:
+        with _registry_lock:
+            if _metrics_registry is None:
+                _metrics_registry = MetricsRegistry()
+    return _metrics_registry
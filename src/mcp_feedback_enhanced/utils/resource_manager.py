@@ -301,6 +301,17 @@ class ResourceManager:
             )
             debug_log(f"註冊文件句柄失敗 [錯誤ID: {error_id}]: {e}")
     
+    def register_temp_file(self, file_path: str) -> None:
+        """
+        追蹤由其他途徑創建的臨時文件，納入過期清理
+        
+        Args:
+            file_path: 文件路徑
+        """
+        self.temp_files.add(file_path)
+        self.stats["temp_files_created"] += 1
+        debug_log(f"追蹤臨時文件: {file_path}")
+    
     def unregister_temp_file(self, file_path: str) -> bool:
         """
         取消臨時文件追蹤
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+伺服器就緒信號
+==============
+
+uvicorn 伺服器完成啟動（已綁定端口並開始接受連接）時立即通知等待者，
+取代啟動後固定休眠的做法：伺服器一就緒即可繼續，啟動失敗也會立即返回。
+
+- ReadinessSignal: 一次性信號，可同步等待，也可在任意事件循環中異步等待（不佔用線程）
+- ReadyServer: 啟動完成後設置信號的 uvicorn.Server
+"""
+
+import asyncio
+import threading
+from typing import Dict, Optional
+
+import uvicorn
+
+
+# 等待伺服器就緒的預設上限（秒）
+SERVER_READY_TIMEOUT = 10.0
+
+
+class ReadinessSignal:
+    """一次性就緒信號（線程安全，第一次設置的結果生效）"""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._ready = False
+        # 異步等待者：future -> 所屬事件循環
+        self._waiters: Dict[asyncio.Future, asyncio.AbstractEventLoop] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        """是否已成功就緒"""
+        return self._event.is_set() and self._ready
+
+    def is_set(self) -> bool:
+        """是否已有結果（成功或失敗）"""
+        return self._event.is_set()
+
+    def set(self, ready: bool = True):
+        """設置結果並喚醒所有等待者（可從任意線程調用）"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._ready = ready
+            self._event.set()
+            waiters, self._waiters = self._waiters, {}
+
+        for future, loop in waiters.items():
+            if loop.is_closed():
+                continue
+            try:
+                loop.call_soon_threadsafe(self._resolve, future)
+            except RuntimeError:
+                # 事件循環已關閉
+                pass
+
+    def wait(self, timeout: Optional[float] = SERVER_READY_TIMEOUT) -> bool:
+        """
+        同步等待（會阻塞當前線程，不要在事件循環中調用）
+
+        Returns:
+            bool: 是否在超時前成功就緒
+        """
+        return self._event.wait(timeout) and self._ready
+
+    async def wait_async(self, timeout: Optional[float] = SERVER_READY_TIMEOUT) -> bool:
+        """
+        異步等待
+
+        Returns:
+            bool: 是否在超時前成功就緒
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        # 在鎖內檢查並登記，避免與 set 競爭而丟失喚醒
+        with self._lock:
+            if self._event.is_set():
+                return self._ready
+            self._waiters[future] = loop
+
+        try:
+            await asyncio.wait_for(future, timeout=timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._lock:
+                self._waiters.pop(future, None)
+        return self._ready
+
+    @staticmethod
+    def _resolve(future: asyncio.Future):
+        if not future.done():
+            future.set_result(None)
+
+
+class ReadyServer(uvicorn.Server):
+    """啟動完成後設置就緒信號的 uvicorn 伺服器"""
+
+    def __init__(self, config: uvicorn.Config, readiness: Optional[ReadinessSignal] = None,
+                 signal_failure: bool = True):
+        """
+        初始化伺服器
+
+        Args:
+            config: uvicorn 配置
+            readiness: 就緒信號，未提供時自行創建
+            signal_failure: 啟動失敗時是否以失敗結果設置信號（調用方自行重試時設為 False）
+        """
+        super().__init__(config)
+        self.readiness = readiness or ReadinessSignal()
+        self.signal_failure = signal_failure
+
+    async def startup(self, sockets=None):
+        try:
+            await super().startup(sockets=sockets)
+        finally:
+            # 端口綁定失敗時 uvicorn 以 sys.exit 結束，同樣在此通知等待者
+            if self.started:
+                self.readiness.set(True)
+            elif self.signal_failure:
+                self.readiness.set(False)
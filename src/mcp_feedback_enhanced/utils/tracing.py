@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+請求追蹤
+========
+
+以 contextvars 記錄一次工具調用中各階段的耗時（span），找出等待用戶以外的
+延遲花在哪裡。span 隨 contextvars 在 await 和 asyncio 任務之間傳遞，
+最外層 span 結束時整個追蹤一次輸出。
+
+使用方式：
+    with span("launch_web_ui", timeout=600):
+        ...
+
+等待用戶操作的階段以 waits_for_user=True 標記，輸出時會另外計算扣除等待後的耗時。
+
+環境變數：
+- MCP_TRACE: off / log / json / otlp（預設 off）
+  - log: 只在調試日誌中輸出各階段耗時
+  - json: 另寫入簡化的 JSON 追蹤文件
+  - otlp: 另寫入 OTLP/JSON 格式文件，可匯入支援 OpenTelemetry 的工具
+- MCP_TRACE_DIR: 追蹤文件目錄（預設 ~/.cache/mcp-feedback-enhanced/traces）
+- MCP_TRACE_MAX_FILES: 最多保留的追蹤文件數量（預設 200）
+"""
+
+import contextvars
+import json
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from ..debug import debug_log
+from .error_handler import ErrorHandler, ErrorType
+
+
+# 標記等待用戶操作的 span 屬性，輸出時從總耗時中扣除
+USER_WAIT_ATTRIBUTE = "waits_for_user"
+
+DEFAULT_TRACE_DIR = Path.home() / ".cache" / "mcp-feedback-enhanced" / "traces"
+SERVICE_NAME = "mcp-feedback-enhanced"
+
+# OTLP 狀態碼
+_OTLP_STATUS_OK = 1
+_OTLP_STATUS_ERROR = 2
+
+
+@dataclass
+class TracingConfig:
+    """追蹤配置"""
+
+    mode: str = "off"  # off / log / json / otlp
+    directory: Path = DEFAULT_TRACE_DIR
+    max_files: int = 200
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode in ("log", "json", "otlp")
+
+    @classmethod
+    def from_env(cls) -> "TracingConfig":
+        """從環境變數創建配置"""
+        mode = os.getenv("MCP_TRACE", "off").lower()
+        config = cls(mode=mode)
+        if not config.enabled:
+            return config
+
+        directory = os.getenv("MCP_TRACE_DIR")
+        if directory:
+            config.directory = Path(directory).expanduser()
+
+        max_files = os.getenv("MCP_TRACE_MAX_FILES")
+        if max_files:
+            try:
+                config.max_files = max(1, int(max_files))
+            except ValueError:
+                debug_log(f"MCP_TRACE_MAX_FILES 格式錯誤 ({max_files})，必須為數字，使用預設值 {config.max_files}")
+        return config
+
+
+@dataclass
+class Span:
+    """一個計時階段"""
+
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    start_time_ns: int = field(default_factory=time.time_ns)
+    duration_ns: Optional[int] = None
+    error: Optional[str] = None
+    _start_perf_ns: int = field(default_factory=time.perf_counter_ns, repr=False)
+
+    def set_attribute(self, key: str, value: Any):
+        """設置屬性"""
+        self.attributes[key] = value
+
+    def finish(self):
+        """結束計時"""
+        if self.duration_ns is None:
+            self.duration_ns = time.perf_counter_ns() - self._start_perf_ns
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.duration_ns or 0) / 1e6
+
+    @property
+    def end_time_ns(self) -> int:
+        return self.start_time_ns + (self.duration_ns or 0)
+
+
+@dataclass
+class Trace:
+    """一次追蹤（最外層 span 及其所有子 span）"""
+
+    trace_id: str
+    spans: List[Span] = field(default_factory=list)
+
+    @property
+    def root(self) -> Span:
+        return self.spans[0]
+
+    @property
+    def user_wait_ms(self) -> float:
+        """等待用戶操作的總耗時"""
+        return sum(span.duration_ms for span in self.spans if span.attributes.get(USER_WAIT_ATTRIBUTE))
+
+    @property
+    def active_ms(self) -> float:
+        """扣除等待用戶操作後的耗時"""
+        return max(0.0, self.root.duration_ms - self.user_wait_ms)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """簡化的 JSON 格式"""
+        root = self.root
+        return {
+            "trace_id": self.trace_id,
+            "name": root.name,
+            "start_time": datetime.fromtimestamp(root.start_time_ns / 1e9).isoformat(),
+            "duration_ms": round(root.duration_ms, 3),
+            "user_wait_ms": round(self.user_wait_ms, 3),
+            "active_ms": round(self.active_ms, 3),
+            "spans": [
+                {
+                    "name": span.name,
+                    "span_id": span.span_id,
+                    "parent_id": span.parent_id,
+                    "start_offset_ms": round((span.start_time_ns - root.start_time_ns) / 1e6, 3),
+                    "duration_ms": round(span.duration_ms, 3),
+                    "attributes": span.attributes,
+                    "error": span.error
+                }
+                for span in self.spans
+            ]
+        }
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """OTLP/JSON 格式（ExportTraceServiceRequest）"""
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attribute("service.name", SERVICE_NAME)]},
+                "scopeSpans": [{
+                    "scope": {"name": "mcp_feedback_enhanced"},
+                    "spans": [
+                        {
+                            "traceId": span.trace_id,
+                            "spanId": span.span_id,
+                            "parentSpanId": span.parent_id or "",
+                            "name": span.name,
+                            "kind": 1,
+                            "startTimeUnixNano": str(span.start_time_ns),
+                            "endTimeUnixNano": str(span.end_time_ns),
+                            "attributes": [_otlp_attribute(k, v) for k, v in span.attributes.items()],
+                            "status": (
+                                {"code": _OTLP_STATUS_ERROR, "message": span.error}
+                                if span.error else {"code": _OTLP_STATUS_OK}
+                            )
+                        }
+                        for span in self.spans
+                    ]
+                }]
+            }]
+        }
+
+    def summary(self) -> str:
+        """各階段耗時摘要（按開始順序，以縮排表示層級）"""
+        depths = {self.root.span_id: 0}
+        parts = []
+        for span in self.spans:
+            depth = depths.get(span.parent_id, -1) + 1 if span.parent_id else 0
+            depths[span.span_id] = depth
+            marker = " !" if span.error else ""
+            parts.append(f"{'  ' * depth}{span.name}: {span.duration_ms:.1f}ms{marker}")
+        return "\n".join(parts)
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    """轉換為 OTLP KeyValue"""
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+# 當前 span（隨 contextvars 在 await 和任務之間傳遞）
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar(
+    "mcp_feedback_current_span", default=None
+)
+# 各追蹤的 span 列表
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar(
+    "mcp_feedback_current_trace", default=None
+)
+
+
+class Tracer:
+    """追蹤器"""
+
+    def __init__(self, config: Optional[TracingConfig] = None):
+        self.config = config or TracingConfig.from_env()
+        self._prune_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.config.enabled
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Optional[Span]]:
+        """
+        記錄一個階段；沒有外層 span 時開始新的追蹤
+
+        Args:
+            name: 階段名稱
+            **attributes: 附加屬性
+
+        Yields:
+            Optional[Span]: 追蹤停用時為 None
+        """
+        if not self.enabled:
+            yield None
+            return
+
+        parent = _current_span.get()
+        trace = _current_trace.get() if parent is not None else None
+        is_root = trace is None
+        if is_root:
+            trace = Trace(trace_id=secrets.token_hex(16))
+
+        span = Span(
+            name=name,
+            trace_id=trace.trace_id,
+            span_id=secrets.token_hex(8),
+            parent_id=None if is_root else parent.span_id,
+            attributes=attributes
+        )
+        trace.spans.append(span)
+
+        span_token = _current_span.set(span)
+        trace_token = _current_trace.set(trace) if is_root else None
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.finish()
+            try:
+                _current_span.reset(span_token)
+                if trace_token is not None:
+                    _current_trace.reset(trace_token)
+            except ValueError:
+                # 在不同的 context 中結束（例如跨任務的生成器），保持現狀
+                pass
+            if is_root:
+                self._export(trace)
+
+    def _export(self, trace: Trace):
+        """輸出追蹤"""
+        debug_log(
+            f"追蹤 {trace.trace_id} 各階段耗時（扣除等待用戶 {trace.active_ms:.1f}ms）:\n{trace.summary()}"
+        )
+
+        if self.config.mode not in ("json", "otlp"):
+            return
+
+        try:
+            self.config.directory.mkdir(parents=True, exist_ok=True)
+            if self.config.mode == "otlp":
+                payload, suffix = trace.to_otlp(), ".otlp.json"
+            else:
+                payload, suffix = trace.to_dict(), ".json"
+
+            timestamp = datetime.fromtimestamp(trace.root.start_time_ns / 1e9).strftime("%Y%m%d-%H%M%S")
+            file_path = self.config.directory / f"{timestamp}-{trace.trace_id}{suffix}"
+            with open(file_path, "w", encoding="utf-8") as f:
+                json.dump(payload, f, ensure_ascii=False, default=str)
+
+            self._prune()
+        except Exception as e:
+            error_id = ErrorHandler.log_error_with_context(
+                e,
+                context={"operation": "輸出追蹤", "trace_id": trace.trace_id},
+                error_type=ErrorType.FILE_IO
+            )
+            debug_log(f"輸出追蹤失敗 [錯誤ID: {error_id}]: {e}")
+
+    def _prune(self):
+        """刪除超出數量上限的最舊追蹤文件（文件名以時間開頭）"""
+        with self._prune_lock:
+            files = sorted(self.config.directory.glob("*.json"))
+            for old_file in files[:max(0, len(files) - self.config.max_files)]:
+                try:
+                    old_file.unlink()
+                except OSError:
+                    pass
+
+
+def current_span() -> Optional[Span]:
+    """獲取當前 span（未在追蹤中時返回 None）"""
+    return _current_span.get()
+
+
+# 全域追蹤器實例
+_tracer: Optional[Tracer] = None
+
+
+def get_tracer() -> Tracer:
+    """獲取全域追蹤器實例"""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer()
+    return _tracer
+
+
+def span(name: str, **attributes):
+    """便捷函數：以全域追蹤器記錄一個階段"""
+    return get_tracer().span(name, **attributes)
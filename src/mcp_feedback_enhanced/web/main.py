@@ -32,14 +32,23 @@ from .routes import setup_routes
 from .utils import find_free_port, get_browser_opener
 from .utils.port_manager import PortManager
 from .utils.compression_config import get_compression_manager
+from .utils.connection_hub import get_connection_hub
 from ..utils.error_handler import ErrorHandler, ErrorType
 from ..utils.memory_monitor import get_memory_monitor
+from ..utils.expiry_index import ExpiryIndex
+from ..utils.tracing import span
+from ..utils.server_readiness import SERVER_READY_TIMEOUT, ReadinessSignal, ReadyServer
 from ..debug import web_debug_log as debug_log
 from ..i18n import get_i18n_manager
 
 
 class WebUIManager:
-    """Web UI 管理器 - 重構為單一活躍會話模式"""
+    """
+    Web UI 管理器
+
+    根路徑 `/` 與 `/ws` 服務單一活躍會話（current_session）；
+    `/session/{id}` 與 `/ws/{id}` 按會話 ID 路由，可同時服務多個會話。
+    """
 
     def __init__(self, host: str = "127.0.0.1", port: int = None):
         self.host = host
@@ -62,12 +71,26 @@ class WebUIManager:
         else:
             debug_log(f"未設定 MCP_WEB_PORT 環境變數，使用預設端口 {preferred_port}")
 
-        # 使用增強的端口管理，支持自動清理
-        self.port = port or PortManager.find_free_port_enhanced(
-            preferred_port=preferred_port,
-            auto_cleanup=True,
-            host=self.host
-        )
+        # 預先綁定模式：直接綁定端口並將監聽 socket 交給 uvicorn，
+        # 避免探測端口後再綁定之間被其他進程搶占（MCP_WEB_PREBIND=false 可改回探測模式）
+        self._prebind = os.getenv("MCP_WEB_PREBIND", "true").lower() not in ("false", "0", "no", "off")
+        self._listen_socket: Optional[socket.socket] = None
+
+        if self._prebind:
+            # 指定端口時不清理占用進程，被占用則改用附近端口
+            self._listen_socket = PortManager.bind_free_port(
+                preferred_port=port or preferred_port,
+                auto_cleanup=port is None,
+                host=self.host
+            )
+            self.port = self._listen_socket.getsockname()[1]
+        else:
+            # 使用增強的端口管理，支持自動清理
+            self.port = port or PortManager.find_free_port_enhanced(
+                preferred_port=preferred_port,
+                auto_cleanup=True,
+                host=self.host
+            )
         self.app = FastAPI(title="MCP Feedback Enhanced")
 
         # 設置壓縮和緩存中間件
@@ -80,6 +103,11 @@ class WebUIManager:
         self.current_session: Optional[WebFeedbackSession] = None
         self.sessions: Dict[str, WebFeedbackSession] = {}  # 保留用於向後兼容
 
+        # 過期索引：按截止時間排序，清理時只處理實際到期的會話
+        self._expiry_index = ExpiryIndex()
+        # 創建時間索引：供按最大會話年齡清理
+        self._creation_index = ExpiryIndex()
+
         # 全局標籤頁狀態管理 - 跨會話保持
         self.global_active_tabs: Dict[str, dict] = {}
 
@@ -99,6 +127,7 @@ class WebUIManager:
 
         self.server_thread = None
         self.server_process = None
+        self._server_readiness = ReadinessSignal()  # 伺服器開始接受連接時設置
         self.i18n = get_i18n_manager()
 
         # 設置靜態文件和模板
@@ -229,10 +258,10 @@ class WebUIManager:
 
     def create_session(self, project_directory: str, summary: str) -> str:
         """創建新的回饋會話 - 重構為單一活躍會話模式，保留標籤頁狀態"""
-        # 保存舊會話的 WebSocket 連接以便發送更新通知
-        old_websocket = None
+        # 記錄仍有 WebSocket 連接的舊會話，以便發送更新通知並轉移連接
+        old_session_id = None
         if self.current_session and self.current_session.websocket:
-            old_websocket = self.current_session.websocket
+            old_session_id = self.current_session.session_id
             debug_log("保存舊會話的 WebSocket 連接以發送更新通知")
 
         # 如果已有活躍會話，先保存其標籤頁狀態到全局狀態
@@ -254,15 +283,15 @@ class WebUIManager:
         # 設置為當前活躍會話
         self.current_session = session
         # 同時保存到字典中以保持向後兼容
-        self.sessions[session_id] = session
+        self._register_session(session)
 
         debug_log(f"創建新的活躍會話: {session_id}")
         debug_log(f"繼承 {len(session.active_tabs)} 個活躍標籤頁")
 
         # 處理會話更新通知
-        if old_websocket:
+        if old_session_id:
             # 有舊連接，立即發送會話更新通知並轉移連接
-            self._old_websocket_for_update = old_websocket
+            self._old_session_id_for_update = old_session_id
             self._new_session_for_update = session
             debug_log("已保存舊 WebSocket 連接，準備發送會話更新通知")
 
@@ -274,7 +303,7 @@ class WebUIManager:
             except Exception as e:
                 debug_log(f"創建會話更新任務失敗: {e}")
                 # 即使任務創建失敗，也要嘗試直接轉移連接
-                session.websocket = old_websocket
+                get_connection_hub().move_session(old_session_id, session_id)
                 debug_log("任務創建失敗，直接轉移 WebSocket 連接到新會話")
                 self._pending_session_update = True
         else:
@@ -284,6 +313,40 @@ class WebUIManager:
 
         return session_id
 
+    def _register_session(self, session: WebFeedbackSession):
+        """保存會話並登記到過期索引"""
+        self.sessions[session.session_id] = session
+        session.attach_expiry_index(self._expiry_index)
+        self._creation_index.schedule(session.session_id, session.created_at)
+
+    def discard_session(self, session_id: str) -> Optional[WebFeedbackSession]:
+        """從會話字典和過期索引中移除會話（不執行資源清理）"""
+        self._expiry_index.discard(session_id)
+        self._creation_index.discard(session_id)
+        return self.sessions.pop(session_id, None)
+
+    def pop_expired_session_ids(self, now: float = None, max_age: float = None) -> List[str]:
+        """
+        從過期索引取出已到期的會話ID
+
+        Args:
+            now: 當前時間戳，None 使用 time.time()
+            max_age: 最大會話年齡（秒），提供時一併取出超齡會話
+
+        Returns:
+            List[str]: 仍在會話字典中的到期會話ID
+        """
+        if now is None:
+            now = time.time()
+
+        expired = self._expiry_index.pop_expired(now)
+        if max_age is not None:
+            # 創建時間不晚於 now - max_age 即超過最大年齡
+            expired.extend(self._creation_index.pop_expired(now - max_age))
+
+        # 去重並略過已被其他途徑移除的會話
+        return [session_id for session_id in dict.fromkeys(expired) if session_id in self.sessions]
+
     def get_session(self, session_id: str) -> Optional[WebFeedbackSession]:
         """獲取回饋會話 - 保持向後兼容"""
         return self.sessions.get(session_id)
@@ -292,9 +355,22 @@ class WebUIManager:
         """獲取當前活躍會話"""
         return self.current_session
     
-    def set_current_session_by_id(self, session_id: str) -> bool:
-        """通过会话ID设置当前活跃会话"""
-        # 首先检查新的会话管理器
+    def get_or_create_http_session(self, session_id: str) -> Optional[WebFeedbackSession]:
+        """
+        获取指定会话（多会话路由模式使用，不改变当前活跃会话）
+        
+        会话仅存在于 HTTP 会话管理器中时，创建对应的 WebFeedbackSession。
+        
+        Args:
+            session_id: 会话ID
+            
+        Returns:
+            Optional[WebFeedbackSession]: 会话，不存在时返回 None
+        """
+        existing = self.sessions.get(session_id)
+        if existing:
+            return existing
+        
         from ..session_manager import get_session_manager
         session_manager = get_session_manager()
         session_data = session_manager.get_session(session_id)
@@ -321,20 +397,30 @@ class WebUIManager:
             
             # 同步回饋数据
             web_session.feedback_text = session_data.feedback_text
-            web_session.command_logs = session_data.command_logs
+            web_session.command_logs.extend(
+                log.get("output", "") if isinstance(log, dict) else str(log)
+                for log in session_data.command_logs
+            )
             web_session.images = session_data.images
             
-            # 设置为当前会话
-            self.current_session = web_session
-            self.sessions[session_id] = web_session
+            # 用户提交回饋后同步完成 HTTP 会话，唤醒等待中的 MCP 调用
+            def complete_http_session(session, result):
+                session_manager.complete_session(session.session_id, result)
             
-            debug_log(f"通过会话ID设置当前会话: {session_id}")
-            return True
+            web_session.add_feedback_callback(complete_http_session)
+            
+            self._register_session(web_session)
+            debug_log(f"从 HTTP 会话管理器创建 Web 会话: {session_id}")
+            return web_session
         
-        # 检查现有会话
-        if session_id in self.sessions:
-            self.current_session = self.sessions[session_id]
-            debug_log(f"从现有会话设置当前会话: {session_id}")
+        return None
+    
+    def set_current_session_by_id(self, session_id: str) -> bool:
+        """通过会话ID设置当前活跃会话"""
+        session = self.get_or_create_http_session(session_id)
+        if session:
+            self.current_session = session
+            debug_log(f"通过会话ID设置当前会话: {session_id}")
             return True
         
         debug_log(f"未找到会话: {session_id}")
@@ -345,7 +431,7 @@ class WebUIManager:
         if session_id in self.sessions:
             session = self.sessions[session_id]
             session.cleanup()
-            del self.sessions[session_id]
+            self.discard_session(session_id)
 
             # 如果移除的是當前活躍會話，清空當前會話
             if self.current_session and self.current_session.session_id == session_id:
@@ -362,8 +448,7 @@ class WebUIManager:
             self.current_session = None
 
             # 同時從字典中移除
-            if session_id in self.sessions:
-                del self.sessions[session_id]
+            self.discard_session(session_id)
 
             debug_log("已清空當前活躍會話")
 
@@ -407,15 +492,85 @@ class WebUIManager:
             debug_log("沒有活躍的 WebSocket 連接，無法廣播消息")
             return
 
-        try:
-            await self.current_session.websocket.send_json(message)
-            debug_log(f"已廣播消息到活躍標籤頁: {message.get('type', 'unknown')}")
-        except Exception as e:
-            debug_log(f"廣播消息失敗: {e}")
+        count = await self.current_session.broadcast(message)
+        debug_log(f"已廣播消息到 {count} 個活躍標籤頁: {message.get('type', 'unknown')}")
+
+    def start_server(self, timeout: float = SERVER_READY_TIMEOUT) -> bool:
+        """
+        啟動 Web 伺服器並等待就緒（同步等待，事件循環中請使用 start_server_async）
+
+        Returns:
+            bool: 伺服器是否在超時前開始接受連接
+        """
+        readiness = self._launch_server_thread()
+        ready = readiness.wait(timeout)
+        if not ready:
+            debug_log(f"Web 伺服器未能在 {timeout} 秒內就緒")
+        return ready
+
+    async def start_server_async(self, timeout: float = SERVER_READY_TIMEOUT) -> bool:
+        """
+        啟動 Web 伺服器並異步等待就緒（伺服器已在運行時立即返回）
+
+        Returns:
+            bool: 伺服器是否在超時前開始接受連接
+        """
+        readiness = self._launch_server_thread()
+        ready = await readiness.wait_async(timeout)
+        if not ready:
+            debug_log(f"Web 伺服器未能在 {timeout} 秒內就緒")
+        return ready
+
+    def _launch_server_thread(self) -> ReadinessSignal:
+        """在背景線程中啟動伺服器（已在運行時不重複啟動），返回就緒信號"""
+        if self.server_thread and self.server_thread.is_alive():
+            return self._server_readiness
 
-    def start_server(self):
-        """啟動 Web 伺服器"""
-        def run_server_with_retry():
+        readiness = self._server_readiness = ReadinessSignal()
+
+        listen_socket = None
+        if self._prebind:
+            # 首次啟動使用初始化時綁定的 socket，伺服器停止後重新啟動時重新綁定
+            listen_socket, self._listen_socket = self._listen_socket, None
+            if listen_socket is None:
+                listen_socket = PortManager.bind_free_port(
+                    preferred_port=self.port, auto_cleanup=False, host=self.host
+                )
+                self.port = listen_socket.getsockname()[1]
+
+        def run_server():
+            try:
+                if listen_socket is not None:
+                    serve_on_socket(listen_socket)
+                else:
+                    serve_with_retry()
+            finally:
+                # 伺服器未能啟動時立即通知等待者
+                readiness.set(False)
+
+        def serve_on_socket(sock: socket.socket):
+            debug_log(f"在已綁定的端口 {self.host}:{self.port} 上啟動伺服器")
+            config = uvicorn.Config(
+                app=self.app,
+                host=self.host,
+                port=self.port,
+                log_level="warning",
+                access_log=False
+            )
+            server = ReadyServer(config, readiness)
+            try:
+                asyncio.run(server.serve(sockets=[sock]))
+            except Exception as e:
+                error_id = ErrorHandler.log_error_with_context(
+                    e,
+                    context={"operation": "伺服器運行", "host": self.host, "port": self.port},
+                    error_type=ErrorType.SYSTEM
+                )
+                debug_log(f"伺服器運行錯誤 [錯誤ID: {error_id}]: {e}")
+            finally:
+                sock.close()
+
+        def serve_with_retry():
             max_retries = 5
             retry_count = 0
             
@@ -431,7 +586,7 @@ class WebUIManager:
                         access_log=False
                     )
                     
-                    server = uvicorn.Server(config)
+                    server = ReadyServer(config, readiness, signal_failure=False)
                     asyncio.run(server.serve())
                     break
                     
@@ -480,11 +635,9 @@ class WebUIManager:
                     break
 
         # 在新線程中啟動伺服器
-        self.server_thread = threading.Thread(target=run_server_with_retry, daemon=True)
+        self.server_thread = threading.Thread(target=run_server, daemon=True)
         self.server_thread.start()
-        
-        # 等待伺服器啟動
-        time.sleep(2)
+        return readiness
 
     def open_browser(self, url: str):
         """開啟瀏覽器"""
@@ -527,19 +680,18 @@ class WebUIManager:
     async def notify_session_update(self, session):
         """向活躍標籤頁發送會話更新通知"""
         try:
-            # 檢查是否有活躍的 WebSocket 連接
-            if session.websocket:
-                # 直接通過當前會話的 WebSocket 發送
-                await session.websocket.send_json({
-                    "type": "session_updated",
-                    "message": "新會話已創建，正在更新頁面內容",
-                    "session_info": {
-                        "project_directory": session.project_directory,
-                        "summary": session.summary,
-                        "session_id": session.session_id
-                    }
-                })
-                debug_log("會話更新通知已通過 WebSocket 發送")
+            # 廣播到會話的所有 WebSocket 連接
+            sent = await session.broadcast({
+                "type": "session_updated",
+                "message": "新會話已創建，正在更新頁面內容",
+                "session_info": {
+                    "project_directory": session.project_directory,
+                    "summary": session.summary,
+                    "session_id": session.session_id
+                }
+            })
+            if sent:
+                debug_log(f"會話更新通知已發送到 {sent} 個 WebSocket 連接")
             else:
                 # 沒有活躍連接，設置待更新標記
                 self._pending_session_update = True
@@ -552,57 +704,37 @@ class WebUIManager:
     async def _send_immediate_session_update(self):
         """立即發送會話更新通知（使用舊的 WebSocket 連接）"""
         try:
-            # 檢查是否有保存的舊 WebSocket 連接
-            if hasattr(self, '_old_websocket_for_update') and hasattr(self, '_new_session_for_update'):
-                old_websocket = self._old_websocket_for_update
+            # 檢查是否有保存的舊會話
+            if hasattr(self, '_old_session_id_for_update') and hasattr(self, '_new_session_for_update'):
+                old_session_id = self._old_session_id_for_update
                 new_session = self._new_session_for_update
-
-                # 改進的連接有效性檢查
-                websocket_valid = False
-                if old_websocket:
-                    try:
-                        # 檢查 WebSocket 連接狀態
-                        if hasattr(old_websocket, 'client_state'):
-                            websocket_valid = old_websocket.client_state != old_websocket.client_state.DISCONNECTED
-                        else:
-                            # 如果沒有 client_state 屬性，嘗試發送測試消息來檢查連接
-                            websocket_valid = True
-                    except Exception as check_error:
-                        debug_log(f"檢查 WebSocket 連接狀態失敗: {check_error}")
-                        websocket_valid = False
-
-                if websocket_valid:
-                    try:
-                        # 發送會話更新通知
-                        await old_websocket.send_json({
-                            "type": "session_updated",
-                            "message": "新會話已創建，正在更新頁面內容",
-                            "session_info": {
-                                "project_directory": new_session.project_directory,
-                                "summary": new_session.summary,
-                                "session_id": new_session.session_id
-                            }
-                        })
-                        debug_log("已通過舊 WebSocket 連接發送會話更新通知")
-
-                        # 延遲一小段時間讓前端處理消息
-                        await asyncio.sleep(0.2)
-
-                        # 將 WebSocket 連接轉移到新會話
-                        new_session.websocket = old_websocket
-                        debug_log("已將 WebSocket 連接轉移到新會話")
-
-                    except Exception as send_error:
-                        debug_log(f"發送會話更新通知失敗: {send_error}")
-                        # 如果發送失敗，仍然嘗試轉移連接
-                        new_session.websocket = old_websocket
-                        debug_log("發送失敗但仍轉移 WebSocket 連接到新會話")
+                hub = get_connection_hub()
+
+                if hub.count(old_session_id):
+                    # 通知舊會話的所有標籤頁（連接中心會丟棄已斷開的連接）
+                    await hub.broadcast(old_session_id, {
+                        "type": "session_updated",
+                        "message": "新會話已創建，正在更新頁面內容",
+                        "session_info": {
+                            "project_directory": new_session.project_directory,
+                            "summary": new_session.summary,
+                            "session_id": new_session.session_id
+                        }
+                    })
+                    debug_log("已通過舊 WebSocket 連接發送會話更新通知")
+
+                    # 延遲一小段時間讓前端處理消息
+                    await asyncio.sleep(0.2)
+
+                    # 將 WebSocket 連接轉移到新會話
+                    moved = hub.move_session(old_session_id, new_session.session_id)
+                    debug_log(f"已將 {moved} 個 WebSocket 連接轉移到新會話")
                 else:
                     debug_log("舊 WebSocket 連接無效，設置待更新標記")
                     self._pending_session_update = True
 
                 # 清理臨時變數
-                delattr(self, '_old_websocket_for_update')
+                delattr(self, '_old_session_id_for_update')
                 delattr(self, '_new_session_for_update')
 
             else:
@@ -645,8 +777,10 @@ class WebUIManager:
                 return True
 
             # 如果全局狀態沒有活躍標籤頁，嘗試通過 API 檢查
-            # 等待一小段時間讓服務器完全啟動
-            await asyncio.sleep(0.5)
+            # 等待伺服器開始接受連接（已就緒時立即返回）
+            if not await self._server_readiness.wait_async(SERVER_READY_TIMEOUT):
+                debug_log("Web 伺服器尚未就緒，跳過活躍標籤頁檢查")
+                return False
 
             # 調用活躍標籤頁 API
             import aiohttp
@@ -675,12 +809,9 @@ class WebUIManager:
     def cleanup_expired_sessions(self) -> int:
         """清理過期會話"""
         cleanup_start_time = time.time()
-        expired_sessions = []
 
-        # 掃描過期會話
-        for session_id, session in self.sessions.items():
-            if session.is_expired():
-                expired_sessions.append(session_id)
+        # 從過期索引取出到期會話，無需掃描全部會話
+        expired_sessions = self.pop_expired_session_ids(cleanup_start_time)
 
         # 批量清理過期會話
         cleaned_count = 0
@@ -690,7 +821,7 @@ class WebUIManager:
                 if session:
                     # 使用增強清理方法
                     session._cleanup_sync_enhanced(CleanupReason.EXPIRED)
-                    del self.sessions[session_id]
+                    self.discard_session(session_id)
                     cleaned_count += 1
 
                     # 如果清理的是當前活躍會話，清空當前會話
@@ -755,7 +886,7 @@ class WebUIManager:
             try:
                 # 使用增強清理方法
                 session._cleanup_sync_enhanced(CleanupReason.MEMORY_PRESSURE)
-                del self.sessions[session_id]
+                self.discard_session(session_id)
                 cleaned_count += 1
 
                 # 如果清理的是當前活躍會話，清空當前會話
@@ -828,6 +959,8 @@ class WebUIManager:
                 debug_log(f"停止服務時清理會話失敗: {e}")
 
         self.sessions.clear()
+        self._expiry_index.clear()
+        self._creation_index.clear()
         self.current_session = None
 
         # 更新統計
@@ -842,6 +975,11 @@ class WebUIManager:
 
         debug_log(f"停止服務時清理了 {session_count} 個會話，耗時: {cleanup_duration:.2f}秒")
 
+        # 釋放尚未交給伺服器的預先綁定 socket
+        if self._listen_socket is not None:
+            self._listen_socket.close()
+            self._listen_socket = None
+
         # 停止伺服器（注意：uvicorn 的 graceful shutdown 需要額外處理）
         if self.server_thread and self.server_thread.is_alive():
             debug_log("正在停止 Web UI 服務")
@@ -871,22 +1009,28 @@ async def launch_web_feedback_ui(project_directory: str, summary: str, timeout:
     Returns:
         dict: 回饋結果，包含 logs、interactive_feedback 和 images
     """
-    manager = get_web_ui_manager()
+    with span("get_web_ui_manager"):
+        manager = get_web_ui_manager()
 
     # 創建或更新當前活躍會話
-    session_id = manager.create_session(project_directory, summary)
-    session = manager.get_current_session()
+    with span("create_session"):
+        session_id = manager.create_session(project_directory, summary)
+        session = manager.get_current_session()
 
     if not session:
         raise RuntimeError("無法創建回饋會話")
 
     # 啟動伺服器（如果尚未啟動）
     if not manager.server_thread or not manager.server_thread.is_alive():
-        manager.start_server()
+        with span("start_server"):
+            await manager.start_server_async()
 
     # 使用根路徑 URL 並智能開啟瀏覽器
     feedback_url = manager.get_server_url()  # 直接使用根路徑
-    has_active_tabs = await manager.smart_open_browser(feedback_url)
+    with span("smart_open_browser") as browser_span:
+        has_active_tabs = await manager.smart_open_browser(feedback_url)
+        if browser_span is not None:
+            browser_span.set_attribute("has_active_tabs", has_active_tabs)
 
     debug_log(f"[DEBUG] 服務器地址: {feedback_url}")
 
@@ -897,7 +1041,8 @@ async def launch_web_feedback_ui(project_directory: str, summary: str, timeout:
 
     try:
         # 等待用戶回饋，傳遞 timeout 參數
-        result = await session.wait_for_feedback(timeout)
+        with span("wait_for_feedback", waits_for_user=True):
+            result = await session.wait_for_feedback(timeout)
         debug_log(f"收到用戶回饋")
         return result
     except TimeoutError:
@@ -9,9 +9,13 @@ Web 回饋會話模型
 
 import asyncio
 import base64
+import codecs
+import io
+import locale
 import subprocess
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from enum import Enum
 from pathlib import Path
@@ -22,6 +26,14 @@ from fastapi import WebSocket
 from ...debug import web_debug_log as debug_log
 from ...utils.resource_manager import get_resource_manager, register_process
 from ...utils.error_handler import ErrorHandler, ErrorType
+from ...utils.expiry_index import ExpiryIndex
+from ...utils.log_buffer import BoundedLog
+from ...utils.deadline_scheduler import ScheduledCall, get_deadline_scheduler
+from ...utils.image_artifact import SNIFF_BYTES, detect_image_mime
+from ...utils.image_pipeline import get_image_pipeline
+from ...utils.metrics import get_metrics, image_bytes_counter
+from ..utils.connection_hub import get_connection_hub
+from ..utils.upload_store import get_upload_store
 
 
 class SessionStatus(Enum):
@@ -48,6 +60,33 @@ class CleanupReason(Enum):
 MAX_IMAGE_SIZE = 1 * 1024 * 1024  # 1MB 圖片大小限制
 SUPPORTED_IMAGE_TYPES = {'image/png', 'image/jpeg', 'image/jpg', 'image/gif', 'image/bmp', 'image/webp'}
 TEMP_DIR = Path.home() / ".cache" / "interactive-feedback-mcp-web"
+AUTO_CLEANUP_WORKERS = 4  # 自動清理線程數量
+
+# 自動清理線程池：清理可能等待子進程結束，不能阻塞共用的調度線程
+_cleanup_executor: Optional[ThreadPoolExecutor] = None
+_cleanup_executor_lock = threading.Lock()
+
+
+def _get_cleanup_executor() -> ThreadPoolExecutor:
+    """獲取自動清理線程池"""
+    global _cleanup_executor
+    if _cleanup_executor is None:
+        with _cleanup_executor_lock:
+            if _cleanup_executor is None:
+                _cleanup_executor = ThreadPoolExecutor(
+                    max_workers=AUTO_CLEANUP_WORKERS,
+                    thread_name_prefix="SessionCleanup"
+                )
+    return _cleanup_executor
+
+# 命令輸出合併發送設定
+OUTPUT_FLUSH_INTERVAL = 0.05  # 最長合併時間（秒）
+OUTPUT_FLUSH_BYTES = 16 * 1024  # 累積達此大小立即發送
+OUTPUT_READ_SIZE = 64 * 1024  # 單次讀取大小
+
+# 運行指標
+_command_executions = get_metrics().counter("mcp_command_executions_total", "命令執行次數（按結果）")
+_command_duration = get_metrics().histogram("mcp_command_duration_seconds", "命令執行耗時（秒）")
 
 
 class WebFeedbackSession:
@@ -58,13 +97,15 @@ class WebFeedbackSession:
         self.session_id = session_id
         self.project_directory = project_directory
         self.summary = summary
-        self.websocket: Optional[WebSocket] = None
         self.feedback_result: Optional[str] = None
         self.images: List[dict] = []
         self.settings: dict = {}  # 圖片設定
         self.feedback_completed = threading.Event()
+        # 回饋完成等待者：future -> 所屬事件循環（等待時不佔用線程）
+        self._feedback_waiters: Dict[asyncio.Future, asyncio.AbstractEventLoop] = {}
+        self._feedback_waiters_lock = threading.Lock()
         self.process: Optional[subprocess.Popen] = None
-        self.command_logs = []
+        self.command_logs = BoundedLog()  # 有界命令日誌，保留開頭和最新輸出
         self._cleanup_done = False  # 防止重複清理
 
         # 新增：會話狀態管理
@@ -77,8 +118,10 @@ class WebFeedbackSession:
         # 新增：自動清理配置
         self.auto_cleanup_delay = auto_cleanup_delay  # 自動清理延遲時間（秒）
         self.max_idle_time = max_idle_time  # 最大空閒時間（秒）
-        self.cleanup_timer: Optional[threading.Timer] = None
+        self.cleanup_timer: Optional[ScheduledCall] = None  # 登記在全局調度器的自動清理回調
         self.cleanup_callbacks: List[Callable] = []  # 清理回調函數列表
+        self.feedback_callbacks: List[Callable] = []  # 回饋提交回調函數列表
+        self.expiry_index: Optional[ExpiryIndex] = None  # 所屬管理器的過期索引
 
         # 新增：清理統計
         self.cleanup_stats = {
@@ -96,11 +139,39 @@ class WebFeedbackSession:
         # 獲取資源管理器實例
         self.resource_manager = get_resource_manager()
 
+        # WebSocket 連接中心（同一會話可有多個標籤頁連接）
+        self.connection_hub = get_connection_hub()
+
         # 啟動自動清理定時器
         self._schedule_auto_cleanup()
 
         debug_log(f"會話 {self.session_id} 初始化完成，自動清理延遲: {auto_cleanup_delay}秒，最大空閒: {max_idle_time}秒")
 
+    @property
+    def websocket(self) -> Optional[WebSocket]:
+        """最近建立的 WebSocket 連接（向後兼容，發送消息請使用 broadcast）"""
+        return self.connection_hub.latest(self.session_id)
+
+    def attach_websocket(self, websocket: WebSocket):
+        """登記 WebSocket 連接（需在連接所屬的事件循環中調用）"""
+        self.connection_hub.register(self.session_id, websocket)
+
+    def detach_websocket(self, websocket: WebSocket):
+        """移除 WebSocket 連接"""
+        self.connection_hub.unregister(self.session_id, websocket)
+
+    def owns_websocket(self, websocket: WebSocket) -> bool:
+        """檢查 WebSocket 連接是否屬於此會話"""
+        return self.connection_hub.contains(self.session_id, websocket)
+
+    async def broadcast(self, message: dict) -> int:
+        """向此會話的所有標籤頁廣播消息，返回接收的連接數量"""
+        return await self.connection_hub.broadcast(self.session_id, message)
+
+    def send_to(self, websocket: WebSocket, message: dict) -> bool:
+        """向此會話的單一連接發送消息"""
+        return self.connection_hub.send(self.session_id, websocket, message)
+
     def update_status(self, status: SessionStatus, message: str = None):
         """更新會話狀態"""
         self.status = status
@@ -108,6 +179,7 @@ class WebFeedbackSession:
             self.status_message = message
         # 統一使用 time.time()
         self.last_activity = time.time()
+        self._refresh_expiry()
 
         # 如果會話變為活躍狀態，重置清理定時器
         if status in [SessionStatus.ACTIVE, SessionStatus.FEEDBACK_SUBMITTED]:
@@ -157,6 +229,27 @@ class WebFeedbackSession:
 
         return False
 
+    def get_expiry_deadline(self) -> float:
+        """獲取過期時間戳（與 is_expired 的判定一致）"""
+        if self.status == SessionStatus.EXPIRED:
+            return self.last_activity
+
+        deadline = self.last_activity + self.max_idle_time
+        if self.status in [SessionStatus.ERROR, SessionStatus.TIMEOUT]:
+            # 錯誤狀態超過5分鐘視為過期
+            deadline = min(deadline, self.last_activity + 300)
+        return deadline
+
+    def attach_expiry_index(self, expiry_index: ExpiryIndex):
+        """登記到過期索引，之後狀態變更會自動更新截止時間"""
+        self.expiry_index = expiry_index
+        self._refresh_expiry()
+
+    def _refresh_expiry(self):
+        """重新計算並更新過期索引中的截止時間"""
+        if self.expiry_index is not None:
+            self.expiry_index.schedule(self.session_id, self.get_expiry_deadline())
+
     def get_age(self) -> float:
         """獲取會話年齡（秒）"""
         current_time = time.time()
@@ -167,51 +260,53 @@ class WebFeedbackSession:
         current_time = time.time()
         return current_time - self.last_activity
 
-    def _schedule_auto_cleanup(self):
-        """安排自動清理定時器"""
+    def _schedule_auto_cleanup(self, delay: int = None):
+        """安排自動清理（登記到全局調度器，重新安排不會新建線程）"""
+        if delay is None:
+            delay = self.auto_cleanup_delay
+
         if self.cleanup_timer:
-            self.cleanup_timer.cancel()
+            self.cleanup_timer.reschedule(delay)
+        else:
+            self.cleanup_timer = get_deadline_scheduler().call_later(delay, self._auto_cleanup)
+        debug_log(f"會話 {self.session_id} 自動清理定時器已設置，{delay}秒後觸發")
 
-        def auto_cleanup():
-            """自動清理回調"""
-            try:
-                if not self._cleanup_done and self.is_expired():
-                    debug_log(f"會話 {self.session_id} 觸發自動清理（過期）")
-                    # 使用異步方式執行清理
-                    import asyncio
-                    try:
-                        loop = asyncio.get_event_loop()
-                        loop.create_task(self._cleanup_resources_enhanced(CleanupReason.EXPIRED))
-                    except RuntimeError:
-                        # 如果沒有事件循環，使用同步清理
-                        self._cleanup_sync_enhanced(CleanupReason.EXPIRED)
-                else:
-                    # 如果還沒過期，重新安排定時器
-                    self._schedule_auto_cleanup()
-            except Exception as e:
-                error_id = ErrorHandler.log_error_with_context(
-                    e,
-                    context={"session_id": self.session_id, "operation": "自動清理"},
-                    error_type=ErrorType.SYSTEM
-                )
-                debug_log(f"自動清理失敗 [錯誤ID: {error_id}]: {e}")
+    def _auto_cleanup(self):
+        """自動清理回調（在調度線程中執行，實際清理交給清理線程池）"""
+        try:
+            if not self._cleanup_done and self.is_expired():
+                debug_log(f"會話 {self.session_id} 觸發自動清理（過期）")
+                # 清理可能等待子進程結束數秒，不能佔用其他會話共用的調度線程
+                _get_cleanup_executor().submit(self._run_auto_cleanup)
+            elif not self._cleanup_done:
+                # 如果還沒過期，重新安排定時器
+                self._schedule_auto_cleanup()
+        except Exception as e:
+            error_id = ErrorHandler.log_error_with_context(
+                e,
+                context={"session_id": self.session_id, "operation": "自動清理"},
+                error_type=ErrorType.SYSTEM
+            )
+            debug_log(f"自動清理失敗 [錯誤ID: {error_id}]: {e}")
 
-        self.cleanup_timer = threading.Timer(self.auto_cleanup_delay, auto_cleanup)
-        self.cleanup_timer.daemon = True
-        self.cleanup_timer.start()
-        debug_log(f"會話 {self.session_id} 自動清理定時器已設置，{self.auto_cleanup_delay}秒後觸發")
+    def _run_auto_cleanup(self):
+        """執行過期清理（在清理線程池中執行）"""
+        try:
+            self._cleanup_sync_enhanced(CleanupReason.EXPIRED)
+        except Exception as e:
+            error_id = ErrorHandler.log_error_with_context(
+                e,
+                context={"session_id": self.session_id, "operation": "自動清理"},
+                error_type=ErrorType.SYSTEM
+            )
+            debug_log(f"自動清理失敗 [錯誤ID: {error_id}]: {e}")
 
     def extend_cleanup_timer(self, additional_time: int = None):
         """延長清理定時器"""
         if additional_time is None:
             additional_time = self.auto_cleanup_delay
 
-        if self.cleanup_timer:
-            self.cleanup_timer.cancel()
-
-        self.cleanup_timer = threading.Timer(additional_time, lambda: None)
-        self.cleanup_timer.daemon = True
-        self.cleanup_timer.start()
+        self._schedule_auto_cleanup(additional_time)
 
         debug_log(f"會話 {self.session_id} 清理定時器已延長 {additional_time} 秒")
 
@@ -227,6 +322,22 @@ class WebFeedbackSession:
             self.cleanup_callbacks.remove(callback)
             debug_log(f"會話 {self.session_id} 移除清理回調函數")
 
+    def add_feedback_callback(self, callback: Callable):
+        """添加回饋提交回調函數，回調參數為 (session, result)"""
+        if callback not in self.feedback_callbacks:
+            self.feedback_callbacks.append(callback)
+            debug_log(f"會話 {self.session_id} 添加回饋提交回調函數")
+
+    def get_feedback_result(self) -> dict:
+        """獲取目前的回饋結果"""
+        return {
+            "session_id": self.session_id,
+            "logs": self.command_logs.join("\n"),
+            "interactive_feedback": self.feedback_result or "",
+            "images": self.images,
+            "settings": self.settings
+        }
+
     def get_cleanup_stats(self) -> dict:
         """獲取清理統計信息"""
         stats = self.cleanup_stats.copy()
@@ -263,21 +374,28 @@ class WebFeedbackSession:
                 actual_timeout = timeout - 5  # 長超時提前5秒
             debug_log(f"會話 {self.session_id} 開始等待回饋，超時時間: {actual_timeout} 秒（原始: {timeout} 秒）")
             
-            loop = asyncio.get_event_loop()
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
             
-            def wait_in_thread():
-                return self.feedback_completed.wait(actual_timeout)
+            # 在鎖內檢查並登記，避免與 _set_feedback_completed 競爭而丟失喚醒
+            with self._feedback_waiters_lock:
+                completed = self.feedback_completed.is_set()
+                if not completed:
+                    self._feedback_waiters[future] = loop
             
-            completed = await loop.run_in_executor(None, wait_in_thread)
+            if not completed:
+                try:
+                    await asyncio.wait_for(future, timeout=actual_timeout)
+                    completed = True
+                except asyncio.TimeoutError:
+                    completed = False
+                finally:
+                    with self._feedback_waiters_lock:
+                        self._feedback_waiters.pop(future, None)
             
             if completed:
                 debug_log(f"會話 {self.session_id} 收到用戶回饋")
-                return {
-                    "logs": "\n".join(self.command_logs),
-                    "interactive_feedback": self.feedback_result or "",
-                    "images": self.images,
-                    "settings": self.settings
-                }
+                return self.get_feedback_result()
             else:
                 # 超時了，立即清理資源
                 debug_log(f"會話 {self.session_id} 在 {actual_timeout} 秒後超時，開始清理資源...")
@@ -290,6 +408,29 @@ class WebFeedbackSession:
             await self._cleanup_resources_on_timeout()
             raise
 
+    def _set_feedback_completed(self):
+        """設置完成事件並喚醒所有等待者（可從任意線程調用）"""
+        with self._feedback_waiters_lock:
+            self.feedback_completed.set()
+            waiters = self._feedback_waiters
+            self._feedback_waiters = {}
+
+        for future, loop in waiters.items():
+            if loop.is_closed():
+                continue
+            try:
+                # 在等待者所屬的事件循環中完成 future
+                loop.call_soon_threadsafe(self._resolve_feedback_waiter, future)
+            except RuntimeError:
+                # 事件循環已關閉
+                pass
+
+    @staticmethod
+    def _resolve_feedback_waiter(future: asyncio.Future):
+        """完成等待者的 future"""
+        if not future.done():
+            future.set_result(None)
+
     async def submit_feedback(self, feedback: str, images: List[dict], settings: dict = None):
         """
         提交回饋和圖片
@@ -302,23 +443,33 @@ class WebFeedbackSession:
         self.feedback_result = feedback
         # 先設置設定，再處理圖片（因為處理圖片時需要用到設定）
         self.settings = settings or {}
-        self.images = self._process_images(images)
+        self.images = await get_image_pipeline().process(
+            self._process_images(images), self._get_image_size_limit()
+        )
 
         # 更新狀態為已提交反饋
         self.update_status(SessionStatus.FEEDBACK_SUBMITTED, "已送出反饋，等待下次 MCP 調用")
 
-        self.feedback_completed.set()
+        self._set_feedback_completed()
+
+        # 通知回饋提交回調（例如 HTTP MCP 會話管理器）
+        if self.feedback_callbacks:
+            result = self.get_feedback_result()
+            for callback in self.feedback_callbacks:
+                try:
+                    if asyncio.iscoroutinefunction(callback):
+                        await callback(self, result)
+                    else:
+                        callback(self, result)
+                except Exception as e:
+                    debug_log(f"回饋提交回調執行失敗: {e}")
 
         # 發送反饋已收到的消息給前端
-        if self.websocket:
-            try:
-                await self.websocket.send_json({
-                    "type": "feedback_received",
-                    "message": "反饋已成功提交",
-                    "status": self.status.value
-                })
-            except Exception as e:
-                debug_log(f"發送反饋確認失敗: {e}")
+        await self.broadcast({
+            "type": "feedback_received",
+            "message": "反饋已成功提交",
+            "status": self.status.value
+        })
 
         # 重構：不再自動關閉 WebSocket，保持連接以支援頁面持久性
     
@@ -334,11 +485,19 @@ class WebFeedbackSession:
         """
         processed_images = []
 
-        # 從設定中獲取圖片大小限制，如果沒有設定則使用預設值
-        size_limit = self.settings.get('image_size_limit', MAX_IMAGE_SIZE)
+        size_limit = self._get_image_size_limit()
+        # 啟用圖片縮放時，超過大小限制的圖片交由縮放階段縮小，而不是直接丟棄
+        if get_image_pipeline().available:
+            size_limit = 0
 
         for img in images:
             try:
+                # 已透過上傳端點傳送的圖片只攜帶上傳 ID，從暫存檔讀取
+                if img.get("upload_id"):
+                    img = self._resolve_uploaded_image(img["upload_id"], size_limit)
+                    if img is None:
+                        continue
+
                 if not all(key in img for key in ["name", "data", "size"]):
                     continue
 
@@ -360,12 +519,22 @@ class WebFeedbackSession:
                 if len(image_bytes) == 0:
                     debug_log(f"圖片 {img['name']} 數據為空，跳過")
                     continue
-                
-                processed_images.append({
+
+                processed_image = {
                     "name": img["name"],
                     "data": image_bytes,  # 保存原始 bytes 數據
                     "size": len(image_bytes)
-                })
+                }
+
+                # 按文件頭判斷格式，只判斷一次並隨圖片記錄保存；
+                # 無法識別時（如 SVG、TIFF 或截斷的圖片）保留圖片，之後按文件名推斷類型
+                mime_type = detect_image_mime(image_bytes[:SNIFF_BYTES])
+                if mime_type is not None:
+                    processed_image["mime_type"] = mime_type
+                else:
+                    debug_log(f"圖片 {img['name']} 無法從文件頭識別格式，按文件名推斷")
+                processed_images.append(processed_image)
+                image_bytes_counter().inc(len(image_bytes), stage="received")
                 
                 debug_log(f"圖片 {img['name']} 處理成功，大小: {len(image_bytes)} bytes")
                 
@@ -375,6 +544,30 @@ class WebFeedbackSession:
         
         return processed_images
 
+    def _get_image_size_limit(self) -> int:
+        """從設定中獲取圖片大小限制，如果沒有設定則使用預設值"""
+        return self.settings.get('image_size_limit', MAX_IMAGE_SIZE)
+
+    def _resolve_uploaded_image(self, upload_id: str, size_limit: int = 0) -> Optional[dict]:
+        """讀取本會話已上傳的圖片（讀取後刪除暫存檔）"""
+        upload_store = get_upload_store()
+        upload = upload_store.consume(upload_id, self.session_id)
+        if upload is None:
+            debug_log(f"上傳 {upload_id} 不存在或不屬於會話 {self.session_id}，跳過")
+            return None
+
+        # 超過大小限制時不必讀取內容
+        if size_limit > 0 and upload.size > size_limit:
+            debug_log(f"圖片 {upload.name} 超過大小限制 ({size_limit} bytes)，跳過")
+            upload_store.discard_file(upload)
+            return None
+
+        image_bytes = upload_store.read(upload)
+        if image_bytes is None:
+            return None
+
+        return {"name": upload.name, "data": image_bytes, "size": len(image_bytes)}
+
     def add_log(self, log_entry: str):
         """添加命令日誌"""
         self.command_logs.append(log_entry)
@@ -383,12 +576,13 @@ class WebFeedbackSession:
         """執行命令並透過 WebSocket 發送輸出"""
         if self.process:
             # 終止現有進程
+            previous = self.process
             try:
-                self.process.terminate()
-                self.process.wait(timeout=5)
+                previous.terminate()
+                await asyncio.get_running_loop().run_in_executor(None, previous.wait, 5)
             except:
                 try:
-                    self.process.kill()
+                    previous.kill()
                 except:
                     pass
             self.process = None
@@ -396,15 +590,14 @@ class WebFeedbackSession:
         try:
             debug_log(f"執行命令: {command}")
             
+            # 以二進位模式讀取，輸出按時間/大小合併後再解碼發送
             self.process = subprocess.Popen(
                 command,
                 shell=True,
                 cwd=self.project_directory,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.STDOUT,
-                text=True,
-                bufsize=1,
-                universal_newlines=True
+                bufsize=0
             )
 
             # 註冊進程到資源管理器
@@ -414,65 +607,127 @@ class WebFeedbackSession:
                 auto_cleanup=True
             )
 
-            # 在背景線程中讀取輸出
+            process = self.process
+            started_at = time.perf_counter()
+
             async def read_output():
-                loop = asyncio.get_event_loop()
                 try:
-                    # 使用線程池執行器來處理阻塞的讀取操作
-                    def read_line():
-                        if self.process and self.process.stdout:
-                            return self.process.stdout.readline()
-                        return ''
-                    
-                    while True:
-                        line = await loop.run_in_executor(None, read_line)
-                        if not line:
-                            break
-                            
-                        self.add_log(line.rstrip())
-                        if self.websocket:
-                            try:
-                                await self.websocket.send_json({
-                                    "type": "command_output",
-                                    "output": line
-                                })
-                            except Exception as e:
-                                debug_log(f"WebSocket 發送失敗: {e}")
-                                break
-                                
+                    await self._stream_command_output(process)
                 except Exception as e:
                     debug_log(f"讀取命令輸出錯誤: {e}")
                 finally:
-                    # 等待進程完成
-                    if self.process:
-                        exit_code = self.process.wait()
-
-                        # 從資源管理器取消註冊進程
-                        self.resource_manager.unregister_process(self.process.pid)
-
-                        # 發送命令完成信號
-                        if self.websocket:
-                            try:
-                                await self.websocket.send_json({
-                                    "type": "command_complete",
-                                    "exit_code": exit_code
-                                })
-                            except Exception as e:
-                                debug_log(f"發送完成信號失敗: {e}")
+                    # 等待進程完成（進程可能關閉 stdout 後繼續運行，不能阻塞事件循環）
+                    exit_code = await asyncio.get_running_loop().run_in_executor(None, process.wait)
+                    _command_duration.observe(time.perf_counter() - started_at)
+                    _command_executions.inc(status="success" if exit_code == 0 else "failed")
+
+                    # 從資源管理器取消註冊進程
+                    self.resource_manager.unregister_process(process.pid)
+
+                    # 發送命令完成信號
+                    await self.broadcast({
+                        "type": "command_complete",
+                        "exit_code": exit_code
+                    })
 
             # 啟動異步任務讀取輸出
             asyncio.create_task(read_output())
 
         except Exception as e:
+            _command_executions.inc(status="error")
             debug_log(f"執行命令錯誤: {e}")
-            if self.websocket:
-                try:
-                    await self.websocket.send_json({
-                        "type": "command_error",
-                        "error": str(e)
-                    })
-                except:
-                    pass
+            await self.broadcast({
+                "type": "command_error",
+                "error": str(e)
+            })
+
+    async def _stream_command_output(self, process: subprocess.Popen):
+        """
+        讀取命令輸出並合併發送
+
+        輸出累積到 OUTPUT_FLUSH_BYTES 或距首個未發送位元組超過 OUTPUT_FLUSH_INTERVAL
+        時才發送一幀，避免逐行發送造成大量 WebSocket 幀和線程切換。
+        """
+        loop = asyncio.get_running_loop()
+        stdout = process.stdout
+
+        try:
+            # POSIX 下直接由事件循環監聽管道，不佔用線程
+            reader = asyncio.StreamReader(limit=OUTPUT_READ_SIZE)
+            transport, _ = await loop.connect_read_pipe(
+                lambda: asyncio.StreamReaderProtocol(reader), stdout
+            )
+
+            def read_chunk():
+                return reader.read(OUTPUT_READ_SIZE)
+        except (NotImplementedError, OSError, ValueError):
+            # 事件循環不支援管道（如 Windows 上的 SelectorEventLoop），改用執行器按塊讀取
+            transport = None
+
+            def read_chunk():
+                return loop.run_in_executor(None, stdout.read, OUTPUT_READ_SIZE)
+
+        # 與 text=True 相同的通用換行處理：\r\n 和單獨的 \r 都轉為 \n，
+        # 塊末尾的 \r 保留到下一塊再判斷，跨塊的 \r\n 不會變成兩個換行
+        decoder = io.IncrementalNewlineDecoder(
+            codecs.getincrementaldecoder(locale.getpreferredencoding(False))(errors="replace"),
+            translate=True
+        )
+        buffer = bytearray()
+        partial_line = ""
+        flush_at = 0.0
+        pending: Optional[asyncio.Future] = None
+
+        async def flush(final: bool = False):
+            nonlocal partial_line
+            text = decoder.decode(bytes(buffer), final=final)
+            buffer.clear()
+
+            # 日誌按行保存，跨塊的不完整行留到下次
+            lines = (partial_line + text).split("\n")
+            partial_line = lines.pop()
+            for line in lines:
+                self.add_log(line.rstrip())
+            if final and partial_line:
+                self.add_log(partial_line.rstrip())
+                partial_line = ""
+
+            if not text:
+                return
+
+            await self.broadcast({
+                "type": "command_output",
+                "output": text
+            })
+
+        try:
+            while True:
+                if pending is None:
+                    pending = asyncio.ensure_future(read_chunk())
+
+                timeout = max(0.0, flush_at - loop.time()) if buffer else None
+                done, _ = await asyncio.wait({pending}, timeout=timeout)
+                if not done:
+                    # 到達發送間隔，讀取繼續進行
+                    await flush()
+                    continue
+
+                chunk = pending.result()
+                pending = None
+                if not chunk:
+                    break
+
+                if not buffer:
+                    flush_at = loop.time() + OUTPUT_FLUSH_INTERVAL
+                buffer += chunk
+                if len(buffer) >= OUTPUT_FLUSH_BYTES:
+                    await flush()
+        finally:
+            await flush(final=True)
+            if pending is not None and not pending.done():
+                pending.cancel()
+            if transport is not None:
+                transport.close()
 
     async def _cleanup_resources_on_timeout(self):
         """超時時清理所有資源（保持向後兼容）"""
@@ -511,7 +766,7 @@ class WebFeedbackSession:
                 self.cleanup_timer = None
                 resources_cleaned += 1
 
-            # 2. 關閉 WebSocket 連接
+            # 2. 關閉所有 WebSocket 連接
             if self.websocket:
                 try:
                     # 根據清理原因發送不同的通知消息
@@ -524,21 +779,18 @@ class WebFeedbackSession:
                         CleanupReason.SHUTDOWN: "系統正在關閉，會話將被清理"
                     }
 
-                    await self.websocket.send_json({
+                    await self.broadcast({
                         "type": "session_cleanup",
                         "reason": reason.value,
                         "message": message_map.get(reason, "會話將被清理")
                     })
-                    await asyncio.sleep(0.1)  # 給前端一點時間處理消息
 
-                    # 安全關閉 WebSocket
+                    # 安全關閉 WebSocket（關閉前會先送出已排隊的消息）
                     await self._safe_close_websocket()
                     debug_log(f"會話 {self.session_id} WebSocket 已關閉")
                     resources_cleaned += 1
                 except Exception as e:
                     debug_log(f"關閉 WebSocket 時發生錯誤: {e}")
-                finally:
-                    self.websocket = None
 
             # 3. 終止正在運行的命令進程
             if self.process:
@@ -557,7 +809,7 @@ class WebFeedbackSession:
                     self.process = None
 
             # 4. 設置完成事件（防止其他地方還在等待）
-            self.feedback_completed.set()
+            self._set_feedback_completed()
 
             # 5. 清理臨時數據
             logs_count = len(self.command_logs)
@@ -566,6 +818,7 @@ class WebFeedbackSession:
             self.command_logs.clear()
             self.images.clear()
             self.settings.clear()
+            get_upload_store().discard_session(self.session_id)
 
             if logs_count > 0 or images_count > 0:
                 resources_cleaned += logs_count + images_count
@@ -580,6 +833,7 @@ class WebFeedbackSession:
                 self.status = SessionStatus.ERROR
             else:
                 self.status = SessionStatus.COMPLETED
+            self._refresh_expiry()
 
             # 7. 調用清理回調函數
             for callback in self.cleanup_callbacks:
@@ -687,13 +941,14 @@ class WebFeedbackSession:
             if not preserve_websocket:
                 self.images.clear()
                 self.settings.clear()
+                get_upload_store().discard_session(self.session_id)
                 resources_cleaned += images_count
 
             resources_cleaned += logs_count
 
             # 4. 設置完成事件
             if not preserve_websocket:
-                self.feedback_completed.set()
+                self._set_feedback_completed()
 
             # 5. 更新狀態
             if not preserve_websocket:
@@ -705,6 +960,7 @@ class WebFeedbackSession:
                     self.status = SessionStatus.ERROR
                 else:
                     self.status = SessionStatus.COMPLETED
+                self._refresh_expiry()
 
                 self._cleanup_done = True
 
@@ -760,25 +1016,10 @@ class WebFeedbackSession:
 
     async def _safe_close_websocket(self):
         """安全關閉 WebSocket 連接，避免事件循環衝突"""
-        if not self.websocket:
-            return
-
         try:
-            # 檢查連接狀態
-            if hasattr(self.websocket, 'client_state') and self.websocket.client_state.DISCONNECTED:
-                debug_log("WebSocket 已斷開，跳過關閉操作")
-                return
-
-            # 嘗試正常關閉
-            await asyncio.wait_for(self.websocket.close(code=1000, reason="會話清理"), timeout=2.0)
-            debug_log(f"會話 {self.session_id} WebSocket 已正常關閉")
-
-        except asyncio.TimeoutError:
-            debug_log(f"會話 {self.session_id} WebSocket 關閉超時")
-        except RuntimeError as e:
-            if "attached to a different loop" in str(e):
-                debug_log(f"會話 {self.session_id} WebSocket 事件循環衝突，忽略關閉錯誤: {e}")
-            else:
-                debug_log(f"會話 {self.session_id} WebSocket 關閉時發生運行時錯誤: {e}")
+            # 連接中心會在各連接所屬的事件循環中關閉，避免跨事件循環操作
+            closed = await self.connection_hub.close_session(self.session_id, code=1000, reason="會話清理")
+            if closed:
+                debug_log(f"會話 {self.session_id} 已關閉 {closed} 個 WebSocket 連接")
         except Exception as e:
             debug_log(f"會話 {self.session_id} 關閉 WebSocket 時發生未知錯誤: {e}")
\ No newline at end of file
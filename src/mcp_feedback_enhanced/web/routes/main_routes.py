@@ -11,13 +11,17 @@ import json
 import os
 import time
 from pathlib import Path
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Callable, Optional
 
 from fastapi import Request, WebSocket, WebSocketDisconnect
 from fastapi.responses import HTMLResponse, JSONResponse
 
 from ...debug import web_debug_log as debug_log
 from ... import __version__
+from ...utils.error_handler import ErrorHandler, ErrorType
+from ..models.feedback_session import SUPPORTED_IMAGE_TYPES
+from ..utils.connection_hub import get_connection_hub
+from ..utils.upload_store import UploadTooLargeError, get_upload_store
 
 if TYPE_CHECKING:
     from ..main import WebUIManager
@@ -77,6 +81,54 @@ def setup_routes(manager: 'WebUIManager'):
             "i18n": manager.i18n
         })
 
+    @manager.app.get("/session/{session_id}", response_class=HTMLResponse)
+    async def session_page(request: Request, session_id: str):
+        """指定會話的回饋頁面 - 多會話路由模式，不影響當前活躍會話"""
+        session = manager.get_or_create_http_session(session_id)
+
+        if not session:
+            return manager.templates.TemplateResponse("index.html", {
+                "request": request,
+                "title": "MCP Feedback Enhanced",
+                "has_session": False,
+                "version": __version__
+            }, status_code=404)
+
+        layout_mode = load_user_layout_settings()
+
+        return manager.templates.TemplateResponse("feedback.html", {
+            "request": request,
+            "project_directory": session.project_directory,
+            "summary": session.summary,
+            "title": "Interactive Feedback - 回饋收集",
+            "version": __version__,
+            "has_session": True,
+            "layout_mode": layout_mode,
+            "i18n": manager.i18n,
+            "session_id": session.session_id,
+            "session_routed": True
+        })
+
+    @manager.app.get("/api/session/{session_id}")
+    async def get_routed_session(session_id: str):
+        """獲取指定會話詳細信息"""
+        session = manager.get_session(session_id)
+
+        if not session:
+            return JSONResponse(
+                status_code=404,
+                content={"error": "會話不存在"}
+            )
+
+        return JSONResponse(content={
+            "session_id": session.session_id,
+            "project_directory": session.project_directory,
+            "summary": session.summary,
+            "feedback_completed": session.feedback_completed.is_set(),
+            "command_logs": session.command_logs.to_list(),
+            "images_count": len(session.images)
+        })
+
     @manager.app.get("/api/translations")
     async def get_translations():
         """獲取翻譯數據 - 從 Web 專用翻譯檔案載入"""
@@ -144,10 +196,20 @@ def setup_routes(manager: 'WebUIManager'):
             "project_directory": current_session.project_directory,
             "summary": current_session.summary,
             "feedback_completed": current_session.feedback_completed.is_set(),
-            "command_logs": current_session.command_logs,
+            "command_logs": current_session.command_logs.to_list(),
             "images_count": len(current_session.images)
         })
 
+    @manager.app.post("/api/current-session/upload-image")
+    async def upload_current_session_image(request: Request):
+        """上傳圖片到當前會話（請求內容為原始二進位圖片）"""
+        return await _receive_image_upload(manager.get_current_session(), request)
+
+    @manager.app.post("/api/session/{session_id}/upload-image")
+    async def upload_session_image(request: Request, session_id: str):
+        """上傳圖片到指定會話（請求內容為原始二進位圖片）"""
+        return await _receive_image_upload(manager.get_session(session_id), request)
+
     @manager.app.websocket("/ws")
     async def websocket_endpoint(websocket: WebSocket):
         """WebSocket 端點 - 重構後移除 session_id 依賴"""
@@ -158,15 +220,9 @@ def setup_routes(manager: 'WebUIManager'):
             return
 
         await websocket.accept()
-
-        # 檢查會話是否已有 WebSocket 連接
-        if session.websocket and session.websocket != websocket:
-            debug_log("會話已有 WebSocket 連接，替換為新連接")
-
-        session.websocket = websocket
         debug_log(f"WebSocket 連接建立: 當前活躍會話 {session.session_id}")
 
-        # 發送連接成功消息
+        # 發送連接成功消息（登記到連接中心之前直接發送，只發給此連接）
         try:
             await websocket.send_json({
                 "type": "connection_established",
@@ -198,31 +254,38 @@ def setup_routes(manager: 'WebUIManager'):
         except Exception as e:
             debug_log(f"發送連接確認失敗: {e}")
 
-        try:
-            while True:
-                data = await websocket.receive_text()
-                message = json.loads(data)
+        # 同一會話可有多個標籤頁連接，廣播時全部都會收到
+        session.attach_websocket(websocket)
 
-                # 重新獲取當前會話，以防會話已切換
-                current_session = manager.get_current_session()
-                if current_session and current_session.websocket == websocket:
-                    await handle_websocket_message(manager, current_session, message)
-                else:
-                    debug_log("會話已切換或 WebSocket 連接不匹配，忽略消息")
-                    break
+        # 重新獲取當前會話，以防會話已切換
+        await _serve_websocket(manager, websocket, manager.get_current_session)
+
+    @manager.app.websocket("/ws/{session_id}")
+    async def session_websocket_endpoint(websocket: WebSocket, session_id: str):
+        """WebSocket 端點 - 多會話路由模式，連接綁定到指定會話"""
+        session = manager.get_session(session_id)
+        if not session:
+            await websocket.close(code=4004, reason="會話不存在")
+            return
 
-        except WebSocketDisconnect:
-            debug_log(f"WebSocket 連接正常斷開")
-        except ConnectionResetError:
-            debug_log(f"WebSocket 連接被重置")
+        await websocket.accept()
+        debug_log(f"WebSocket 連接建立: 會話 {session_id}")
+
+        try:
+            await websocket.send_json({
+                "type": "connection_established",
+                "message": "WebSocket 連接已建立"
+            })
+            await websocket.send_json({
+                "type": "status_update",
+                "status_info": session.get_status_info()
+            })
         except Exception as e:
-            debug_log(f"WebSocket 錯誤: {e}")
-        finally:
-            # 安全清理 WebSocket 連接
-            current_session = manager.get_current_session()
-            if current_session and current_session.websocket == websocket:
-                current_session.websocket = None
-                debug_log("已清理會話中的 WebSocket 連接")
+            debug_log(f"發送連接確認失敗: {e}")
+
+        session.attach_websocket(websocket)
+
+        await _serve_websocket(manager, websocket, lambda: manager.get_session(session_id))
 
     @manager.app.post("/api/save-settings")
     async def save_settings(request: Request):
@@ -344,7 +407,12 @@ def setup_routes(manager: 'WebUIManager'):
                     content={"error": "缺少 tabId"}
                 )
 
-            current_session = manager.get_current_session()
+            # 多會話路由模式下由前端指定會話
+            session_id = data.get("sessionId")
+            if session_id:
+                current_session = manager.get_session(session_id)
+            else:
+                current_session = manager.get_current_session()
             if not current_session:
                 return JSONResponse(
                     status_code=404,
@@ -382,8 +450,87 @@ def setup_routes(manager: 'WebUIManager'):
             )
 
 
-async def handle_websocket_message(manager: 'WebUIManager', session, data: dict):
-    """處理 WebSocket 消息"""
+async def _receive_image_upload(session, request: Request) -> JSONResponse:
+    """
+    分塊接收圖片上傳並寫入暫存區
+
+    文件名由查詢參數 name 指定，MIME 類型取自 Content-Type；
+    回應中的 upload_id 隨 submit_feedback 消息提交，取代 base64 圖片數據。
+    """
+    if not session:
+        return JSONResponse(status_code=404, content={"error": "會話不存在"})
+
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type not in SUPPORTED_IMAGE_TYPES:
+        return JSONResponse(status_code=415, content={"error": f"不支援的圖片類型: {content_type or 'unknown'}"})
+
+    upload_store = get_upload_store()
+    try:
+        upload = await upload_store.save_stream(
+            session.session_id,
+            request.query_params.get("name", ""),
+            content_type,
+            request.stream()
+        )
+    except UploadTooLargeError as e:
+        return JSONResponse(status_code=413, content={"error": str(e)})
+    except Exception as e:
+        error_id = ErrorHandler.log_error_with_context(
+            e,
+            context={"operation": "圖片上傳", "session_id": session.session_id},
+            error_type=ErrorType.FILE_IO
+        )
+        debug_log(f"圖片上傳失敗 [錯誤ID: {error_id}]: {e}")
+        return JSONResponse(status_code=500, content={"error": f"上傳失敗: {str(e)}"})
+
+    return JSONResponse(content=upload.to_dict())
+
+
+async def _serve_websocket(manager: 'WebUIManager', websocket: WebSocket,
+                           resolve_session: Callable[[], Optional[object]]):
+    """
+    WebSocket 消息循環
+
+    Args:
+        manager: WebUIManager 實例
+        websocket: 已接受的 WebSocket 連接
+        resolve_session: 返回此連接所屬會話的函數，每條消息都重新解析
+    """
+    try:
+        while True:
+            data = await websocket.receive_text()
+            message = json.loads(data)
+
+            session = resolve_session()
+            if session and session.owns_websocket(websocket):
+                await handle_websocket_message(manager, session, message, websocket)
+            else:
+                debug_log("會話已切換或 WebSocket 連接不匹配，忽略消息")
+                break
+
+    except WebSocketDisconnect:
+        debug_log(f"WebSocket 連接正常斷開")
+    except ConnectionResetError:
+        debug_log(f"WebSocket 連接被重置")
+    except Exception as e:
+        debug_log(f"WebSocket 錯誤: {e}")
+    finally:
+        # 安全清理 WebSocket 連接（連接可能已隨會話切換轉移，按連接移除）
+        if get_connection_hub().discard(websocket):
+            debug_log("已清理會話中的 WebSocket 連接")
+
+
+async def handle_websocket_message(manager: 'WebUIManager', session, data: dict,
+                                   websocket: Optional[WebSocket] = None):
+    """
+    處理 WebSocket 消息
+
+    Args:
+        manager: WebUIManager 實例
+        session: 消息所屬會話
+        data: 消息內容
+        websocket: 發送消息的連接，回應只發給此連接；None 時廣播給會話的所有連接
+    """
     message_type = data.get("type")
 
     if message_type == "submit_feedback":
@@ -401,14 +548,10 @@ async def handle_websocket_message(manager: 'WebUIManager', session, data: dict)
 
     elif message_type == "get_status":
         # 獲取會話狀態
-        if session.websocket:
-            try:
-                await session.websocket.send_json({
-                    "type": "status_update",
-                    "status_info": session.get_status_info()
-                })
-            except Exception as e:
-                debug_log(f"發送狀態更新失敗: {e}")
+        await _reply(session, websocket, {
+            "type": "status_update",
+            "status_info": session.get_status_info()
+        })
 
     elif message_type == "heartbeat":
         # WebSocket 心跳處理
@@ -430,15 +573,11 @@ async def handle_websocket_message(manager: 'WebUIManager', session, data: dict)
         manager.global_active_tabs[tab_id] = tab_info
 
         # 發送心跳回應
-        if session.websocket:
-            try:
-                await session.websocket.send_json({
-                    "type": "heartbeat_response",
-                    "tabId": tab_id,
-                    "timestamp": timestamp
-                })
-            except Exception as e:
-                debug_log(f"發送心跳回應失敗: {e}")
+        await _reply(session, websocket, {
+            "type": "heartbeat_response",
+            "tabId": tab_id,
+            "timestamp": timestamp
+        })
 
     elif message_type == "user_timeout":
         # 用戶設置的超時已到
@@ -451,6 +590,14 @@ async def handle_websocket_message(manager: 'WebUIManager', session, data: dict)
         debug_log(f"未知的消息類型: {message_type}")
 
 
+async def _reply(session, websocket: Optional[WebSocket], message: dict):
+    """回應消息：指定連接時只發給該連接，否則廣播"""
+    if websocket is not None:
+        session.send_to(websocket, message)
+    else:
+        await session.broadcast(message)
+
+
 async def _delayed_server_stop(manager: 'WebUIManager'):
     """延遲停止服務器"""
     import asyncio
@@ -9,8 +9,9 @@
  * 標籤頁管理器 - 處理多標籤頁狀態同步和智能瀏覽器管理
  */
 class TabManager {
-    constructor() {
+    constructor(sessionId = null) {
         this.tabId = this.generateTabId();
+        this.sessionId = sessionId; // 多會話路由模式下標籤頁所屬的會話
         this.heartbeatInterval = null;
         this.heartbeatFrequency = 5000; // 5秒心跳
         this.storageKey = 'mcp_feedback_tabs';
@@ -131,7 +132,8 @@ class TabManager {
                     'Content-Type': 'application/json',
                 },
                 body: JSON.stringify({
-                    tabId: this.tabId
+                    tabId: this.tabId,
+                    sessionId: this.sessionId
                 })
             });
 
@@ -155,12 +157,14 @@ class TabManager {
 }
 
 class FeedbackApp {
-    constructor(sessionId = null) {
+    constructor(sessionId = null, sessionRouted = false) {
         // 會話信息
         this.sessionId = sessionId;
+        // 多會話路由模式：WebSocket 和會話 API 綁定到固定會話
+        this.sessionRouted = Boolean(sessionRouted && sessionId);
 
         // 標籤頁管理
-        this.tabManager = new TabManager();
+        this.tabManager = new TabManager(this.sessionRouted ? sessionId : null);
 
         // WebSocket 相關
         this.websocket = null;
@@ -654,14 +658,22 @@ class FeedbackApp {
         }
 
         try {
-            const base64 = await this.fileToBase64(file);
             const imageData = {
                 name: file.name,
                 size: file.size,
                 type: file.type,
-                data: base64
+                previewUrl: URL.createObjectURL(file)
             };
 
+            try {
+                // 以二進位方式上傳，提交時只傳送上傳 ID
+                const upload = await this.uploadImage(file);
+                imageData.upload_id = upload.upload_id;
+            } catch (uploadError) {
+                console.warn('圖片上傳失敗，改用 base64 傳送:', uploadError);
+                imageData.data = await this.fileToBase64(file);
+            }
+
             this.images.push(imageData);
             this.updateImagePreview();
 
@@ -671,6 +683,19 @@ class FeedbackApp {
         }
     }
 
+    async uploadImage(file) {
+        const url = `${this.getSessionApiUrl()}/upload-image?name=${encodeURIComponent(file.name)}`;
+        const response = await fetch(url, {
+            method: 'POST',
+            headers: { 'Content-Type': file.type },
+            body: file
+        });
+        if (!response.ok) {
+            throw new Error(`上傳失敗: ${response.status}`);
+        }
+        return response.json();
+    }
+
     fileToBase64(file) {
         return new Promise((resolve, reject) => {
             const reader = new FileReader();
@@ -707,7 +732,7 @@ class FeedbackApp {
 
                 // 創建圖片元素
                 const img = document.createElement('img');
-                img.src = `data:${image.type};base64,${image.data}`;
+                img.src = image.previewUrl || `data:${image.type};base64,${image.data}`;
                 img.alt = image.name;
                 img.style.width = '80px';
                 img.style.height = '80px';
@@ -828,10 +853,19 @@ class FeedbackApp {
     }
 
     removeImage(index) {
-        this.images.splice(index, 1);
+        const [removed] = this.images.splice(index, 1);
+        this.revokeImagePreviews(removed ? [removed] : []);
         this.updateImagePreview();
     }
 
+    revokeImagePreviews(images) {
+        images.forEach(image => {
+            if (image.previewUrl) {
+                URL.revokeObjectURL(image.previewUrl);
+            }
+        });
+    }
+
     formatFileSize(bytes) {
         if (bytes === 0) return '0 Bytes';
         const k = 1024;
@@ -1012,11 +1046,19 @@ class FeedbackApp {
         console.log(`🔧 已更新狀態指示器: ${element.id} -> ${status}`);
     }
 
+    getSessionApiUrl() {
+        // 多會話路由模式下查詢固定會話，否則查詢當前活躍會話
+        return this.sessionRouted
+            ? `/api/session/${encodeURIComponent(this.sessionId)}`
+            : '/api/current-session';
+    }
+
     setupWebSocket() {
         // 確保 WebSocket URL 格式正確
         const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
         const host = window.location.host;
-        const wsUrl = `${protocol}//${host}/ws`;
+        const wsPath = this.sessionRouted ? `/ws/${encodeURIComponent(this.sessionId)}` : '/ws';
+        const wsUrl = `${protocol}//${host}${wsPath}`;
 
         console.log('嘗試連接 WebSocket:', wsUrl);
         this.updateConnectionStatus('connecting', '連接中...');
@@ -1347,7 +1389,7 @@ class FeedbackApp {
 
         try {
             // 1. 獲取最新的會話資料
-            const response = await fetch('/api/current-session');
+            const response = await fetch(this.getSessionApiUrl());
             if (!response.ok) {
                 throw new Error(`API 請求失敗: ${response.status}`);
             }
@@ -1428,6 +1470,7 @@ class FeedbackApp {
         }
 
         // 重置圖片上傳組件
+        this.revokeImagePreviews(this.images);
         this.images = [];
         this.updateImagePreview();
 
@@ -1836,7 +1879,8 @@ class FeedbackApp {
 
         return {
             feedback: feedback,
-            images: [...this.images], // 創建副本
+            // 已上傳的圖片只傳送上傳 ID，預覽 URL 僅供本頁使用
+            images: this.images.map(({ previewUrl, ...image }) => image),
             settings: {
                 image_size_limit: this.imageSizeLimit,
                 enable_base64_detail: this.enableBase64Detail
@@ -1889,6 +1933,7 @@ class FeedbackApp {
         });
 
         // 清空圖片數據
+        this.revokeImagePreviews(this.images);
         this.images = [];
 
         // 更新所有圖片預覽容器（updateImagePreview 現在會處理所有容器）
@@ -2420,7 +2465,7 @@ class FeedbackApp {
         try {
             this.updateAutoRefreshStatus('checking');
 
-            const response = await fetch('/api/current-session');
+            const response = await fetch(this.getSessionApiUrl());
             if (!response.ok) {
                 throw new Error(`API 請求失敗: ${response.status}`);
             }
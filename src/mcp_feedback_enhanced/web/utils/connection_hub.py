@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+WebSocket 連接中心
+==================
+
+為每個會話維護一組 WebSocket 連接，讓同一會話的多個標籤頁都能收到
+命令輸出和狀態更新。
+
+- 每個連接有獨立的有界發送隊列和發送任務，廣播只負責入隊，不等待發送
+- 隊列已滿或發送超時的慢連接會被丟棄，不會拖慢其他標籤頁
+- 連接記錄所屬的事件循環，可從其他線程或事件循環安全地廣播
+"""
+
+import asyncio
+import threading
+from typing import Dict, Optional
+
+from fastapi import WebSocket
+
+from ...debug import web_debug_log as debug_log
+from ...utils.metrics import get_metrics
+
+
+# 每個連接的發送隊列上限（條消息）
+DEFAULT_QUEUE_SIZE = 256
+# 單條消息的發送超時（秒）
+DEFAULT_SEND_TIMEOUT = 5.0
+# 慢連接被丟棄時使用的關閉代碼（Try Again Later）
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+def _get_running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    """獲取當前線程正在運行的事件循環"""
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+class _Connection:
+    """單一 WebSocket 連接及其發送隊列（需在所屬事件循環中創建）"""
+
+    def __init__(self, hub: "ConnectionHub", session_id: str, websocket: WebSocket, queue_size: int):
+        self.hub = hub
+        self.session_id = session_id
+        self.websocket = websocket
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.closed = False
+        self.sender = self.loop.create_task(self._send_loop())
+
+    def enqueue(self, message: dict):
+        """消息入隊（在所屬事件循環中調用）"""
+        if self.closed:
+            return
+
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.hub._drop(self, "發送隊列已滿")
+
+    async def _send_loop(self):
+        """依序發送隊列中的消息"""
+        try:
+            while True:
+                message = await self.queue.get()
+                try:
+                    await asyncio.wait_for(self.websocket.send_json(message), timeout=self.hub.send_timeout)
+                finally:
+                    self.queue.task_done()
+        except asyncio.CancelledError:
+            pass
+        except asyncio.TimeoutError:
+            self.hub._drop(self, "發送超時")
+        except Exception as e:
+            self.hub._drop(self, f"發送失敗: {e}")
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        """送出已排隊的消息後關閉連接（在所屬事件循環中調用）"""
+        if not self.closed and not self.sender.done() and self.queue.qsize():
+            try:
+                await asyncio.wait_for(self.queue.join(), timeout=1.0)
+            except asyncio.TimeoutError:
+                pass
+
+        self.closed = True
+        self.sender.cancel()
+
+        try:
+            await asyncio.wait_for(self.websocket.close(code=code, reason=reason), timeout=2.0)
+        except Exception as e:
+            # 連接可能已由客戶端斷開
+            debug_log(f"關閉 WebSocket 時發生錯誤: {e}")
+
+    def cancel(self):
+        """停止發送任務（可從任意線程調用）"""
+        self.closed = True
+        if self.loop.is_closed():
+            return
+        try:
+            self.loop.call_soon_threadsafe(self.sender.cancel)
+        except RuntimeError:
+            pass
+
+
+class ConnectionHub:
+    """WebSocket 連接中心（線程安全）"""
+
+    def __init__(self, queue_size: int = DEFAULT_QUEUE_SIZE, send_timeout: float = DEFAULT_SEND_TIMEOUT):
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        # session_id -> {websocket: 連接}，按連接時間排序
+        self._sessions: Dict[str, Dict[WebSocket, _Connection]] = {}
+        # websocket -> session_id，用於不知道所屬會話時移除連接
+        self._owners: Dict[WebSocket, str] = {}
+        self._lock = threading.RLock()
+
+    def register(self, session_id: str, websocket: WebSocket):
+        """
+        登記連接（需在 WebSocket 所屬的事件循環中調用）
+
+        Args:
+            session_id: 會話ID
+            websocket: 已接受的 WebSocket 連接
+        """
+        connection = _Connection(self, session_id, websocket, self.queue_size)
+        with self._lock:
+            previous = self._owners.get(websocket)
+            if previous is not None and previous != session_id:
+                self._sessions.get(previous, {}).pop(websocket, None)
+            self._sessions.setdefault(session_id, {})[websocket] = connection
+            self._owners[websocket] = session_id
+            count = len(self._sessions[session_id])
+        debug_log(f"會話 {session_id} 新增 WebSocket 連接，目前共 {count} 個")
+
+    def unregister(self, session_id: str, websocket: WebSocket) -> bool:
+        """移除連接（不關閉 WebSocket）"""
+        with self._lock:
+            connections = self._sessions.get(session_id)
+            connection = connections.pop(websocket, None) if connections else None
+            if connections is not None and not connections:
+                del self._sessions[session_id]
+            if connection is not None:
+                self._owners.pop(websocket, None)
+
+        if connection is None:
+            return False
+
+        connection.cancel()
+        return True
+
+    def discard(self, websocket: WebSocket) -> bool:
+        """移除連接，無論其目前屬於哪個會話（不關閉 WebSocket）"""
+        with self._lock:
+            session_id = self._owners.get(websocket)
+        if session_id is None:
+            return False
+        return self.unregister(session_id, websocket)
+
+    def contains(self, session_id: str, websocket: WebSocket) -> bool:
+        """檢查連接是否屬於會話"""
+        with self._lock:
+            return websocket in self._sessions.get(session_id, {})
+
+    def connection_count(self) -> int:
+        """獲取所有會話的連接總數"""
+        with self._lock:
+            return len(self._owners)
+
+    def count(self, session_id: str) -> int:
+        """獲取會話的連接數量"""
+        with self._lock:
+            return len(self._sessions.get(session_id, {}))
+
+    def latest(self, session_id: str) -> Optional[WebSocket]:
+        """獲取會話最近建立的連接"""
+        with self._lock:
+            connections = self._sessions.get(session_id)
+            if not connections:
+                return None
+            return next(reversed(connections))
+
+    def move_session(self, from_session_id: str, to_session_id: str) -> int:
+        """將會話的所有連接轉移到另一個會話，返回轉移數量"""
+        with self._lock:
+            connections = self._sessions.pop(from_session_id, None)
+            if not connections:
+                return 0
+
+            target = self._sessions.setdefault(to_session_id, {})
+            for websocket, connection in connections.items():
+                connection.session_id = to_session_id
+                target[websocket] = connection
+                self._owners[websocket] = to_session_id
+            return len(connections)
+
+    def publish(self, session_id: str, message: dict) -> int:
+        """
+        向會話的所有連接發送消息（只入隊，可從任意線程調用）
+
+        Returns:
+            int: 接收消息的連接數量
+        """
+        with self._lock:
+            connections = list(self._sessions.get(session_id, {}).values())
+
+        running_loop = _get_running_loop()
+        delivered = 0
+        for connection in connections:
+            if self._deliver(connection, message, running_loop):
+                delivered += 1
+        return delivered
+
+    async def broadcast(self, session_id: str, message: dict) -> int:
+        """向會話的所有連接廣播消息，返回接收消息的連接數量"""
+        return self.publish(session_id, message)
+
+    def send(self, session_id: str, websocket: WebSocket, message: dict) -> bool:
+        """向會話中的單一連接發送消息（只入隊，可從任意線程調用）"""
+        with self._lock:
+            connection = self._sessions.get(session_id, {}).get(websocket)
+
+        if connection is None:
+            return False
+        return self._deliver(connection, message, _get_running_loop())
+
+    async def close_session(self, session_id: str, code: int = 1000, reason: str = "") -> int:
+        """並行關閉會話的所有連接，返回關閉數量"""
+        with self._lock:
+            connections = list(self._sessions.pop(session_id, {}).values())
+            for connection in connections:
+                self._owners.pop(connection.websocket, None)
+
+        if connections:
+            await asyncio.gather(
+                *(self._close_on_loop(connection, code, reason) for connection in connections),
+                return_exceptions=True
+            )
+        return len(connections)
+
+    def _deliver(self, connection: _Connection, message: dict,
+                 running_loop: Optional[asyncio.AbstractEventLoop]) -> bool:
+        """在連接所屬的事件循環中入隊消息"""
+        if connection.closed:
+            return False
+
+        if running_loop is connection.loop:
+            connection.enqueue(message)
+            return True
+
+        try:
+            connection.loop.call_soon_threadsafe(connection.enqueue, message)
+            return True
+        except RuntimeError:
+            # 事件循環已關閉
+            self._remove(connection)
+            return False
+
+    async def _close_on_loop(self, connection: _Connection, code: int, reason: str):
+        """在連接所屬的事件循環中關閉連接"""
+        if connection.loop.is_closed():
+            return
+
+        if _get_running_loop() is connection.loop:
+            await connection.close(code, reason)
+        else:
+            future = asyncio.run_coroutine_threadsafe(connection.close(code, reason), connection.loop)
+            await asyncio.wrap_future(future)
+
+    def _remove(self, connection: _Connection) -> bool:
+        """從登記表移除連接"""
+        with self._lock:
+            connections = self._sessions.get(connection.session_id)
+            if not connections or connections.get(connection.websocket) is not connection:
+                return False
+            del connections[connection.websocket]
+            if not connections:
+                del self._sessions[connection.session_id]
+            self._owners.pop(connection.websocket, None)
+            return True
+
+    def _drop(self, connection: _Connection, reason: str):
+        """丟棄慢連接或失效連接（在所屬事件循環中調用）"""
+        if connection.closed:
+            return
+
+        connection.closed = True
+        self._remove(connection)
+        debug_log(f"丟棄會話 {connection.session_id} 的 WebSocket 連接: {reason}")
+        connection.loop.create_task(connection.close(SLOW_CONSUMER_CLOSE_CODE, reason[:100]))
+
+
+# 全域連接中心實例
+_connection_hub: Optional[ConnectionHub] = None
+
+
+def get_connection_hub() -> ConnectionHub:
+    """獲取全域 WebSocket 連接中心實例"""
+    global _connection_hub
+    if _connection_hub is None:
+        _connection_hub = ConnectionHub()
+        get_metrics().gauge(
+            "mcp_websocket_connections", "目前的 WebSocket 連接數", _connection_hub.connection_count
+        )
+    return _connection_hub
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+端口監聽狀態查詢
+================
+
+一次讀取主機上所有監聽中的 TCP 端口並按端口建立索引，短時間內重複查詢
+直接使用快取，端口選擇過程中無論檢查多少個候選端口都只掃描一次。
+
+- Linux：直接解析 /proc/net/tcp 和 /proc/net/tcp6，只讀取 LISTEN 狀態的條目
+- 其他平台：退回 psutil.net_connections，同樣每個快取週期只調用一次
+- 占用進程按 socket inode 在 /proc/<pid>/fd 中查找，只在需要時進行
+"""
+
+import os
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+import psutil
+
+from ...debug import web_debug_log as debug_log
+
+
+# 監聽端口快照的有效時間（秒）
+PORT_SNAPSHOT_TTL = 1.0
+
+# /proc/net/tcp 中 LISTEN 狀態的代碼
+_TCP_LISTEN = "0A"
+
+_PROC_NET_FILES = (("/proc/net/tcp", socket.AF_INET), ("/proc/net/tcp6", socket.AF_INET6))
+
+# 監聽所有介面的地址
+WILDCARD_ADDRESSES = ("0.0.0.0", "::")
+
+
+@dataclass(frozen=True)
+class Listener:
+    """一個監聽中的端口"""
+    ip: str
+    port: int
+    inode: Optional[int] = None  # /proc 來源時的 socket inode
+    pid: Optional[int] = None  # psutil 來源時已知的進程 ID
+
+
+def _decode_address(hex_address: str, family: int) -> str:
+    """解析 /proc/net/tcp 的十六進位地址（按 32 位元字的主機位元組序存儲）"""
+    raw = bytes.fromhex(hex_address)
+    raw = b"".join(raw[i:i + 4][::-1] for i in range(0, len(raw), 4))
+    ip = socket.inet_ntop(family, raw)
+    # IPv4 映射地址顯示為 IPv4
+    return ip[7:] if ip.startswith("::ffff:") and "." in ip else ip
+
+
+def _parse_proc_net(path: str, family: int) -> List[Listener]:
+    """讀取一個 /proc/net/tcp* 文件中的監聽條目"""
+    listeners = []
+    with open(path, "r", encoding="ascii") as f:
+        next(f, None)  # 表頭
+        for line in f:
+            fields = line.split()
+            if len(fields) < 10 or fields[3] != _TCP_LISTEN:
+                continue
+            address, _, port = fields[1].partition(":")
+            listeners.append(Listener(
+                ip=_decode_address(address, family),
+                port=int(port, 16),
+                inode=int(fields[9])
+            ))
+    return listeners
+
+
+class PortInspector:
+    """監聽端口查詢（線程安全，結果按 TTL 快取）"""
+
+    def __init__(self, ttl: float = PORT_SNAPSHOT_TTL):
+        self.ttl = ttl
+        self._snapshot: Dict[int, List[Listener]] = {}
+        self._snapshot_time = 0.0
+        self._lock = threading.Lock()
+        self._use_proc = os.path.exists(_PROC_NET_FILES[0][0])
+
+    def snapshot(self) -> Dict[int, List[Listener]]:
+        """獲取監聽端口索引（端口 -> 監聽條目），過期時重新掃描"""
+        with self._lock:
+            if time.monotonic() - self._snapshot_time > self.ttl:
+                self._snapshot = self._scan()
+                self._snapshot_time = time.monotonic()
+            return self._snapshot
+
+    def invalidate(self):
+        """使快取失效（例如終止占用進程之後）"""
+        with self._lock:
+            self._snapshot_time = 0.0
+
+    def listeners(self, port: int) -> List[Listener]:
+        """獲取監聽指定端口的條目"""
+        return self.snapshot().get(port, [])
+
+    def is_listening(self, port: int, hosts: Optional[Iterable[str]] = None) -> bool:
+        """
+        檢查端口是否有進程在監聽
+
+        Args:
+            port: 端口號
+            hosts: 只計算監聽這些地址的條目（None 表示任意地址）
+        """
+        entries = self.listeners(port)
+        if hosts is None:
+            return bool(entries)
+        hosts = set(hosts)
+        return any(entry.ip in hosts for entry in entries)
+
+    def listening_ports(self, start_port: int, end_port: int) -> List[Listener]:
+        """列出指定範圍內的監聽條目（按端口排序）"""
+        return [
+            entry
+            for port, entries in sorted(self.snapshot().items())
+            if start_port <= port <= end_port
+            for entry in entries
+        ]
+
+    def find_pid(self, listener: Listener) -> Optional[int]:
+        """查找監聽條目所屬的進程 ID"""
+        if listener.pid is not None or listener.inode is None:
+            return listener.pid
+        return self.find_socket_owners({listener.inode}).get(listener.inode)
+
+    @staticmethod
+    def find_socket_owners(inodes: Iterable[int]) -> Dict[int, int]:
+        """
+        在 /proc/<pid>/fd 中查找持有指定 socket inode 的進程，全部找到即停止
+
+        Returns:
+            Dict[int, int]: inode -> pid（無權限讀取的進程會被略過）
+        """
+        targets = {f"socket:[{inode}]": inode for inode in inodes if inode}
+        owners: Dict[int, int] = {}
+        if not targets:
+            return owners
+
+        try:
+            processes = [entry.name for entry in os.scandir("/proc") if entry.name.isdigit()]
+        except OSError:
+            return owners
+
+        for pid in processes:
+            try:
+                with os.scandir(f"/proc/{pid}/fd") as fds:
+                    for fd in fds:
+                        try:
+                            inode = targets.get(os.readlink(fd.path))
+                        except OSError:
+                            continue
+                        if inode is not None and inode not in owners:
+                            owners[inode] = int(pid)
+            except OSError:
+                continue
+            if len(owners) == len(targets):
+                break
+        return owners
+
+    def _scan(self) -> Dict[int, List[Listener]]:
+        """掃描所有監聽端口"""
+        index: Dict[int, List[Listener]] = {}
+        for listener in self._scan_proc() if self._use_proc else self._scan_psutil():
+            index.setdefault(listener.port, []).append(listener)
+        return index
+
+    def _scan_proc(self) -> List[Listener]:
+        """從 /proc/net/tcp* 讀取監聽條目"""
+        listeners = []
+        for path, family in _PROC_NET_FILES:
+            try:
+                listeners.extend(_parse_proc_net(path, family))
+            except FileNotFoundError:
+                # 未啟用 IPv6 時沒有 tcp6
+                continue
+            except (OSError, ValueError) as e:
+                debug_log(f"讀取 {path} 失敗，改用 psutil: {e}")
+                self._use_proc = False
+                return self._scan_psutil()
+        return listeners
+
+    @staticmethod
+    def _scan_psutil() -> List[Listener]:
+        """以 psutil 讀取監聽條目"""
+        try:
+            return [
+                Listener(ip=conn.laddr.ip, port=conn.laddr.port, pid=conn.pid)
+                for conn in psutil.net_connections(kind="inet")
+                if conn.status == psutil.CONN_LISTEN and conn.laddr
+            ]
+        except Exception as e:
+            debug_log(f"列出監聽端口時發生錯誤: {e}")
+            return []
+
+
+# 全域端口查詢實例
+_port_inspector: Optional[PortInspector] = None
+
+
+def get_port_inspector() -> PortInspector:
+    """獲取全域端口查詢實例"""
+    global _port_inspector
+    if _port_inspector is None:
+        _port_inspector = PortInspector()
+    return _port_inspector
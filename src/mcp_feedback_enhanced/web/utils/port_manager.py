@@ -3,6 +3,7 @@
 
 提供增強的端口管理功能，包括：
 - 智能端口查找
+- 直接綁定監聽 socket 並交給伺服器使用（避免先探測再綁定的競爭）
 - 進程檢測和清理
 - 端口衝突解決
 """
@@ -12,8 +13,13 @@ import subprocess
 import platform
 import psutil
 import time
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, Iterator, List
 from ...debug import debug_log
+from .port_inspector import WILDCARD_ADDRESSES, get_port_inspector
+
+
+# 預先綁定的監聽 socket 的 backlog（與 uvicorn 預設值相同）
+LISTEN_BACKLOG = 2048
 
 
 class PortManager:
@@ -32,20 +38,23 @@ class PortManager:
             None: 如果沒有進程占用該端口
         """
         try:
-            for conn in psutil.net_connections(kind='inet'):
-                if conn.laddr.port == port and conn.status == psutil.CONN_LISTEN:
-                    try:
-                        process = psutil.Process(conn.pid)
-                        return {
-                            'pid': conn.pid,
-                            'name': process.name(),
-                            'cmdline': ' '.join(process.cmdline()),
-                            'create_time': process.create_time(),
-                            'status': process.status()
-                        }
-                    except (psutil.NoSuchProcess, psutil.AccessDenied):
-                        # 進程可能已經結束或無權限訪問
-                        continue
+            inspector = get_port_inspector()
+            for listener in inspector.listeners(port):
+                pid = inspector.find_pid(listener)
+                if pid is None:
+                    continue
+                try:
+                    process = psutil.Process(pid)
+                    return {
+                        'pid': pid,
+                        'name': process.name(),
+                        'cmdline': ' '.join(process.cmdline()),
+                        'create_time': process.create_time(),
+                        'status': process.status()
+                    }
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    # 進程可能已經結束或無權限訪問
+                    continue
         except Exception as e:
             debug_log(f"查找端口 {port} 占用進程時發生錯誤: {e}")
         
@@ -86,6 +95,9 @@ class PortManager:
                 debug_log(f"優雅終止進程 {process_name} (PID: {pid})")
                 process.terminate()
             
+            # 端口狀態即將改變，使監聽端口快取失效
+            get_port_inspector().invalidate()
+
             # 等待進程結束
             try:
                 process.wait(timeout=5)
@@ -127,18 +139,14 @@ class PortManager:
                 return True
         except OSError:
             # 如果綁定失敗，再檢查是否真的有進程在監聽
-            # 使用 psutil 檢查是否有進程在監聽該端口
+            # （監聽端口索引有短時間快取，連續檢查多個端口只掃描一次）
             try:
-                import psutil
-                for conn in psutil.net_connections(kind='inet'):
-                    if (conn.laddr.port == port and
-                        conn.laddr.ip in [host, '0.0.0.0', '::'] and
-                        conn.status == psutil.CONN_LISTEN):
-                        return False
+                if get_port_inspector().is_listening(port, hosts=(host, *WILDCARD_ADDRESSES)):
+                    return False
                 # 沒有找到監聽的進程，可能是臨時占用，認為可用
                 return True
             except Exception:
-                # 如果 psutil 檢查失敗，保守地認為端口不可用
+                # 如果檢查失敗，保守地認為端口不可用
                 return False
     
     @staticmethod
@@ -169,36 +177,15 @@ class PortManager:
             return preferred_port
         
         # 如果偏好端口被占用且啟用自動清理
-        if auto_cleanup:
-            debug_log(f"偏好端口 {preferred_port} 被占用，嘗試清理占用進程")
-            process_info = PortManager.find_process_using_port(preferred_port)
-            
-            if process_info:
-                debug_log(f"端口 {preferred_port} 被進程 {process_info['name']} (PID: {process_info['pid']}) 占用")
-                
-                # 詢問用戶是否清理（在實際使用中可能需要配置選項）
-                if PortManager._should_cleanup_process(process_info):
-                    if PortManager.kill_process_on_port(preferred_port):
-                        # 等待一下讓端口釋放
-                        time.sleep(1)
-                        if PortManager.is_port_available(host, preferred_port):
-                            debug_log(f"成功清理端口 {preferred_port}，現在可用")
-                            return preferred_port
+        if auto_cleanup and PortManager._cleanup_port(preferred_port):
+            if PortManager.is_port_available(host, preferred_port):
+                debug_log(f"成功清理端口 {preferred_port}，現在可用")
+                return preferred_port
         
         # 如果偏好端口仍不可用，尋找其他端口
         debug_log(f"偏好端口 {preferred_port} 不可用，尋找其他可用端口")
         
-        for i in range(max_attempts):
-            port = preferred_port + i + 1
-            if PortManager.is_port_available(host, port):
-                debug_log(f"找到可用端口: {port}")
-                return port
-        
-        # 如果向上查找失敗，嘗試向下查找
-        for i in range(1, min(preferred_port - 1024, max_attempts)):
-            port = preferred_port - i
-            if port < 1024:  # 避免使用系統保留端口
-                break
+        for port in PortManager._fallback_ports(preferred_port, max_attempts):
             if PortManager.is_port_available(host, port):
                 debug_log(f"找到可用端口: {port}")
                 return port
@@ -208,6 +195,117 @@ class PortManager:
             f"請檢查是否有過多進程占用端口，或手動指定其他端口。"
         )
     
+    @staticmethod
+    def bind_free_port(
+        preferred_port: int = 8765,
+        auto_cleanup: bool = True,
+        host: str = "127.0.0.1",
+        max_attempts: int = 100
+    ) -> socket.socket:
+        """
+        綁定一個可用端口並開始監聽，返回監聽中的 socket
+
+        與 find_free_port_enhanced 按相同順序嘗試端口，但直接綁定而不是探測後釋放，
+        返回的 socket 交給伺服器使用（uvicorn 的 sockets 參數），端口在查找到使用之間
+        不會被其他進程搶走，也不需要綁定失敗後的重試。
+
+        Args:
+            preferred_port: 偏好端口號
+            auto_cleanup: 是否自動清理占用偏好端口的進程
+            host: 主機地址
+            max_attempts: 最大嘗試次數
+
+        Returns:
+            socket.socket: 已綁定並監聽的 socket
+
+        Raises:
+            RuntimeError: 如果找不到可用端口
+        """
+        sock = PortManager.bind_listening_socket(host, preferred_port)
+        if sock is None and auto_cleanup and PortManager._cleanup_port(preferred_port):
+            sock = PortManager.bind_listening_socket(host, preferred_port)
+
+        if sock is None:
+            debug_log(f"偏好端口 {preferred_port} 不可用，尋找其他可用端口")
+            for port in PortManager._fallback_ports(preferred_port, max_attempts):
+                sock = PortManager.bind_listening_socket(host, port)
+                if sock is not None:
+                    break
+
+        if sock is None:
+            raise RuntimeError(
+                f"無法在 {preferred_port}±{max_attempts} 範圍內找到可用端口。"
+                f"請檢查是否有過多進程占用端口，或手動指定其他端口。"
+            )
+
+        debug_log(f"已綁定端口 {sock.getsockname()[1]}")
+        return sock
+
+    @staticmethod
+    def bind_listening_socket(host: str, port: int) -> Optional[socket.socket]:
+        """
+        綁定指定端口並開始監聽
+
+        Args:
+            host: 主機地址
+            port: 端口號
+
+        Returns:
+            Optional[socket.socket]: 監聽中的 socket，端口被占用時返回 None
+        """
+        try:
+            family, _, _, _, address = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)[0]
+        except socket.gaierror as e:
+            debug_log(f"無法解析主機地址 {host}: {e}")
+            return None
+
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            # SO_REUSEADDR 只在 Linux 設置（允許綁定 TIME_WAIT 中的端口）：
+            # Windows 上會搶佔已在使用的端口，macOS/BSD 上特定地址可與監聽 0.0.0.0 的進程同時綁定
+            if platform.system() == "Linux":
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind(address)
+            sock.listen(LISTEN_BACKLOG)
+            return sock
+        except OSError:
+            sock.close()
+            return None
+
+    @staticmethod
+    def _cleanup_port(port: int) -> bool:
+        """
+        清理占用端口的進程
+
+        Returns:
+            bool: 是否已終止占用進程
+        """
+        debug_log(f"偏好端口 {port} 被占用，嘗試清理占用進程")
+        process_info = PortManager.find_process_using_port(port)
+        if not process_info:
+            return False
+
+        debug_log(f"端口 {port} 被進程 {process_info['name']} (PID: {process_info['pid']}) 占用")
+
+        # 詢問用戶是否清理（在實際使用中可能需要配置選項）
+        if PortManager._should_cleanup_process(process_info) and PortManager.kill_process_on_port(port):
+            # 等待一下讓端口釋放
+            time.sleep(1)
+            return True
+        return False
+
+    @staticmethod
+    def _fallback_ports(preferred_port: int, max_attempts: int) -> Iterator[int]:
+        """偏好端口不可用時依序嘗試的端口：先向上，再向下（不低於 1024）"""
+        for i in range(max_attempts):
+            yield preferred_port + i + 1
+
+        for i in range(1, min(preferred_port - 1024, max_attempts)):
+            port = preferred_port - i
+            if port < 1024:  # 避免使用系統保留端口
+                break
+            yield port
+
     @staticmethod
     def _should_cleanup_process(process_info: Dict[str, Any]) -> bool:
         """
@@ -284,23 +382,30 @@ class PortManager:
         listening_ports = []
         
         try:
-            for conn in psutil.net_connections(kind='inet'):
-                if (conn.status == psutil.CONN_LISTEN and 
-                    start_port <= conn.laddr.port <= end_port):
-                    
-                    try:
-                        process = psutil.Process(conn.pid)
-                        port_info = {
-                            'port': conn.laddr.port,
-                            'host': conn.laddr.ip,
-                            'pid': conn.pid,
-                            'process_name': process.name(),
-                            'cmdline': ' '.join(process.cmdline())
-                        }
-                        listening_ports.append(port_info)
-                    except (psutil.NoSuchProcess, psutil.AccessDenied):
-                        continue
-                        
+            inspector = get_port_inspector()
+            listeners = inspector.listening_ports(start_port, end_port)
+            # 一次查找所有 socket 的占用進程
+            owners = inspector.find_socket_owners(
+                listener.inode for listener in listeners if listener.pid is None
+            )
+
+            for listener in listeners:
+                pid = listener.pid if listener.pid is not None else owners.get(listener.inode)
+                if pid is None:
+                    continue
+                try:
+                    process = psutil.Process(pid)
+                    port_info = {
+                        'port': listener.port,
+                        'host': listener.ip,
+                        'pid': pid,
+                        'process_name': process.name(),
+                        'cmdline': ' '.join(process.cmdline())
+                    }
+                    listening_ports.append(port_info)
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    continue
+
         except Exception as e:
             debug_log(f"列出監聽端口時發生錯誤: {e}")
         
@@ -17,6 +17,7 @@ from enum import Enum
 
 from ...debug import web_debug_log as debug_log
 from ...utils.error_handler import ErrorHandler, ErrorType
+from ...utils.metrics import cleanup_duration_histogram
 from ..models.feedback_session import CleanupReason, SessionStatus
 
 
@@ -296,7 +297,7 @@ class SessionCleanupManager:
             session_id, session, _ = session_priorities[i]
             try:
                 session._cleanup_sync_enhanced(CleanupReason.MANUAL)
-                del self.web_ui_manager.sessions[session_id]
+                self.web_ui_manager.discard_session(session_id)
                 cleaned_count += 1
             except Exception as e:
                 debug_log(f"容量清理會話 {session_id} 失敗: {e}")
@@ -305,16 +306,10 @@ class SessionCleanupManager:
 
     def _cleanup_expired_sessions(self) -> int:
         """清理過期會話"""
-        expired_sessions = []
-        current_time = time.time()
-
-        for session_id, session in self.web_ui_manager.sessions.items():
-            # 檢查是否過期
-            if session.is_expired():
-                expired_sessions.append(session_id)
-            # 檢查是否超過最大年齡
-            elif session.get_age() > self.policy.max_session_age:
-                expired_sessions.append(session_id)
+        # 從過期索引取出已過期或超過最大年齡的會話
+        expired_sessions = self.web_ui_manager.pop_expired_session_ids(
+            time.time(), max_age=self.policy.max_session_age
+        )
 
         # 清理過期會話
         cleaned_count = 0
@@ -323,7 +318,7 @@ class SessionCleanupManager:
                 session = self.web_ui_manager.sessions.get(session_id)
                 if session:
                     session._cleanup_sync_enhanced(CleanupReason.EXPIRED)
-                    del self.web_ui_manager.sessions[session_id]
+                    self.web_ui_manager.discard_session(session_id)
                     cleaned_count += 1
 
                     # 如果清理的是當前活躍會話，清空當前會話
@@ -358,7 +353,7 @@ class SessionCleanupManager:
                 session = self.web_ui_manager.sessions.get(session_id)
                 if session:
                     session._cleanup_sync_enhanced(CleanupReason.EXPIRED)
-                    del self.web_ui_manager.sessions[session_id]
+                    self.web_ui_manager.discard_session(session_id)
                     cleaned_count += 1
 
             except Exception as e:
@@ -368,6 +363,7 @@ class SessionCleanupManager:
 
     def _update_cleanup_stats(self, trigger: CleanupTrigger, cleaned_count: int, duration: float):
         """更新清理統計"""
+        cleanup_duration_histogram().observe(duration, component="web_sessions")
         self.stats.total_cleanups += 1
         self.stats.total_sessions_cleaned += cleaned_count
         self.stats.total_cleanup_time += duration
@@ -492,7 +488,7 @@ class SessionCleanupManager:
                 session = self.web_ui_manager.sessions.get(session_id)
                 if session:
                     session._cleanup_sync_enhanced(CleanupReason.MANUAL)
-                    del self.web_ui_manager.sessions[session_id]
+                    self.web_ui_manager.discard_session(session_id)
                     cleaned_count += 1
             except Exception as e:
                 debug_log(f"強制清理會話 {session_id} 失敗: {e}")
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+圖片上傳暫存區
+==============
+
+以原始二進位方式接收圖片上傳，分塊寫入磁碟並返回上傳 ID，
+提交回饋時只需傳送 ID，避免 base64 在 WebSocket JSON 中膨脹約 33%。
+
+- 上傳按會話歸屬，只能在所屬會話中引用
+- 提交回饋時讀取一次後即刪除暫存檔（consume）
+- 會話清理時刪除其尚未提交的上傳
+- 磁碟寫入按批在線程中執行，大文件上傳不阻塞事件循環
+"""
+
+import asyncio
+import os
+import shutil
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import AsyncIterable, Dict, Optional
+
+from ...debug import web_debug_log as debug_log
+from ...utils.error_handler import ErrorHandler, ErrorType
+
+
+# 暫存目錄
+UPLOAD_DIR = Path.home() / ".cache" / "interactive-feedback-mcp-web" / "uploads"
+# 單張圖片上傳的硬性上限（設定中的 image_size_limit 在提交時另行檢查）
+MAX_UPLOAD_SIZE = 50 * 1024 * 1024
+# 累積到此大小才寫入一次磁碟（每次寫入在線程中執行）
+WRITE_BATCH_SIZE = 1024 * 1024
+
+
+class UploadTooLargeError(ValueError):
+    """上傳內容超過大小上限"""
+
+
+@dataclass
+class UploadedImage:
+    """已上傳的圖片"""
+    upload_id: str
+    session_id: str
+    name: str
+    content_type: str
+    path: Path
+    size: int = 0
+    created_at: float = field(default_factory=time.time)
+
+    def to_dict(self) -> dict:
+        """轉換為回應給前端的字典"""
+        return {
+            "upload_id": self.upload_id,
+            "name": self.name,
+            "type": self.content_type,
+            "size": self.size
+        }
+
+
+class UploadStore:
+    """圖片上傳暫存區（線程安全）"""
+
+    def __init__(self, base_dir: Optional[Path] = None, max_size: int = MAX_UPLOAD_SIZE):
+        self.base_dir = Path(base_dir) if base_dir else UPLOAD_DIR
+        self.max_size = max_size
+        self._uploads: Dict[str, UploadedImage] = {}
+        self._lock = threading.Lock()
+
+    async def save_stream(self, session_id: str, name: str, content_type: str,
+                          chunks: AsyncIterable[bytes]) -> UploadedImage:
+        """
+        分塊寫入上傳內容
+
+        Args:
+            session_id: 所屬會話ID
+            name: 原始文件名
+            content_type: MIME 類型
+            chunks: 內容分塊（如 Request.stream()）
+
+        Returns:
+            UploadedImage: 上傳記錄
+
+        Raises:
+            UploadTooLargeError: 內容超過大小上限
+        """
+        await asyncio.to_thread(self.base_dir.mkdir, parents=True, exist_ok=True)
+
+        upload = UploadedImage(
+            upload_id=uuid.uuid4().hex,
+            session_id=session_id,
+            name=os.path.basename(name or "") or "image.png",
+            content_type=content_type or "application/octet-stream",
+            path=self.base_dir / f"{uuid.uuid4().hex}.upload"
+        )
+
+        f = await asyncio.to_thread(open, upload.path, "wb")
+        try:
+            batch = bytearray()
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                upload.size += len(chunk)
+                if self.max_size > 0 and upload.size > self.max_size:
+                    raise UploadTooLargeError(f"圖片超過上傳上限 ({self.max_size} bytes)")
+                batch += chunk
+                if len(batch) >= WRITE_BATCH_SIZE:
+                    await asyncio.to_thread(f.write, batch)
+                    batch.clear()
+            if batch:
+                await asyncio.to_thread(f.write, batch)
+            await asyncio.to_thread(f.close)
+        except BaseException:
+            f.close()
+            self._unlink(upload.path)
+            raise
+
+        with self._lock:
+            self._uploads[upload.upload_id] = upload
+
+        debug_log(f"會話 {session_id} 上傳圖片 {upload.name}，大小: {upload.size} bytes")
+        return upload
+
+    def get(self, upload_id: str, session_id: Optional[str] = None) -> Optional[UploadedImage]:
+        """獲取上傳記錄，指定 session_id 時只返回屬於該會話的上傳"""
+        with self._lock:
+            upload = self._uploads.get(upload_id)
+        if upload is None or (session_id is not None and upload.session_id != session_id):
+            return None
+        return upload
+
+    def consume(self, upload_id: str, session_id: str) -> Optional[UploadedImage]:
+        """
+        取出上傳記錄（從登記表移除，之後由 read 或 discard_file 處理暫存檔）
+
+        Returns:
+            Optional[UploadedImage]: 上傳記錄；不存在或不屬於該會話時返回 None
+        """
+        with self._lock:
+            upload = self._uploads.get(upload_id)
+            if upload is None or upload.session_id != session_id:
+                return None
+            del self._uploads[upload_id]
+        return upload
+
+    def read(self, upload: UploadedImage, remove: bool = True) -> Optional[bytes]:
+        """讀取上傳內容，預設讀取後刪除暫存檔"""
+        try:
+            with open(upload.path, "rb") as f:
+                return f.read()
+        except OSError as e:
+            error_id = ErrorHandler.log_error_with_context(
+                e,
+                context={"operation": "讀取上傳圖片", "upload_id": upload.upload_id},
+                error_type=ErrorType.FILE_IO
+            )
+            debug_log(f"讀取上傳圖片失敗 [錯誤ID: {error_id}]: {e}")
+            return None
+        finally:
+            if remove:
+                self._unlink(upload.path)
+
+    def discard_file(self, upload: UploadedImage):
+        """刪除已取出的上傳暫存檔"""
+        self._unlink(upload.path)
+
+    def discard(self, upload_id: str) -> bool:
+        """刪除單一上傳"""
+        with self._lock:
+            upload = self._uploads.pop(upload_id, None)
+        if upload is None:
+            return False
+        self._unlink(upload.path)
+        return True
+
+    def discard_session(self, session_id: str) -> int:
+        """刪除會話所有尚未提交的上傳，返回刪除數量"""
+        with self._lock:
+            uploads = [upload for upload in self._uploads.values() if upload.session_id == session_id]
+            for upload in uploads:
+                del self._uploads[upload.upload_id]
+
+        for upload in uploads:
+            self._unlink(upload.path)
+        if uploads:
+            debug_log(f"清理會話 {session_id} 的 {len(uploads)} 個未提交上傳")
+        return len(uploads)
+
+    def clear(self):
+        """刪除所有上傳及暫存目錄"""
+        with self._lock:
+            self._uploads.clear()
+        shutil.rmtree(self.base_dir, ignore_errors=True)
+
+    def __len__(self) -> int:
+        return len(self._uploads)
+
+    @staticmethod
+    def _unlink(path: Path):
+        """刪除暫存檔（忽略不存在）"""
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            debug_log(f"刪除上傳暫存檔失敗 {path}: {e}")
+
+
+# 全域上傳暫存區實例
+_upload_store: Optional[UploadStore] = None
+
+
+def get_upload_store() -> UploadStore:
+    """獲取全域圖片上傳暫存區實例"""
+    global _upload_store
+    if _upload_store is None:
+        _upload_store = UploadStore()
+    return _upload_store